@@ -0,0 +1,141 @@
+# aura-backend/ai/backends.py
+# Backend thực thi model: TensorFlow (Keras gốc), TFLite (XNNPACK) hoặc ONNX Runtime (CPU).
+# Cả 3 chạy CÙNG 7 model; file TFLite/ONNX được sinh bởi ai/convert_models.py.
+# Chỉ import thư viện của backend khi thực sự nạp model.
+import os
+import threading
+import numpy as np
+
+# --- CẤU HÌNH BACKEND ---
+# AURA_INFERENCE_BACKEND: tensorflow | tflite | onnx
+INFERENCE_BACKEND = os.getenv("AURA_INFERENCE_BACKEND", "tensorflow")
+# AURA_MODEL_PRECISION: fp32 | fp16 | int8 (chỉ áp dụng cho tflite / onnx)
+MODEL_PRECISION = os.getenv("AURA_MODEL_PRECISION", "int8")
+CONVERTED_DIR = os.getenv("AURA_CONVERTED_MODEL_DIR", "ai/converted")
+# Số luồng CPU cho mỗi interpreter/session (0 = để thư viện tự chọn)
+BACKEND_THREADS = int(os.getenv("AURA_BACKEND_THREADS", 0))
+
+def converted_path(keras_path, fmt, precision, out_dir=CONVERTED_DIR):
+    """ai/unet_hemorrhages.keras -> ai/converted/unet_hemorrhages.int8.tflite"""
+    stem = os.path.splitext(os.path.basename(keras_path))[0]
+    return os.path.join(out_dir, f"{stem}.{precision}.{fmt}")
+
+class TensorFlowBackend:
+    name = "tensorflow"
+    supports_graph = True   # Dùng được tf.function / graph hợp nhất trong ai/inference.py
+
+    def __init__(self, **_):
+        pass
+
+    def model_paths(self, keras_paths):
+        return dict(keras_paths)
+
+    def load(self, path):
+        import tensorflow as tf
+        # compile=False để tránh lỗi hàm loss tùy chỉnh
+        return tf.keras.models.load_model(path, compile=False)
+
+    def predict(self, model, batch):
+        return model(np.asarray(batch, dtype=np.float32), training=False).numpy()
+
+class TFLiteRunner:
+    """Bọc tf.lite.Interpreter: tự resize theo kích thước batch + lượng tử hóa/giải lượng tử I/O int8"""
+    def __init__(self, path, num_threads=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        # Op resolver mặc định đã bật delegate XNNPACK cho CPU
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads or None)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+        self.size_bytes = os.path.getsize(path)
+        self._lock = threading.Lock()  # Interpreter không thread-safe (warm-up và batcher có thể gọi cùng lúc)
+
+    def _ensure_batch(self, n):
+        if self.batch_size != n:
+            shape = list(self.input["shape"]); shape[0] = n
+            self.interpreter.resize_tensor_input(self.input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self.batch_size = n
+
+    def __call__(self, batch):
+        with self._lock:
+            return self._invoke(np.asarray(batch, dtype=np.float32))
+
+    def _invoke(self, batch):
+        self._ensure_batch(len(batch))
+        if self.input["dtype"] in (np.int8, np.uint8):
+            scale, zero_point = self.input["quantization"]
+            batch = np.clip(np.round(batch / scale + zero_point), np.iinfo(self.input["dtype"]).min, np.iinfo(self.input["dtype"]).max)
+            batch = batch.astype(self.input["dtype"])
+        self.interpreter.set_tensor(self.input["index"], batch)
+        self.interpreter.invoke()
+        out = self.interpreter.get_tensor(self.output["index"])
+        if self.output["dtype"] in (np.int8, np.uint8):
+            scale, zero_point = self.output["quantization"]
+            out = (out.astype(np.float32) - zero_point) * scale
+        return out
+
+class TFLiteBackend:
+    name = "tflite"
+    supports_graph = False
+
+    def __init__(self, precision=MODEL_PRECISION, num_threads=BACKEND_THREADS):
+        self.precision = precision
+        self.num_threads = num_threads
+
+    def model_paths(self, keras_paths):
+        return {n: converted_path(p, "tflite", self.precision) for n, p in keras_paths.items()}
+
+    def load(self, path):
+        return TFLiteRunner(path, self.num_threads)
+
+    def predict(self, model, batch):
+        return model(batch)
+
+class OnnxRunner:
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads: options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.size_bytes = os.path.getsize(path)
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})[0]
+
+class OnnxBackend:
+    name = "onnx"
+    supports_graph = False
+
+    def __init__(self, precision=MODEL_PRECISION, num_threads=BACKEND_THREADS):
+        # ONNX không có bản fp16 cho CPU => fp16 dùng lại file fp32
+        self.precision = "fp32" if precision == "fp16" else precision
+        self.num_threads = num_threads
+
+    def model_paths(self, keras_paths):
+        return {n: converted_path(p, "onnx", self.precision) for n, p in keras_paths.items()}
+
+    def load(self, path):
+        return OnnxRunner(path, self.num_threads)
+
+    def predict(self, model, batch):
+        return model(batch)
+
+BACKENDS = {
+    "tensorflow": TensorFlowBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+}
+
+def create_backend(name=INFERENCE_BACKEND, **kwargs):
+    if name not in BACKENDS:
+        raise ValueError(f"Backend không hỗ trợ: {name} (chọn: {', '.join(BACKENDS)})")
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,97 @@
+# aura-backend/ai/batching.py
+import os
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+# --- CẤU HÌNH MICRO-BATCHING ---
+# Gom các ảnh đang chờ trong vài mili-giây rồi chạy mỗi model 1 lần cho cả batch
+BATCH_MAX_SIZE = int(os.getenv("AURA_BATCH_MAX_SIZE", 8))
+BATCH_MAX_WAIT_MS = float(os.getenv("AURA_BATCH_MAX_WAIT_MS", 15))
+
+_STOP = object()
+
+class InferenceScheduler:
+    """
+    Bộ lập lịch inference: nhiều request gọi submit() đồng thời,
+    một luồng nền gom chúng thành batch và trả kết quả về từng Future riêng.
+    """
+    def __init__(self, infer_batch_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.infer_batch_fn = infer_batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Thống kê đơn giản để theo dõi hiệu quả gom batch
+        self.batches_run = 0
+        self.items_run = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="aura-inference-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, image_bytes):
+        """Đưa 1 ảnh vào hàng chờ, trả về concurrent.futures.Future chứa dict kết quả"""
+        future = Future()
+        self._queue.put((image_bytes, future))
+        self._ensure_started()
+        return future
+
+    async def infer(self, image_bytes):
+        """Phiên bản async cho FastAPI: await kết quả mà không chặn event loop"""
+        return await asyncio.wrap_future(self.submit(image_bytes))
+
+    def shutdown(self):
+        self._queue.put(_STOP)
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # Xử lý nốt batch này rồi mới dừng
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP: break
+            batch = self._collect_batch(first)
+            # Bỏ qua các Future đã bị hủy trước khi chạy
+            batch = [(img, fut) for img, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch: continue
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        try:
+            results = self.infer_batch_fn([img for img, _ in batch])
+        except Exception as e:
+            for _, fut in batch: fut.set_exception(e)
+            return
+        self.batches_run += 1
+        self.items_run += len(batch)
+        for (_, fut), result in zip(batch, results):
+            if isinstance(result, Exception): fut.set_exception(result)
+            else: fut.set_result(result)
+
+def _run_aura_inference_batch(images_bytes):
+    # Import muộn: thay engine khác (VD engine giả của load test) thì không phải nạp TensorFlow
+    from ai.inference import run_aura_inference_batch
+    return run_aura_inference_batch(images_bytes)
+
+# Tạo instance dùng chung cho cả server
+inference_scheduler = InferenceScheduler(_run_aura_inference_batch)
@@ -0,0 +1,125 @@
+# aura-backend/ai/convert_models.py
+# Chuyển 7 model .keras sang TFLite / ONNX, kèm lượng tử hóa sau huấn luyện (float16 / int8).
+# Chạy từ thư mục aura-backend:
+#   python -m ai.convert_models --to tflite --precision int8 --calibration-dir data/calib
+#   python -m ai.convert_models --to onnx --precision int8 --calibration-dir data/calib
+# Nên dùng 50-200 ảnh đáy mắt THẬT để hiệu chỉnh int8; ảnh tổng hợp chỉ dùng để chạy thử.
+import os
+import glob
+import argparse
+
+import numpy as np
+import tensorflow as tf
+
+from ai.registry import MODEL_PATHS
+from ai.backends import converted_path, CONVERTED_DIR
+from ai.inference import prepare_inputs, INPUT_SIGNATURES, MODEL_INPUTS
+from benchmarks.synthetic import make_fundus_jpeg
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png", "*.JPG", "*.JPEG", "*.PNG")
+
+def load_sample_inputs(images_dir=None, limit=64):
+    """Đọc ảnh mẫu và chạy đúng bước tiền xử lý của pipeline; trả về list dict từ prepare_inputs"""
+    files = []
+    if images_dir:
+        for pattern in IMAGE_PATTERNS:
+            files.extend(glob.glob(os.path.join(images_dir, pattern)))
+    files = sorted(set(files))[:limit]
+
+    samples = []
+    for path in files:
+        with open(path, "rb") as f:
+            try:
+                samples.append(prepare_inputs(f.read()))
+            except ValueError as e:
+                print(f"   ⚠️ Bỏ qua {path}: {e}")
+    if not samples:
+        print("⚠️ Không có ảnh mẫu => dùng ảnh tổng hợp (chỉ để chạy thử, KHÔNG dùng kết quả int8 cho production)")
+        samples = [prepare_inputs(make_fundus_jpeg(1024, 1024, seed=i)) for i in range(min(limit, 8))]
+    return samples
+
+def input_key(name):
+    return MODEL_INPUTS.get(name, 'standard')
+
+def convert_tflite(model, precision, samples, key):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if precision == "fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision == "int8":
+        # Lượng tử hóa toàn bộ trọng số + activation về int8; input/output vẫn float32
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([s[key].astype(np.float32)] for s in samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS]
+    return converter.convert()
+
+def convert_onnx(model, key, output_path):
+    import tf2onnx
+    spec = INPUT_SIGNATURES[key]
+    signature = (tf.TensorSpec(spec.shape, spec.dtype, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=17, output_path=output_path)
+
+def quantize_onnx_int8(fp32_path, output_path, samples, key):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class SampleReader(CalibrationDataReader):
+        def __init__(self):
+            self._iter = iter(samples)
+        def get_next(self):
+            sample = next(self._iter, None)
+            return None if sample is None else {"input": sample[key].astype(np.float32)}
+
+    quantize_static(
+        fp32_path, output_path, SampleReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+def convert_model(name, fmt, precision, samples, out_dir):
+    src = MODEL_PATHS[name]
+    if not os.path.exists(src):
+        print(f"   ⚠️ Không tìm thấy {src}, bỏ qua {name}")
+        return None
+    model = tf.keras.models.load_model(src, compile=False)
+    key = input_key(name)
+    target = converted_path(src, fmt, precision, out_dir)
+
+    if fmt == "tflite":
+        with open(target, "wb") as f:
+            f.write(convert_tflite(model, precision, samples, key))
+    else:
+        fp32_path = converted_path(src, "onnx", "fp32", out_dir)
+        if not os.path.exists(fp32_path) or precision == "fp32":
+            convert_onnx(model, key, fp32_path)
+        if precision == "int8":
+            quantize_onnx_int8(fp32_path, target, samples, key)
+        else:
+            target = fp32_path
+
+    print(f"   ✅ {name}: {os.path.getsize(src) / 2**20:.1f} MB -> {os.path.getsize(target) / 2**20:.1f} MB ({target})")
+    return target
+
+def main():
+    parser = argparse.ArgumentParser(description="Chuyển đổi + lượng tử hóa model AURA")
+    parser.add_argument("--to", choices=["tflite", "onnx"], required=True)
+    parser.add_argument("--precision", choices=["fp32", "fp16", "int8"], default="int8")
+    parser.add_argument("--calibration-dir", help="Thư mục ảnh đáy mắt để hiệu chỉnh int8")
+    parser.add_argument("--samples", type=int, default=64)
+    parser.add_argument("--models", default=",".join(MODEL_PATHS), help="VD: HE,MA,CLASSIFIER")
+    parser.add_argument("--out-dir", default=CONVERTED_DIR)
+    args = parser.parse_args()
+
+    if args.to == "onnx" and args.precision == "fp16":
+        parser.error("ONNX trên CPU chỉ hỗ trợ fp32 / int8")
+    os.makedirs(args.out_dir, exist_ok=True)
+    samples = load_sample_inputs(args.calibration_dir, args.samples) if args.precision == "int8" else []
+
+    print(f"⏳ Đang chuyển model sang {args.to} ({args.precision})...")
+    for name in [n.strip() for n in args.models.split(",") if n.strip()]:
+        convert_model(name, args.to, args.precision, samples, args.out_dir)
+    print("🚀 Xong! Kiểm tra độ lệch bằng: python -m ai.parity_report")
+
+if __name__ == "__main__":
+    main()
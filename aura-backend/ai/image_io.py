@@ -0,0 +1,69 @@
+# aura-backend/ai/image_io.py
+# Đọc ảnh 1 lần cho cả pipeline: đọc kích thước từ header (không giải mã),
+# giải mã JPEG ở độ phân giải giảm (DCT scaling của libjpeg) và dựng kim tự tháp 512/256/224.
+import struct
+import numpy as np
+import cv2
+
+PYRAMID_SIZES = (512, 256, 224)
+
+# Marker SOF của JPEG chứa kích thước ảnh (bỏ qua DHT=C4, JPG=C8, DAC=CC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_REDUCED_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+
+def read_image_header(data):
+    """Trả về (format, width, height) từ vài byte đầu của JPEG/PNG; None nếu không nhận dạng được"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24 and data[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", data[16:24])
+        return "png", width, height
+    if data[:2] != b"\xff\xd8":
+        return None
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:          # Byte đệm
+            i += 1
+            continue
+        if marker in (0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7):  # Marker không có độ dài
+            i += 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker in _JPEG_SOF_MARKERS:
+            if i + 9 > n: return None
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return "jpeg", width, height
+        i += 2 + length
+    return None
+
+def decode_image(image_bytes, min_side=512):
+    """
+    Giải mã ảnh sang RGB uint8. Với JPEG lớn (VD ảnh đáy mắt 12MP) giải mã thẳng ở 1/2, 1/4, 1/8
+    độ phân giải sao cho cạnh ngắn vẫn >= min_side => nhanh hơn và ít RAM hơn giải mã full.
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    flag = cv2.IMREAD_COLOR
+    header = read_image_header(image_bytes)
+    if header and header[0] == "jpeg":
+        short_side = min(header[1], header[2])
+        for factor in (8, 4, 2):
+            if short_side // factor >= min_side:
+                flag = _REDUCED_FLAGS[factor]
+                break
+    img = cv2.imdecode(nparr, flag)
+    if img is None:
+        raise ValueError("Không giải mã được ảnh (file hỏng hoặc không phải ảnh)")
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def build_pyramid(rgb, sizes=PYRAMID_SIZES):
+    """
+    Dựng các mức vuông (uint8) từ ảnh đã giải mã: chỉ mức lớn nhất resize từ ảnh gốc,
+    các mức nhỏ hơn lấy từ mức lớn nhất (INTER_AREA chống răng cưa khi thu nhỏ).
+    """
+    sizes = sorted(sizes, reverse=True)
+    top = cv2.resize(rgb, (sizes[0], sizes[0]), interpolation=cv2.INTER_AREA)
+    pyramid = {sizes[0]: top}
+    for size in sizes[1:]:
+        pyramid[size] = cv2.resize(top, (size, size), interpolation=cv2.INTER_AREA)
+    return pyramid
@@ -5,134 +5,262 @@ import cv2
 import tensorflow as tf
 from tensorflow.keras.applications.efficientnet import preprocess_input
 
-# --- CẤU HÌNH ĐƯỜNG DẪN MODEL (Đã cập nhật trỏ vào folder 'ai/') ---
-MODEL_PATHS = {
-    'EX': 'ai/unet_mega_fusion.keras',      
-    'HE': 'ai/unet_hemorrhages.keras',      
-    'SE': 'ai/unet_soft_exudates.keras',    
-    'MA': 'ai/unet_microaneurysms.keras',   
-    'OD': 'ai/unet_optic_disc.keras',       
-    'Vessels': 'ai/unet_vessels_pro.keras', 
-    'CLASSIFIER': 'ai/aura_retinal_model_final.keras' 
+# Model được nạp khi cần / warm-up nền qua registry (xem ai/registry.py), không nạp lúc import
+from ai.registry import MODEL_PATHS, model_registry, active_backend
+from ai.lesions import analyze_components, MAX_LESIONS_PER_TYPE
+from ai.image_io import decode_image, build_pyramid, PYRAMID_SIZES
+from ai.timing import timed
+from ai import tiling
+
+# --- CHẾ ĐỘ THỰC THI MODEL ---
+# "graph"  : gọi model qua tf.function đã biên dịch với input signature cố định
+#            (bỏ qua data adapter + callback của Model.predict, rất tốn với batch nhỏ)
+# "predict": đường cũ, dùng Model.predict(..., verbose=0)
+INFERENCE_MODE = os.getenv("AURA_INFERENCE_MODE", "graph")
+
+# Kích thước batch để None => chỉ trace 1 lần cho mọi kích thước batch
+INPUT_SIGNATURES = {
+    'standard': tf.TensorSpec(shape=[None, 256, 256, 3], dtype=tf.float32),
+    'vessels': tf.TensorSpec(shape=[None, 512, 512, 1], dtype=tf.float32),
+    'classifier': tf.TensorSpec(shape=[None, 224, 224, 3], dtype=tf.float32),
 }
+MODEL_INPUTS = {'Vessels': 'vessels', 'CLASSIFIER': 'classifier'}  # Còn lại dùng 'standard'
 
-loaded_models = {}
+_compiled_fns = {}
+_fused_fns = {}
 
-print("⏳ [AI MODULE] ĐANG KHỞI ĐỘNG HỆ THỐNG AURA AI...")
-for name, path in MODEL_PATHS.items():
-    if os.path.exists(path):
-        try:
-            # compile=False để tránh lỗi hàm loss tùy chỉnh
-            loaded_models[name] = tf.keras.models.load_model(path, compile=False)
-            print(f"   ✅ Đã tải Module: {name}")
-        except Exception as e:
-            print(f"   ❌ Lỗi tải {name}: {e}")
-    else:
-        # Thử tìm ở thư mục gốc nếu chạy từ server
-        print(f"   ⚠️ Không tìm thấy file tại {path}. Đang thử tìm đường dẫn tuyệt đối...")
+def _compile_model(name):
+    model = model_registry.get(name)
+    signature = INPUT_SIGNATURES[MODEL_INPUTS.get(name, 'standard')]
+
+    @tf.function(input_signature=[signature])
+    def forward(x):
+        return model(x, training=False)
+    return forward
+
+def _compile_fused(names):
+    """Gộp nhiều model dùng chung input_standard thành MỘT lần gọi graph"""
+    models = [model_registry.get(n) for n in names]
+
+    @tf.function(input_signature=[INPUT_SIGNATURES['standard']])
+    def forward(x):
+        return [m(x, training=False) for m in models]
+    return forward
+
+def predict_model(name, batch, mode=None):
+    """Chạy 1 model trên batch numpy, trả về numpy"""
+    with timed("model", name):
+        return _predict_model(name, batch, mode)
+
+def _predict_model(name, batch, mode):
+    if not active_backend.supports_graph:
+        # TFLite / ONNX Runtime: runner tự xử lý batch
+        return active_backend.predict(model_registry.get(name), batch)
+    mode = mode or INFERENCE_MODE
+    if mode == "predict":
+        return model_registry.get(name).predict(batch, batch_size=len(batch), verbose=0)
+    if name not in _compiled_fns:
+        _compiled_fns[name] = _compile_model(name)
+    return _compiled_fns[name](np.asarray(batch, dtype=np.float32)).numpy()
+
+def predict_standard_group(names, batch, mode=None):
+    """Chạy các model 256x256 trên cùng input_standard; trả về dict tên -> numpy"""
+    mode = mode or INFERENCE_MODE
+    if mode == "predict" or not active_backend.supports_graph:
+        return {n: predict_model(n, batch, mode) for n in names}
+    for n in names: model_registry.get(n)
+    if not all(model_registry.is_loaded(n) for n in names):
+        # Ngân sách RAM không đủ giữ cả nhóm => chạy lần lượt từng model
+        return {n: predict_model(n, batch, mode) for n in names}
+    key = tuple(names)
+    if key not in _fused_fns:
+        _fused_fns[key] = _compile_fused(names)
+    # Nhóm hợp nhất chạy trong 1 graph => chỉ đo được chung cả nhóm
+    with timed("model", "standard_fused"):
+        outputs = _fused_fns[key](np.asarray(batch, dtype=np.float32))
+        return {n: out.numpy() for n, out in zip(names, outputs)}
 
-print(f"🚀 [AI MODULE] SẴN SÀNG! ({len(loaded_models)}/{len(MODEL_PATHS)} modules)")
+def _drop_compiled(name):
+    """Model bị đuổi khỏi RAM => bỏ graph đã biên dịch đang giữ tham chiếu tới nó"""
+    _compiled_fns.pop(name, None)
+    for key in [k for k in _fused_fns if name in k]:
+        _fused_fns.pop(key, None)
+
+def _warmup_forward(name, model):
+    """Forward giả với input toàn 0 ngay sau khi nạp để trace graph trước request thật"""
+    spec = INPUT_SIGNATURES[MODEL_INPUTS.get(name, 'standard')]
+    dummy = np.zeros([1] + spec.shape.as_list()[1:], dtype=np.float32)
+    predict_model(name, dummy)
+
+def _warmup_fused():
+    # Trace đúng các nhóm mà run_models sẽ gọi (chế độ tile tách model tổn thương ra nhóm riêng)
+    names = [n for n in ('OD', 'HE', 'MA', 'EX', 'SE') if model_registry.is_loaded(n)]
+    single_names, tiled_names = _split_tiled(names, tiling.TILED_LESIONS)
+    for group in (single_names, tiled_names):
+        if group: predict_standard_group(group, np.zeros((1, 256, 256, 3), dtype=np.float32))
+
+model_registry.add_evict_listener(_drop_compiled)
+model_registry.warmup_forward = _warmup_forward
+model_registry.after_warmup = _warmup_fused
 
 # --- CÁC HÀM XỬ LÝ ẢNH ---
 
+def _resize_square(img_array, size):
+    # Ảnh đã là mức kim tự tháp đúng kích thước => không resize lại
+    if img_array.shape[0] == size and img_array.shape[1] == size: return img_array
+    return cv2.resize(img_array, (size, size), interpolation=cv2.INTER_AREA)
+
 def preprocess_for_segmentation(img_array, target_size=256):
-    img = cv2.resize(img_array, (target_size, target_size))
-    img = img / 255.0
+    img = _resize_square(img_array, target_size)
+    img = img.astype(np.float32) / 255.0
     img = np.expand_dims(img, axis=0)
     return img
 
 def preprocess_for_vessels_pro(img_array):
-    img = cv2.resize(img_array, (512, 512))
-    green_channel = img[:, :, 1]
+    img = _resize_square(img_array, 512)
+    green_channel = np.ascontiguousarray(img[:, :, 1])
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
     enhanced_img = clahe.apply(green_channel)
-    enhanced_img = enhanced_img / 255.0
+    enhanced_img = enhanced_img.astype(np.float32) / 255.0
     enhanced_img = np.expand_dims(enhanced_img, axis=-1)
     enhanced_img = np.expand_dims(enhanced_img, axis=0)
     return enhanced_img
 
 def preprocess_for_classifier(img_array):
-    img = cv2.resize(img_array, (224, 224))
+    img = _resize_square(img_array, 224)
     img = cv2.addWeighted(img, 4, cv2.GaussianBlur(img, (0,0), 10), -4, 128)
-    img = preprocess_input(img)
+    img = preprocess_input(img.astype(np.float32))
     img = np.expand_dims(img, axis=0)
     return img
 
 def clean_mask(mask_array, min_size=20):
-    mask_uint8 = (mask_array * 255).astype(np.uint8)
-    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask_uint8, connectivity=8)
-    cleaned_mask = np.zeros_like(mask_uint8)
-    for i in range(1, num_labels):
-        area = stats[i, cv2.CC_STAT_AREA]
-        if area >= min_size:
-            cleaned_mask[labels == i] = 255
-    return cleaned_mask.astype(np.float32) / 255.0
+    cleaned, _ = analyze_components(mask_array > 0, min_size)
+    return cleaned
 
 # --- HÀM INFERENCE CHÍNH (Được gọi từ Main) ---
-def run_aura_inference(image_bytes):
-    # 1. Đọc ảnh
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    original_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    original_rgb = cv2.cvtColor(original_img, cv2.COLOR_BGR2RGB)
-    
-    OUT_SIZE = 256
-    
-    # Preprocess
-    input_standard = preprocess_for_segmentation(original_rgb, target_size=OUT_SIZE)
-    input_vessels = preprocess_for_vessels_pro(original_rgb)
-    input_classifier = preprocess_for_classifier(original_rgb)
-    
+OUT_SIZE = 256
+CLASS_MAP = {0: "Bình thường (No DR)", 1: "Nhẹ (Mild)", 2: "Trung bình (Moderate)", 3: "Nặng (Severe)", 4: "Tăng sinh (Proliferative)"}
+
+# Các model U-Net dùng chung input 256x256x3 (input_standard)
+# (tên model, ngưỡng xác suất, min_size cho clean_mask hoặc None nếu không lọc)
+STANDARD_SEGMENTATION = [
+    ('OD', 0.5, None),
+    ('HE', 0.5, 15),
+    ('MA', 0.2, 5),
+    ('EX', 0.5, 20),
+    ('SE', 0.3, 20),
+]
+
+def _split_tiled(names, tiled):
+    """Tách model 256x256 thành (chạy 1 lần trên ảnh 256, chạy theo tile độ phân giải cao)"""
+    if not tiled: return list(names), []
+    return [n for n in names if n not in tiling.TILED_MODELS], [n for n in names if n in tiling.TILED_MODELS]
+
+def prepare_inputs(image_bytes, tiled=None):
+    """
+    Giải mã ảnh + tạo 3 tensor đầu vào (batch 1) cho một lượt quét.
+    tiled (mặc định theo AURA_TILED_LESIONS): thêm tile độ phân giải cao cho các model trong TILED_MODELS.
+    """
+    tiled = tiling.TILED_LESIONS if tiled is None else tiled
+    # Giải mã 1 lần (JPEG lớn giải mã ở độ phân giải giảm) rồi dựng kim tự tháp 512/256/224 dùng chung
+    min_side = max(max(PYRAMID_SIZES), tiling.TILE_RESOLUTION) if tiled else max(PYRAMID_SIZES)
+    rgb = decode_image(image_bytes, min_side=min_side)
+    pyramid = build_pyramid(rgb)
+
+    prepared = {
+        "rgb_256": pyramid[OUT_SIZE],   # Nền cho ảnh overlay
+        "standard": preprocess_for_segmentation(pyramid[OUT_SIZE], target_size=OUT_SIZE),
+        "vessels": preprocess_for_vessels_pro(pyramid[512]),
+        "classifier": preprocess_for_classifier(pyramid[224]),
+    }
+    if tiled: prepared.update(tiling.prepare_tiles(rgb))
+    return prepared
+
+def run_models(prepared_list, mode=None):
+    """Chạy mỗi model MỘT lần cho cả batch, trả về list dict dự đoán theo từng ảnh"""
+    batch_size = len(prepared_list)
+    batches = {
+        key: np.concatenate([p[key] for p in prepared_list], axis=0)
+        for key in ("standard", "vessels", "classifier")
+    }
+    preds = [{} for _ in range(batch_size)]
+
+    if model_registry.is_available('Vessels'):
+        out = predict_model('Vessels', batches["vessels"], mode)
+        for i in range(batch_size): preds[i]['Vessels'] = out[i]
+
+    # 5 model 256x256 chung input_standard => 1 lần gọi graph hợp nhất
+    standard_names = [name for name, _, _ in STANDARD_SEGMENTATION if model_registry.is_available(name)]
+    single_names, tiled_names = _split_tiled(standard_names, "tiles" in prepared_list[0])
+    if single_names:
+        outputs = predict_standard_group(single_names, batches["standard"], mode)
+        for name, out in outputs.items():
+            for i in range(batch_size): preds[i][name] = out[i, :, :, 0]
+
+    # Chế độ tile: tile của mọi ảnh trong batch đi chung 1 lần gọi nhóm model tổn thương
+    if tiled_names:
+        with timed("stage", "tiled_lesions"):
+            tiled_preds = tiling.predict_tiled(
+                lambda names, batch: predict_standard_group(names, batch, mode), prepared_list, tiled_names)
+        for i, masks in enumerate(tiled_preds): preds[i].update(masks)
+
+    if model_registry.is_available('CLASSIFIER'):
+        out = predict_model('CLASSIFIER', batches["classifier"], mode)
+        for i in range(batch_size): preds[i]['CLASSIFIER'] = out[i]
+
+    return preds
+
+def render_overlay(rgb, combined_mask):
+    """Tô mask tổn thương (đỏ) / mạch máu (xanh lá) / đĩa thị (xanh dương) lên ảnh, trả về BGR uint8"""
+    img_resized = rgb.astype(np.float32) / 255.0
+    overlay = img_resized * (1 - combined_mask * np.float32(0.4)) + combined_mask * np.float32(0.5)
+    overlay = np.clip(overlay * 255, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(overlay, cv2.COLOR_RGB2BGR)
+
+def build_report(prepared, preds):
+    """Hậu xử lý mask + luật hội chẩn cho MỘT ảnh từ kết quả dự đoán"""
     findings = {}
-    combined_mask = np.zeros((OUT_SIZE, OUT_SIZE, 3))
-    
+    combined_mask = np.zeros((OUT_SIZE, OUT_SIZE, 3), dtype=np.float32)
+
     # --- PHẦN 1: SEGMENTATION ---
-    if 'Vessels' in loaded_models:
-        pred = loaded_models['Vessels'].predict(input_vessels, verbose=0)[0]
-        pred = cv2.resize(pred, (OUT_SIZE, OUT_SIZE))
+    if 'Vessels' in preds:
+        pred = cv2.resize(preds['Vessels'], (OUT_SIZE, OUT_SIZE))
         mask = (pred > 0.5).astype(np.float32)
         findings['Vessels_Density'] = np.sum(mask)
         combined_mask[:,:,1] = np.maximum(combined_mask[:,:,1], mask) 
 
-    if 'OD' in loaded_models:
-        pred = loaded_models['OD'].predict(input_standard, verbose=0)[0,:,:,0]
-        mask = (pred > 0.5).astype(np.float32)
+    if 'OD' in preds:
+        mask = (preds['OD'] > 0.5).astype(np.float32)
         findings['OD_Area'] = np.sum(mask)
         combined_mask[:,:,2] = np.maximum(combined_mask[:,:,2], mask)
 
-    if 'HE' in loaded_models:
-        pred = loaded_models['HE'].predict(input_standard, verbose=0)[0,:,:,0]
-        mask = clean_mask((pred > 0.5).astype(np.float32), min_size=15)
-        findings['HE_Count'] = np.sum(mask)
-        combined_mask[:,:,0] = np.maximum(combined_mask[:,:,0], mask)
-
-    if 'MA' in loaded_models:
-        pred = loaded_models['MA'].predict(input_standard, verbose=0)[0,:,:,0]
-        mask = clean_mask((pred > 0.2).astype(np.float32), min_size=5)
-        findings['MA_Count'] = np.sum(mask)
-        combined_mask[:,:,0] = np.maximum(combined_mask[:,:,0], mask)
-
-    if 'EX' in loaded_models:
-        pred = loaded_models['EX'].predict(input_standard, verbose=0)[0,:,:,0]
-        mask = clean_mask((pred > 0.5).astype(np.float32), min_size=20)
-        findings['EX_Count'] = np.sum(mask)
-        combined_mask[:,:,0] = np.maximum(combined_mask[:,:,0], mask)
-        combined_mask[:,:,1] = np.maximum(combined_mask[:,:,1], mask)
-
-    if 'SE' in loaded_models:
-        pred = loaded_models['SE'].predict(input_standard, verbose=0)[0,:,:,0]
-        mask = clean_mask((pred > 0.3).astype(np.float32), min_size=20)
-        findings['SE_Count'] = np.sum(mask)
-        combined_mask[:,:,0] = np.maximum(combined_mask[:,:,0], mask)
-        combined_mask[:,:,1] = np.maximum(combined_mask[:,:,1], mask)
+    lesions, lesion_counts = [], {}
+    for name, threshold, min_size in STANDARD_SEGMENTATION:
+        if name == 'OD' or name not in preds: continue
+        pred = preds[name]
+        # Mask từ chế độ tile lớn hơn 256: min_size giữ nguyên theo pixel của tile (cùng thang với input 256 của model,
+        # phóng theo diện tích sẽ lọc mất đúng các vi phình mạch nhỏ mà chế độ tile cần giữ);
+        # chỉ tổng số pixel (_Count) quy về thang 256 => luật hội chẩn giữ nguyên ngưỡng
+        scale = (pred.shape[0] / OUT_SIZE) ** 2
+        mask, model_lesions = analyze_components(pred > threshold, min_size, lesion_type=name)
+        if scale != 1:
+            for lesion in model_lesions: lesion["mask_size"] = pred.shape[0]   # 'area' tính theo pixel mask này
+            mask_256 = (cv2.resize(mask, (OUT_SIZE, OUT_SIZE), interpolation=cv2.INTER_AREA) > 0).astype(np.float32)
+        else:
+            mask_256 = mask
+        lesion_counts[name] = len(model_lesions)
+        lesions.extend(model_lesions[:MAX_LESIONS_PER_TYPE])  # Đã sắp theo diện tích giảm dần
+        findings[f'{name}_Count'] = np.sum(mask) / scale
+        combined_mask[:,:,0] = np.maximum(combined_mask[:,:,0], mask_256)
+        if name in ('EX', 'SE'):
+            combined_mask[:,:,1] = np.maximum(combined_mask[:,:,1], mask_256)
 
     # --- PHẦN 2: CLASSIFICATION ---
     classifier_result = "Không xác định"
     classifier_confidence = 0.0
-    if 'CLASSIFIER' in loaded_models:
-        preds = loaded_models['CLASSIFIER'].predict(input_classifier, verbose=0)
-        class_idx = np.argmax(preds[0])
-        classifier_confidence = float(np.max(preds[0]))
-        CLASS_MAP = {0: "Bình thường (No DR)", 1: "Nhẹ (Mild)", 2: "Trung bình (Moderate)", 3: "Nặng (Severe)", 4: "Tăng sinh (Proliferative)"}
+    if 'CLASSIFIER' in preds:
+        class_idx = int(np.argmax(preds['CLASSIFIER']))
+        classifier_confidence = float(np.max(preds['CLASSIFIER']))
         classifier_result = CLASS_MAP.get(class_idx, "Không xác định")
 
     # --- PHẦN 3: LOGIC HỘI CHẨN (RULE-BASED) ---
@@ -183,13 +311,51 @@ def run_aura_inference(image_bytes):
 
     if od_area > 4500: risk_report.append("\n👁️ GLOCOM: ⚠️ Kích thước đĩa thị lớn, nghi ngờ lõm gai.")
 
-    # Tạo ảnh Overlay
-    img_resized = cv2.resize(original_rgb, (OUT_SIZE, OUT_SIZE)).astype(np.float32) / 255.0
-    overlay = img_resized * (1 - combined_mask * 0.4) + combined_mask * 0.5
-    overlay = np.clip(overlay * 255, 0, 255).astype(np.uint8)
-    overlay_bgr = cv2.cvtColor(overlay, cv2.COLOR_RGB2BGR)
+    overlay_bgr = render_overlay(prepared["rgb_256"], combined_mask)
     
     detailed_risk_text = "\n".join(risk_report) + warning_note
     detailed_risk_text += f"\n\n--- THÔNG SỐ KỸ THUẬT ---\n• HE: {int(he_count)} | MA: {int(ma_count)} | EX+SE: {int(ex_count+se_count)}"
+    detailed_risk_text += (f"\n• Số ổ tổn thương - HE: {lesion_counts.get('HE', 0)} | MA: {lesion_counts.get('MA', 0)}"
+                           f" | EX: {lesion_counts.get('EX', 0)} | SE: {lesion_counts.get('SE', 0)}")
+
+    return {
+        "overlay": overlay_bgr,
+        "diagnosis": final_diagnosis,
+        "risk_text": detailed_risk_text,
+        "findings": {k: float(v) for k, v in findings.items()},
+        "lesion_counts": lesion_counts,
+        "lesions": lesions,
+        "mask_size": OUT_SIZE,
+    }
 
-    return overlay_bgr, final_diagnosis, detailed_risk_text
\ No newline at end of file
+def run_aura_inference_batch(images_bytes):
+    """
+    Chạy pipeline cho NHIỀU ảnh cùng lúc (mỗi model chỉ predict 1 lần / batch).
+    Trả về list cùng thứ tự: phần tử là dict kết quả, hoặc Exception nếu ảnh đó lỗi
+    (ảnh hỏng không làm hỏng cả batch).
+    """
+    results = [None] * len(images_bytes)
+    prepared, positions = [], []
+    for i, image_bytes in enumerate(images_bytes):
+        try:
+            with timed("stage", "prepare"):
+                prepared.append(prepare_inputs(image_bytes))
+            positions.append(i)
+        except Exception as e:
+            results[i] = e
+
+    if prepared:
+        with timed("stage", "models"):
+            preds = run_models(prepared)
+        for pos, item, pred in zip(positions, prepared, preds):
+            try:
+                with timed("stage", "report"):
+                    results[pos] = build_report(item, pred)
+            except Exception as e:
+                results[pos] = e
+    return results
+
+def run_aura_inference(image_bytes):
+    result = run_aura_inference_batch([image_bytes])[0]
+    if isinstance(result, Exception): raise result
+    return result["overlay"], result["diagnosis"], result["risk_text"]
@@ -0,0 +1,49 @@
+# aura-backend/ai/lesions.py
+# Phân tích tổn thương theo từng ổ (connected component) - vector hóa, không lặp từng nhãn trên toàn ảnh.
+import numpy as np
+import cv2
+
+LESION_TYPES = {
+    'HE': "Xuất huyết (Hemorrhage)",
+    'MA': "Vi phình mạch (Microaneurysm)",
+    'EX': "Xuất tiết cứng (Hard Exudate)",
+    'SE': "Xuất tiết mềm (Soft Exudate)",
+}
+
+# Giới hạn số ổ lưu vào hồ sơ cho mỗi loại (giữ ổ lớn nhất) để document Mongo không phình to
+MAX_LESIONS_PER_TYPE = 300
+
+def analyze_components(binary_mask, min_size, lesion_type=None):
+    """
+    Lọc ổ nhỏ hơn min_size bằng MỘT phép tra bảng (keep[labels]) và trả về bảng tổn thương.
+    binary_mask: mảng 2D (bool / 0-1). Tọa độ trong bảng được chuẩn hóa về [0, 1] theo kích thước mask.
+    Trả về (mask float32 0/1 đã lọc, list dict tổn thương sắp theo diện tích giảm dần)
+    """
+    mask_uint8 = np.asarray(binary_mask, dtype=np.uint8)
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask_uint8, connectivity=8)
+
+    keep = stats[:, cv2.CC_STAT_AREA] >= min_size
+    keep[0] = False  # Nhãn 0 là nền
+    cleaned = keep[labels].astype(np.float32)
+
+    kept = np.flatnonzero(keep)
+    if lesion_type is None or kept.size == 0:
+        return cleaned, []
+
+    h, w = mask_uint8.shape[:2]
+    areas = stats[kept, cv2.CC_STAT_AREA]
+    order = kept[np.argsort(-areas, kind="stable")]
+    boxes = stats[order, :4].astype(np.float64) / [w, h, w, h]
+    centers = centroids[order] / [w, h]
+
+    lesions = [
+        {
+            "type": lesion_type,
+            "label": LESION_TYPES.get(lesion_type, lesion_type),
+            "area": int(area),
+            "centroid": [round(float(cx), 4), round(float(cy), 4)],
+            "bbox": [round(float(v), 4) for v in box],   # x, y, w, h
+        }
+        for area, (cx, cy), box in zip(stats[order, cv2.CC_STAT_AREA], centers, boxes)
+    ]
+    return cleaned, lesions
@@ -0,0 +1,100 @@
+# aura-backend/ai/parity_report.py
+# So sánh kết quả của backend chuyển đổi (TFLite / ONNX, có thể int8) với model Keras gốc:
+# độ trùng mask (Dice) theo đúng ngưỡng của pipeline, sai số xác suất, và độ khớp nhãn CLASS_MAP.
+# Chạy: python -m ai.parity_report --backend tflite --precision int8 --images data/val --out parity.json
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from ai.registry import MODEL_PATHS
+from ai.backends import create_backend, TensorFlowBackend
+from ai.inference import CLASS_MAP, STANDARD_SEGMENTATION
+from ai.convert_models import load_sample_inputs, input_key
+
+THRESHOLDS = {name: threshold for name, threshold, _ in STANDARD_SEGMENTATION}
+THRESHOLDS['Vessels'] = 0.5
+
+def dice(a, b):
+    total = a.sum() + b.sum()
+    return 1.0 if total == 0 else float(2.0 * np.logical_and(a, b).sum() / total)
+
+def compare_model(name, reference, candidate, ref_backend, cand_backend, samples):
+    key = input_key(name)
+    ref_times, cand_times, diffs, scores = [], [], [], []
+    for sample in samples:
+        x = sample[key].astype(np.float32)
+        t0 = time.perf_counter(); ref_out = ref_backend.predict(reference, x)
+        t1 = time.perf_counter(); cand_out = cand_backend.predict(candidate, x)
+        t2 = time.perf_counter()
+        ref_times.append(t1 - t0); cand_times.append(t2 - t1)
+        diffs.append(float(np.abs(ref_out - cand_out).max()))
+
+        if name == 'CLASSIFIER':
+            scores.append(int(np.argmax(ref_out[0])) == int(np.argmax(cand_out[0])))
+        else:
+            threshold = THRESHOLDS[name]
+            scores.append(dice(ref_out[0] > threshold, cand_out[0] > threshold))
+
+    report = {
+        "max_abs_diff": max(diffs),
+        "mean_max_abs_diff": float(np.mean(diffs)),
+        "reference_ms": float(np.median(ref_times) * 1000),
+        "candidate_ms": float(np.median(cand_times) * 1000),
+        "candidate_size_mb": round(getattr(candidate, "size_bytes", 0) / 2**20, 2),
+    }
+    if name == 'CLASSIFIER':
+        report["top1_agreement"] = float(np.mean(scores))
+        # Nhãn dự đoán trên ảnh đầu tiên để người đọc nhìn nhanh
+        first = samples[0][key].astype(np.float32)
+        report["example_labels"] = {
+            "reference": CLASS_MAP.get(int(np.argmax(ref_backend.predict(reference, first)[0]))),
+            "candidate": CLASS_MAP.get(int(np.argmax(cand_backend.predict(candidate, first)[0]))),
+        }
+    else:
+        report["mean_dice"] = float(np.mean(scores))
+        report["min_dice"] = float(np.min(scores))
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Báo cáo độ lệch giữa backend chuyển đổi và Keras gốc")
+    parser.add_argument("--backend", choices=["tflite", "onnx"], required=True)
+    parser.add_argument("--precision", choices=["fp32", "fp16", "int8"], default="int8")
+    parser.add_argument("--images", help="Thư mục ảnh đáy mắt để so sánh")
+    parser.add_argument("--limit", type=int, default=32)
+    parser.add_argument("--min-dice", type=float, default=0.90, help="Ngưỡng Dice trung bình tối thiểu cho mask")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="Tỉ lệ khớp nhãn classifier tối thiểu")
+    parser.add_argument("--out", help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+
+    ref_backend = TensorFlowBackend()
+    cand_backend = create_backend(args.backend, precision=args.precision)
+    candidate_paths = cand_backend.model_paths(MODEL_PATHS)
+    samples = load_sample_inputs(args.images, args.limit)
+
+    results, failed = {}, []
+    for name, keras_path in MODEL_PATHS.items():
+        if not (os.path.exists(keras_path) and os.path.exists(candidate_paths[name])):
+            print(f"   ⚠️ Thiếu file cho {name}, bỏ qua")
+            continue
+        # Nạp từng cặp model một để giới hạn RAM
+        reference = ref_backend.load(keras_path)
+        candidate = cand_backend.load(candidate_paths[name])
+        results[name] = report = compare_model(name, reference, candidate, ref_backend, cand_backend, samples)
+        ok = report.get("mean_dice", 1.0) >= args.min_dice and report.get("top1_agreement", 1.0) >= args.min_agreement
+        if not ok: failed.append(name)
+        metric = f"agreement={report['top1_agreement']:.3f}" if name == 'CLASSIFIER' else f"dice={report['mean_dice']:.3f}"
+        print(f"   {'✅' if ok else '❌'} {name}: {metric} | {report['reference_ms']:.1f} ms -> {report['candidate_ms']:.1f} ms")
+        del reference, candidate
+
+    summary = {"backend": args.backend, "precision": args.precision, "samples": len(samples), "models": results, "failed": failed}
+    if args.out:
+        with open(args.out, "w") as f: json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(json.dumps({"failed": failed}, ensure_ascii=False))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# aura-backend/ai/registry.py
+# Quản lý model AI: nạp khi cần (lazy) hoặc warm-up nền, đuổi model ít dùng nhất khi vượt ngân sách RAM.
+# KHÔNG import TensorFlow ở đây để API có thể hỏi trạng thái mà không phải nạp TF.
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from ai.backends import create_backend
+
+# --- CẤU HÌNH ĐƯỜNG DẪN MODEL (Đã cập nhật trỏ vào folder 'ai/') ---
+MODEL_PATHS = {
+    'EX': 'ai/unet_mega_fusion.keras',
+    'HE': 'ai/unet_hemorrhages.keras',
+    'SE': 'ai/unet_soft_exudates.keras',
+    'MA': 'ai/unet_microaneurysms.keras',
+    'OD': 'ai/unet_optic_disc.keras',
+    'Vessels': 'ai/unet_vessels_pro.keras',
+    'CLASSIFIER': 'ai/aura_retinal_model_final.keras'
+}
+
+# Danh sách module bật (VD: "OD,HE,MA,CLASSIFIER"); để trống = bật tất cả
+ENABLED_MODELS = [n.strip() for n in os.getenv("AURA_ENABLED_MODELS", "").split(",") if n.strip()] or list(MODEL_PATHS)
+# Ngân sách RAM cho model (MB); 0 = không giới hạn
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("AURA_MODEL_MEMORY_BUDGET_MB", 0))
+
+def estimate_model_bytes(model):
+    """Ước lượng RAM của model: kích thước file (TFLite/ONNX) hoặc số tham số float32 (Keras)"""
+    if getattr(model, "size_bytes", None):
+        return int(model.size_bytes)
+    try:
+        return int(model.count_params()) * 4
+    except Exception:
+        return 0
+
+class ModelEntry:
+    def __init__(self, model, size_bytes):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.warm = False
+
+class ModelRegistry:
+    def __init__(self, model_paths, loader, enabled=ENABLED_MODELS, memory_budget_mb=MODEL_MEMORY_BUDGET_MB):
+        self.model_paths = dict(model_paths)
+        self.enabled = [n for n in enabled if n in self.model_paths]
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.loader = loader
+        # Hook do ai/inference.py gán: forward giả sau khi nạp 1 model (trace graph),
+        # và bước cuối sau khi warm-up toàn bộ (trace graph hợp nhất)
+        self.warmup_forward = None
+        self.after_warmup = None
+        self._entries = OrderedDict()   # Thứ tự = LRU (đầu danh sách = ít dùng nhất)
+        self._errors = {}
+        self._lock = threading.RLock()
+        self._load_locks = {name: threading.Lock() for name in self.model_paths}
+        self._evict_listeners = []
+        self._warmup_thread = None
+        self._ever_warm = set()   # Model đã warm-up thành công ít nhất 1 lần (có thể đã bị đuổi)
+
+    # --- TRUY VẤN ---
+    def is_available(self, name):
+        """Model được bật và có thể dùng (đã nạp, hoặc có file để nạp)"""
+        if name not in self.enabled: return False
+        with self._lock:
+            if name in self._entries: return True
+        return name not in self._errors and os.path.exists(self.model_paths[name])
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._entries
+
+    def loaded_names(self):
+        with self._lock:
+            return list(self._entries)
+
+    def used_bytes(self):
+        with self._lock:
+            return sum(e.size_bytes for e in self._entries.values())
+
+    # --- NẠP / ĐUỔI ---
+    def get(self, name):
+        """Trả về model (nạp nếu chưa có) và đánh dấu vừa dùng"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry:
+                self._entries.move_to_end(name)
+                entry.last_used = time.time()
+                return entry.model
+        if name not in self.enabled:
+            raise KeyError(f"Module {name} đang bị tắt")
+        with self._load_locks[name]:   # Tránh 2 luồng cùng nạp 1 model
+            with self._lock:
+                if name in self._entries: return self._entries[name].model
+            return self._load(name)
+
+    def register(self, name, model):
+        """Đưa model có sẵn vào registry (VD: model đóng thế khi benchmark)"""
+        if name not in self.enabled: self.enabled.append(name)
+        self.model_paths.setdefault(name, "")
+        self._load_locks.setdefault(name, threading.Lock())
+        self._insert(name, model)
+
+    def _load(self, name):
+        path = self.model_paths[name]
+        started = time.perf_counter()
+        try:
+            model = self.loader(path)
+        except Exception as e:
+            self._errors[name] = str(e)
+            print(f"   ❌ Lỗi tải {name}: {e}")
+            raise
+        self._errors.pop(name, None)
+        entry = self._insert(name, model)
+        print(f"   ✅ Đã tải Module: {name} ({entry.size_bytes / 2**20:.0f} MB, {time.perf_counter() - started:.1f}s)")
+        return model
+
+    def _insert(self, name, model):
+        entry = ModelEntry(model, estimate_model_bytes(model))
+        with self._lock:
+            self._entries[name] = entry
+            self._entries.move_to_end(name)
+            self._evict_over_budget(keep=name)
+        if self.warmup_forward is None:
+            entry.warm = True
+            self._ever_warm.add(name)
+        else:
+            try:
+                self.warmup_forward(name, model)
+                entry.warm = True
+                self._ever_warm.add(name)
+            except Exception as e:
+                print(f"   ⚠️ Warm-up {name} lỗi: {e}")
+        return entry
+
+    def _evict_over_budget(self, keep):
+        if not self.memory_budget: return
+        while self.used_bytes() > self.memory_budget:
+            victim = next((n for n in self._entries if n != keep), None)
+            if victim is None:
+                print(f"   ⚠️ Module {keep} lớn hơn ngân sách RAM, vẫn giữ lại.")
+                return
+            self.evict(victim)
+
+    def evict(self, name):
+        with self._lock:
+            entry = self._entries.pop(name, None)
+        if entry:
+            for listener in self._evict_listeners: listener(name)
+            print(f"   ♻️ Đã giải phóng Module: {name} (ít dùng nhất)")
+
+    def add_evict_listener(self, fn):
+        self._evict_listeners.append(fn)
+
+    # --- WARM-UP NỀN ---
+    def warm_up(self, names=None):
+        """Nạp lần lượt các model đang bật (bỏ qua model thiếu file / lỗi)"""
+        print("⏳ [AI MODULE] ĐANG KHỞI ĐỘNG HỆ THỐNG AURA AI...")
+        for name in names or self.enabled:
+            if not self.is_available(name):
+                print(f"   ⚠️ Không tìm thấy file tại {self.model_paths[name]}. Bỏ qua {name}.")
+                continue
+            try:
+                self.get(name)
+            except Exception:
+                pass
+        print(f"🚀 [AI MODULE] SẴN SÀNG! ({len(self.loaded_names())}/{len(self.enabled)} modules)")
+
+    def _warmup_job(self, names, before):
+        try:
+            # before(): VD import ai.inference (nạp TensorFlow + gắn hook) ngay trong luồng nền
+            if before: before()
+            self.warm_up(names)
+            if self.after_warmup: self.after_warmup()
+        except Exception as e:
+            print(f"❌ [AI MODULE] Warm-up lỗi: {e}")
+
+    def start_background_warmup(self, names=None, before=None):
+        if self._warmup_thread and self._warmup_thread.is_alive(): return self._warmup_thread
+        self._warmup_thread = threading.Thread(target=self._warmup_job, args=(names, before), name="aura-model-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    # --- READINESS ---
+    def status(self):
+        with self._lock:
+            modules = {}
+            for name in self.model_paths:
+                entry = self._entries.get(name)
+                modules[name] = {
+                    "enabled": name in self.enabled,
+                    "loaded": entry is not None,
+                    "warm": bool(entry and entry.warm),
+                    "size_mb": round(entry.size_bytes / 2**20, 1) if entry else 0,
+                    "error": self._errors.get(name),
+                }
+        # Sẵn sàng khi mọi module bật (và có file) đều đã warm-up ít nhất 1 lần
+        # (model bị đuổi vì ngân sách RAM vẫn tính là sẵn sàng: sẽ nạp lại khi cần)
+        expected = [n for n in self.enabled if n in modules and (modules[n]["loaded"] or self.is_available(n))]
+        warming_up = bool(self._warmup_thread and self._warmup_thread.is_alive())
+        ready = not warming_up and all(n in self._ever_warm for n in expected)
+        return {
+            "ready": ready,
+            "warming_up": warming_up,
+            "memory_used_mb": round(self.used_bytes() / 2**20, 1),
+            "memory_budget_mb": round(self.memory_budget / 2**20, 1) if self.memory_budget else None,
+            "modules": modules,
+        }
+
+# Instance dùng chung: backend chọn qua AURA_INFERENCE_BACKEND (xem ai/backends.py)
+active_backend = create_backend()
+model_registry = ModelRegistry(active_backend.model_paths(MODEL_PATHS), active_backend.load)
@@ -0,0 +1,108 @@
+# aura-backend/ai/tiling.py
+# Chế độ tile độ phân giải cao cho model tổn thương: thay vì thu cả ảnh đáy mắt về 256x256
+# (vi phình mạch MA chỉ vài pixel => mất hẳn khi resize), cắt ảnh ở độ phân giải cao hơn thành các cửa sổ
+# 256x256 chồng lấn, chạy TẤT CẢ tile trong 1 lần gọi model rồi ghép lại thành mask độ phân giải cao.
+# Vùng chồng lấn được trộn theo trọng số giảm dần về mép tile => không lộ đường nối.
+import os
+from functools import lru_cache
+
+import numpy as np
+import cv2
+
+# --- CẤU HÌNH CHẾ ĐỘ TILE ---
+TILED_LESIONS = os.getenv("AURA_TILED_LESIONS", "0") == "1"
+TILE_SIZE = 256                                                      # = input_standard của các U-Net
+TILE_RESOLUTION = int(os.getenv("AURA_TILE_RESOLUTION", 1024))       # Ảnh vuông được cắt tile (cạnh, px)
+TILE_STRIDE = int(os.getenv("AURA_TILE_STRIDE", 192))                # < TILE_SIZE => chồng lấn TILE_SIZE - stride
+# Model chạy theo tile (còn lại vẫn chạy 1 lần trên ảnh 256); OD là cấu trúc lớn, không cần tile
+TILED_MODELS = tuple(n.strip() for n in os.getenv("AURA_TILED_MODELS", "MA,HE").split(",") if n.strip())
+# Số tile tối đa mỗi lần gọi model (batch nhiều ảnh x nhiều tile có thể vượt RAM); 0 = không giới hạn
+TILE_MAX_BATCH = int(os.getenv("AURA_TILE_MAX_BATCH", 64))
+
+# Stride <= 0 => lỗi khó hiểu giữa lúc chia lưới (range); stride > tile => bỏ sót dải ảnh giữa các tile; ảnh nhỏ hơn tile thì không cắt được
+if not 0 < TILE_STRIDE <= TILE_SIZE:
+    raise ValueError(f"AURA_TILE_STRIDE={TILE_STRIDE} không hợp lệ: cần 0 < stride <= {TILE_SIZE}")
+if TILE_RESOLUTION < TILE_SIZE:
+    raise ValueError(f"AURA_TILE_RESOLUTION={TILE_RESOLUTION} không hợp lệ: cần >= {TILE_SIZE}")
+
+def tiling_signature():
+    """Chuỗi mô tả cấu hình tile (đưa vào phiên bản cache kết quả: đổi cấu hình => kết quả khác)"""
+    if not TILED_LESIONS: return ""
+    return f"tiled:{TILE_RESOLUTION}:{TILE_STRIDE}:{','.join(sorted(TILED_MODELS))}"
+
+def tile_starts(length, tile=TILE_SIZE, stride=TILE_STRIDE):
+    """Vị trí bắt đầu các cửa sổ trên 1 trục; cửa sổ cuối luôn sát mép để phủ hết ảnh"""
+    if length <= tile: return [0]
+    starts = list(range(0, length - tile + 1, stride))
+    if starts[-1] != length - tile: starts.append(length - tile)
+    return starts
+
+def tile_grid(size, tile=TILE_SIZE, stride=TILE_STRIDE):
+    starts = tile_starts(size, tile, stride)
+    return [(y, x) for y in starts for x in starts]
+
+@lru_cache(maxsize=8)
+def blend_window(tile=TILE_SIZE, stride=TILE_STRIDE):
+    """Trọng số 2D: 1 ở giữa tile, giảm tuyến tính trong dải chồng lấn về mép (luôn > 0)"""
+    overlap = tile - stride
+    if overlap <= 0: return np.ones((tile, tile), np.float32)
+    i = np.arange(tile, dtype=np.float32)
+    ramp = np.minimum(np.minimum(i + 1, tile - i), overlap) / np.float32(overlap)
+    return np.outer(ramp, ramp)
+
+def prepare_tiles(rgb, resolution=TILE_RESOLUTION, stride=TILE_STRIDE, tile=TILE_SIZE):
+    """
+    rgb uint8 (đã giải mã) -> dict: 'tiles' float32 (N, tile, tile, 3) cùng chuẩn hóa với
+    preprocess_for_segmentation, 'tile_positions' [(y, x)], 'tile_resolution', 'tile_stride'.
+    """
+    resolution = max(int(resolution), tile)
+    if rgb.shape[0] == resolution and rgb.shape[1] == resolution:
+        square = rgb
+    else:
+        square = cv2.resize(rgb, (resolution, resolution), interpolation=cv2.INTER_AREA)
+    positions = tile_grid(resolution, tile, stride)
+    tiles = np.empty((len(positions), tile, tile, 3), dtype=np.float32)
+    for k, (y, x) in enumerate(positions):
+        tiles[k] = square[y:y + tile, x:x + tile]
+    tiles *= np.float32(1 / 255.0)
+    return {"tiles": tiles, "tile_positions": positions, "tile_resolution": resolution, "tile_stride": stride}
+
+@lru_cache(maxsize=8)
+def _inverse_weight(resolution, tile, stride):
+    """1 / tổng trọng số tại mỗi pixel: chỉ phụ thuộc lưới tile => tính 1 lần, dùng lại cho mọi ảnh / model"""
+    window = blend_window(tile, stride)
+    weight = np.zeros((resolution, resolution), dtype=np.float32)
+    for y, x in tile_grid(resolution, tile, stride):
+        weight[y:y + tile, x:x + tile] += window
+    return np.float32(1) / np.maximum(weight, np.float32(1e-6))
+
+def blend_tiles(tile_preds, positions, resolution, stride=TILE_STRIDE):
+    """Ghép dự đoán các tile (N, tile, tile) thành mask (resolution, resolution) bằng trung bình có trọng số"""
+    tile = tile_preds.shape[1]
+    window = blend_window(tile, stride)
+    acc = np.zeros((resolution, resolution), dtype=np.float32)
+    for pred, (y, x) in zip(tile_preds, positions):
+        acc[y:y + tile, x:x + tile] += pred * window
+    acc *= _inverse_weight(resolution, tile, stride)
+    return acc
+
+def predict_tiled(predict_fn, prepared_list, names, max_batch=TILE_MAX_BATCH):
+    """
+    Chạy predict_fn(names, batch) -> {tên: (N, tile, tile, 1)} trên tile của MỌI ảnh trong batch
+    (1 lần gọi, hoặc vài lần nếu vượt max_batch) rồi ghép lại theo từng ảnh.
+    Trả về list dict tên -> mask float32 (resolution, resolution), cùng thứ tự prepared_list.
+    """
+    counts = [len(p["tiles"]) for p in prepared_list]
+    batch = np.concatenate([p["tiles"] for p in prepared_list], axis=0)
+    step = max_batch if max_batch > 0 else len(batch)
+    chunks = [predict_fn(names, batch[i:i + step]) for i in range(0, len(batch), step)]
+    outputs = {n: np.concatenate([c[n] for c in chunks], axis=0)[..., 0] for n in names}
+
+    results, offset = [], 0
+    for p, count in zip(prepared_list, counts):
+        results.append({
+            n: blend_tiles(outputs[n][offset:offset + count], p["tile_positions"], p["tile_resolution"], p["tile_stride"])
+            for n in names
+        })
+        offset += count
+    return results
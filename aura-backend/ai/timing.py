@@ -0,0 +1,31 @@
+# aura-backend/ai/timing.py
+# Móc đo thời gian cho pipeline AI, không phụ thuộc TensorFlow hay server:
+# ai/inference bọc từng bước trong timed(...), phía server đăng ký listener (services/metrics.py) để ghi histogram.
+# Chưa có listener nào (benchmark, script) => không đo, gần như 0 chi phí.
+import time
+from contextlib import contextmanager
+
+_listeners = []
+
+def add_timing_listener(fn):
+    """fn(kind, name, seconds) — kind: 'model' (1 lần gọi model) | 'stage' (1 bước của batch)"""
+    if fn not in _listeners: _listeners.append(fn)
+
+def remove_timing_listener(fn):
+    if fn in _listeners: _listeners.remove(fn)
+
+@contextmanager
+def timed(kind, name):
+    if not _listeners:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for fn in list(_listeners):
+            try:
+                fn(kind, name, elapsed)
+            except Exception as e:
+                print(f"⚠️ Lỗi listener đo thời gian AI: {e}")
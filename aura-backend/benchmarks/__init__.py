@@ -0,0 +1,3 @@
+# aura-backend/benchmarks/__init__.py
+# Các script đo hiệu năng. Chạy từ thư mục aura-backend, VD:
+#   python -m benchmarks.bench_graph_mode
@@ -0,0 +1,88 @@
+# aura-backend/benchmarks/bench_doctor_patients.py
+# Đo độ trễ danh sách bệnh nhân của bác sĩ: N+1 find_one (cũ) so với 1 aggregation $lookup (mới).
+# Tạo dữ liệu giả trong database RIÊNG (mặc định 'aura_bench', xóa sau khi đo), không đụng aura_db.
+# Chạy: MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_doctor_patients --patients 10000
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.patients import list_doctor_patients
+
+DOCTOR_ID = "bench_doctor"
+AI_STATUSES = ["COMPLETED", "COMPLETED", "COMPLETED", "PENDING", "FAILED"]
+
+async def seed(db, patients, scans_per_patient):
+    await db.users.drop(); await db.medical_records.drop()
+    await db.users.create_index([("assigned_doctor_id", 1), ("userName", 1)])
+    await db.medical_records.create_index([("user_id", 1), ("upload_date", -1)])
+    rng = random.Random(0)
+    users = [{"userName": f"patient_{i:05d}", "email": f"p{i}@bench.local", "role": "USER", "assigned_doctor_id": DOCTOR_ID} for i in range(patients)]
+    result = await db.users.insert_many(users)
+    now = datetime.utcnow()
+    records = []
+    for uid in result.inserted_ids:
+        for _ in range(rng.randint(0, scans_per_patient * 2)):   # Có bệnh nhân chưa quét lần nào
+            records.append({
+                "user_id": str(uid), "upload_date": now - timedelta(minutes=rng.randint(0, 525600)),
+                "ai_analysis_status": rng.choice(AI_STATUSES), "ai_result": "Bench", "image_url": "",
+            })
+    for i in range(0, len(records), 10000):
+        await db.medical_records.insert_many(records[i:i + 10000])
+    return len(records)
+
+async def legacy_list(db):
+    """Bản sao logic CŨ của get_doctor_assigned_patients (1 find_one mỗi bệnh nhân)"""
+    rows = []
+    async for patient in db.users.find({"assigned_doctor_id": DOCTOR_ID}).sort("userName", 1):
+        latest = await db.medical_records.find_one({"user_id": str(patient["_id"])}, sort=[("upload_date", -1)])
+        rows.append((str(patient["_id"]), str(latest["_id"]) if latest else None))
+    return rows
+
+async def timed(fn, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        await fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"ms_p50": float(np.percentile(times, 50)), "ms_p95": float(np.percentile(times, 95))}
+
+async def main_async(args):
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    try:
+        records = await seed(db, args.patients, args.scans)
+        # Kiểm tra 2 cách cho cùng kết quả trước khi đo
+        legacy = await legacy_list(db)
+        current = [(p["id"], p["latest_scan"]["record_id"]) for p in await list_doctor_patients(db.users, DOCTOR_ID)]
+        assert legacy == current, "Kết quả aggregation khác với N+1"
+
+        report = {"patients": args.patients, "records": records, "runs": args.runs}
+        report["legacy_n_plus_1"] = await timed(lambda: legacy_list(db), args.runs)
+        report["aggregation"] = await timed(lambda: list_doctor_patients(db.users, DOCTOR_ID), args.runs)
+        report["aggregation_sorted_latest_desc"] = await timed(lambda: list_doctor_patients(db.users, DOCTOR_ID, "latest_scan", -1), args.runs)
+        report["aggregation_filter_pending"] = await timed(lambda: list_doctor_patients(db.users, DOCTOR_ID, ai_status="PENDING"), args.runs)
+        report["speedup_p50"] = report["legacy_n_plus_1"]["ms_p50"] / report["aggregation"]["ms_p50"]
+        print(json.dumps(report, indent=2))
+    finally:
+        if not args.keep: await client.drop_database(args.db)
+        client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark danh sách bệnh nhân của bác sĩ")
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--scans", type=int, default=3, help="Số lần quét trung bình mỗi bệnh nhân")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db", default="aura_bench")
+    parser.add_argument("--keep", action="store_true", help="Giữ lại database sau khi đo")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# aura-backend/benchmarks/bench_graph_mode.py
+# So sánh độ trễ mỗi lượt quét giữa Model.predict (cũ) và tf.function biên dịch (graph).
+# Chạy: python -m benchmarks.bench_graph_mode --runs 30 [--image path/to/fundus.jpg] [--batch 1]
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ai import inference
+from benchmarks.standins import fill_missing_models
+from benchmarks.synthetic import make_fundus_jpeg
+
+def percentile(values, q):
+    return float(np.percentile(np.array(values) * 1000.0, q))
+
+def bench_mode(mode, prepared, runs, warmup):
+    # Warm-up: lần gọi đầu của graph mode còn tính cả thời gian trace
+    for _ in range(warmup):
+        inference.run_models(prepared, mode=mode)
+
+    model_times, scan_times = [], []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        preds = inference.run_models(prepared, mode=mode)
+        t1 = time.perf_counter()
+        for item, pred in zip(prepared, preds):
+            inference.build_report(item, pred)
+        t2 = time.perf_counter()
+        model_times.append((t1 - t0) / len(prepared))
+        scan_times.append((t2 - t0) / len(prepared))
+
+    return {
+        "models_ms_p50": percentile(model_times, 50),
+        "models_ms_p95": percentile(model_times, 95),
+        "scan_ms_p50": percentile(scan_times, 50),
+        "scan_ms_p95": percentile(scan_times, 95),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark graph mode vs Model.predict")
+    parser.add_argument("--image", help="Ảnh đáy mắt dùng để đo (mặc định: ảnh tổng hợp)")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=1, help="Số ảnh mỗi batch")
+    args = parser.parse_args()
+
+    standins = fill_missing_models(inference.model_registry)
+    if standins:
+        print(f"⚠️ Dùng model đóng thế cho: {', '.join(standins)}")
+
+    if args.image:
+        with open(args.image, "rb") as f: image_bytes = f.read()
+    else:
+        image_bytes = make_fundus_jpeg(1024, 1024)
+    prepared = [inference.prepare_inputs(image_bytes) for _ in range(args.batch)]
+
+    report = {"batch": args.batch, "runs": args.runs, "standins": standins}
+    for mode in ("predict", "graph"):
+        report[mode] = bench_mode(mode, prepared, args.runs, args.warmup)
+    report["speedup_scan_p50"] = report["predict"]["scan_ms_p50"] / report["graph"]["scan_ms_p50"]
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# aura-backend/benchmarks/bench_login_burst.py
+# Mô phỏng 1 đợt login dồn dập trên 1 event loop và đo độ trễ của request KHÔNG liên quan
+# (VD: poll chat) chạy xen kẽ: bcrypt chạy thẳng trong handler (cũ) so với pool riêng (services/passwords.py).
+# Chạy: python -m benchmarks.bench_login_burst --logins 64 --rounds 12
+import json
+import time
+import asyncio
+import argparse
+
+import bcrypt
+import numpy as np
+
+from services.passwords import PasswordHasher, PasswordPoolBusy
+
+PROBE_INTERVAL_S = 0.005
+
+async def unrelated_request():
+    """Handler nhẹ (không CPU): chỉ nhường event loop 1 lần"""
+    await asyncio.sleep(0)
+
+async def probe(latencies, stop):
+    """Bắn request nhẹ đều đặn, ghi thời gian từ lúc đến tới lúc trả lời"""
+    pending = set()
+    async def one(t_arrive):
+        await unrelated_request()
+        latencies.append((time.perf_counter() - t_arrive) * 1000)
+    while not stop.is_set():
+        task = asyncio.create_task(one(time.perf_counter()))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        await asyncio.sleep(PROBE_INTERVAL_S)
+    await asyncio.gather(*pending)
+
+async def run_burst(mode, logins, hashed, hasher):
+    async def login_inline():
+        # Đường CŨ: bcrypt.checkpw ngay trong handler async
+        return bcrypt.checkpw(b"correct horse", hashed.encode())
+
+    async def login_pool():
+        try:
+            return await hasher.verify("correct horse", hashed)
+        except PasswordPoolBusy:
+            return None
+
+    latencies, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(latencies, stop))
+    await asyncio.sleep(0.05)   # Đo nền trước khi đợt login bắt đầu
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*[(login_inline if mode == "inline" else login_pool)() for _ in range(logins)])
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await probe_task
+    accepted = sum(r is True for r in results)
+    return {
+        "logins_per_s": round(accepted / elapsed, 1),
+        "accepted": accepted,
+        "rejected_503": sum(r is None for r in results),
+        "burst_s": round(elapsed, 3),
+        "unrelated_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "unrelated_p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "unrelated_max_ms": round(float(np.max(latencies)), 2),
+    }
+
+async def main_async(args):
+    hasher = PasswordHasher(workers=args.workers, queue_limit=args.queue_limit, rounds=args.rounds)
+    hashed = await hasher.hash("correct horse")
+    report = {"logins": args.logins, "rounds": args.rounds, "workers": args.workers, "queue_limit": args.queue_limit}
+    for mode in ("inline", "pool"):
+        report[mode] = await run_burst(mode, args.logins, hashed, hasher)
+    print(json.dumps(report, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đợt login dồn dập: bcrypt trên event loop vs pool")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-limit", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
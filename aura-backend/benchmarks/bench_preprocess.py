@@ -0,0 +1,110 @@
+# aura-backend/benchmarks/bench_preprocess.py
+# Đo thời gian giải mã + tiền xử lý và peak RSS: đường cũ (giải mã full, resize 4 lần từ ảnh gốc, float64)
+# so với đường mới (giải mã giảm độ phân giải + kim tự tháp dùng chung, uint8/float32).
+# Chạy: python -m benchmarks.bench_preprocess [--image fundus.jpg] [--runs 10]
+# Mỗi chế độ chạy trong process con riêng để peak RSS không ảnh hưởng lẫn nhau.
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import make_fundus_jpeg, RESOLUTIONS
+
+def legacy_prepare(image_bytes):
+    """Bản sao đường tiền xử lý CŨ của run_aura_inference (chỉ dùng để so sánh)"""
+    original_img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    original_rgb = cv2.cvtColor(original_img, cv2.COLOR_BGR2RGB)
+    standard = np.expand_dims(cv2.resize(original_rgb, (256, 256)) / 255.0, axis=0)
+    img = cv2.resize(original_rgb, (512, 512))
+    enhanced = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(img[:, :, 1]) / 255.0
+    vessels = enhanced[np.newaxis, :, :, np.newaxis]
+    img = cv2.resize(original_rgb, (224, 224))
+    classifier = np.expand_dims(cv2.addWeighted(img, 4, cv2.GaussianBlur(img, (0, 0), 10), -4, 128), axis=0)
+    combined_mask = np.zeros((256, 256, 3))
+    img_resized = cv2.resize(original_rgb, (256, 256)).astype(np.float32) / 255.0
+    overlay = np.clip((img_resized * (1 - combined_mask * 0.4) + combined_mask * 0.5) * 255, 0, 255).astype(np.uint8)
+    return standard, vessels, classifier, overlay
+
+def current_prepare(image_bytes):
+    from ai import inference
+    prepared = inference.prepare_inputs(image_bytes)
+    combined_mask = np.zeros((256, 256, 3), dtype=np.float32)
+    img_resized = prepared["rgb_256"].astype(np.float32) / 255.0
+    overlay = np.clip((img_resized * (1 - combined_mask * np.float32(0.4)) + combined_mask * np.float32(0.5)) * 255, 0, 255).astype(np.uint8)
+    return prepared, overlay
+
+def _reset_peak_rss():
+    """Linux: ghi '5' vào clear_refs để đặt lại VmHWM (peak RSS) sau khi đã import xong thư viện"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_child(mode, image_path, runs):
+    from ai import inference  # noqa: F401  Import trước cho cả 2 chế độ => nền RSS như nhau
+    with open(image_path, "rb") as f: image_bytes = f.read()
+    prepare = legacy_prepare if mode == "legacy" else current_prepare
+    prepare(image_bytes)  # Warm-up (nạp lib, cấp phát lần đầu)
+
+    baseline_mb = _peak_rss_mb()
+    reset = _reset_peak_rss()
+    if reset: baseline_mb = _peak_rss_mb()
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        prepare(image_bytes)
+        times.append((time.perf_counter() - t0) * 1000)
+    peak_mb = _peak_rss_mb()
+    print(json.dumps({
+        "mode": mode,
+        "ms_p50": float(np.percentile(times, 50)),
+        "ms_p95": float(np.percentile(times, 95)),
+        "peak_rss_mb": round(peak_mb, 1),
+        "peak_rss_delta_mb": round(peak_mb - baseline_mb, 1) if reset else None,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark giải mã + tiền xử lý")
+    parser.add_argument("--image", help="Ảnh đáy mắt (mặc định: ảnh tổng hợp 12MP)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--child", choices=["legacy", "current"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.image, args.runs)
+        return
+
+    image_path = args.image
+    if not image_path:
+        image_path = os.path.join("benchmarks", ".bench_fundus_12mp.jpg")
+        if not os.path.exists(image_path):
+            with open(image_path, "wb") as f: f.write(make_fundus_jpeg(*RESOLUTIONS["4000x3000"]))
+
+    report = {}
+    for mode in ("legacy", "current"):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_preprocess", "--child", mode, "--image", image_path, "--runs", str(args.runs)],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        report[mode] = json.loads(out)
+    report["speedup_p50"] = report["legacy"]["ms_p50"] / report["current"]["ms_p50"]
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
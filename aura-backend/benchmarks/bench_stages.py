@@ -0,0 +1,186 @@
+# aura-backend/benchmarks/bench_stages.py
+# Đo thời gian TỪNG bước của pipeline inference trên ảnh đáy mắt tổng hợp nhiều độ phân giải:
+# giải mã, kim tự tháp, 3 hàm tiền xử lý, từng model, clean_mask, luật hội chẩn, overlay, cv2.imencode.
+# Không cần trọng số thật: model thiếu file được thay bằng model đóng thế (benchmarks/standins.py).
+# Chạy:
+#   python -m benchmarks.bench_stages --out bench.json                       # Ghi kết quả
+#   python -m benchmarks.bench_stages --baseline bench.json --threshold 0.15 # So với lần trước, exit 1 nếu chậm đi
+#   python -m benchmarks.bench_stages --tiled                                # Thêm chi phí chế độ tile (ai/tiling.py)
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from ai import inference, tiling
+from ai.image_io import decode_image, build_pyramid, PYRAMID_SIZES
+from benchmarks.standins import fill_missing_models, build_standin_models, STANDIN_SHAPES
+from benchmarks.synthetic import RESOLUTIONS, make_fundus_jpeg
+
+# Bước nhanh hơn ngưỡng này (ms) quá nhiễu để kết luận hồi quy
+MIN_COMPARABLE_MS = 0.5
+
+def _timed(fn, runs, warmup):
+    for _ in range(warmup): fn()
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return {
+        "p50_ms": round(float(np.percentile(times, 50)), 3),
+        "p95_ms": round(float(np.percentile(times, 95)), 3),
+        "mean_ms": round(float(np.mean(times)), 3),
+    }
+
+def _end_to_end(image_bytes, mode, tiled):
+    prepared = inference.prepare_inputs(image_bytes, tiled=tiled)
+    report = inference.build_report(prepared, inference.run_models([prepared], mode)[0])
+    return cv2.imencode(".png", report["overlay"])
+
+def bench_resolution(image_bytes, runs, warmup, mode, tiled=False):
+    stages = {}
+    # 1. Giải mã + kim tự tháp 512/256/224
+    stages["decode"] = _timed(lambda: decode_image(image_bytes, min_side=max(PYRAMID_SIZES)), runs, warmup)
+    rgb = decode_image(image_bytes, min_side=max(PYRAMID_SIZES))
+    stages["pyramid"] = _timed(lambda: build_pyramid(rgb), runs, warmup)
+    pyramid = build_pyramid(rgb)
+
+    # 2. Ba hàm tiền xử lý
+    stages["preprocess_segmentation"] = _timed(lambda: inference.preprocess_for_segmentation(pyramid[256], 256), runs, warmup)
+    stages["preprocess_vessels"] = _timed(lambda: inference.preprocess_for_vessels_pro(pyramid[512]), runs, warmup)
+    stages["preprocess_classifier"] = _timed(lambda: inference.preprocess_for_classifier(pyramid[224]), runs, warmup)
+    prepared = inference.prepare_inputs(image_bytes, tiled=False)
+
+    # 3. Từng model riêng lẻ (batch 1) + nhóm 5 U-Net hợp nhất như pipeline thật
+    for name in STANDIN_SHAPES:
+        x = prepared[inference.MODEL_INPUTS.get(name, "standard")]
+        stages[f"model_{name}"] = _timed(lambda: inference.predict_model(name, x, mode), runs, warmup)
+    standard_names = [name for name, _, _ in inference.STANDARD_SEGMENTATION]
+    stages["models_standard_fused"] = _timed(
+        lambda: inference.predict_standard_group(standard_names, prepared["standard"], mode), runs, warmup)
+    preds = inference.run_models([prepared], mode)[0]
+
+    # 4. clean_mask cho các mask tổn thương (ngưỡng + min_size như pipeline)
+    def clean_all():
+        for name, threshold, min_size in inference.STANDARD_SEGMENTATION:
+            if min_size: inference.clean_mask((preds[name] > threshold).astype(np.uint8), min_size)
+    stages["clean_mask"] = _timed(clean_all, runs, warmup)
+
+    # 5. Toàn bộ hậu xử lý (gồm clean_mask + luật + overlay), riêng overlay, và encode PNG
+    stages["build_report"] = _timed(lambda: inference.build_report(prepared, preds), runs, warmup)
+    mask = (np.random.default_rng(0).random((inference.OUT_SIZE, inference.OUT_SIZE, 3)) > 0.9).astype(np.float32)
+    stages["overlay"] = _timed(lambda: inference.render_overlay(prepared["rgb_256"], mask), runs, warmup)
+    overlay = inference.build_report(prepared, preds)["overlay"]
+    stages["imencode_png"] = _timed(lambda: cv2.imencode(".png", overlay), runs, warmup)
+
+    # Tổng 1 lượt quét đầu-cuối (ảnh đơn, không gom batch), luôn là đường 1 lần 256 để so được với baseline cũ
+    stages["end_to_end"] = _timed(lambda: _end_to_end(image_bytes, mode, False), runs, warmup)
+
+    # 6. Chế độ tile: tiền xử lý (giải mã lớn hơn + cắt tile), nhóm model tổn thương trên tile, ghép mask, đầu-cuối
+    if tiled:
+        stages["prepare_single"] = _timed(lambda: inference.prepare_inputs(image_bytes, tiled=False), runs, warmup)
+        stages["prepare_tiled"] = _timed(lambda: inference.prepare_inputs(image_bytes, tiled=True), runs, warmup)
+        tiled_prepared = inference.prepare_inputs(image_bytes, tiled=True)
+        tiled_names = [n for n in standard_names if n in tiling.TILED_MODELS]
+        if tiled_names:
+            stages["models_tiled_lesions"] = _timed(
+                lambda: inference.predict_standard_group(tiled_names, tiled_prepared["tiles"], mode), runs, warmup)
+            tile_out = inference.predict_standard_group(tiled_names, tiled_prepared["tiles"], mode)[tiled_names[0]][..., 0]
+            stages["blend_tiles"] = _timed(lambda: tiling.blend_tiles(
+                tile_out, tiled_prepared["tile_positions"], tiled_prepared["tile_resolution"], tiled_prepared["tile_stride"]), runs, warmup)
+        stages["models_all_single"] = _timed(lambda: inference.run_models([prepared], mode), runs, warmup)
+        stages["models_all_tiled"] = _timed(lambda: inference.run_models([tiled_prepared], mode), runs, warmup)
+        tiled_preds = inference.run_models([tiled_prepared], mode)[0]
+        stages["build_report_tiled"] = _timed(lambda: inference.build_report(tiled_prepared, tiled_preds), runs, warmup)
+        stages["end_to_end_tiled"] = _timed(lambda: _end_to_end(image_bytes, mode, True), runs, warmup)
+    return stages
+
+def tiled_cost(results):
+    """Chi phí chế độ tile so với đường 1 lần 256 (p50 đầu-cuối) theo từng độ phân giải"""
+    cost = {}
+    for resolution, stages in results.items():
+        if "end_to_end_tiled" not in stages: continue
+        single, tiled = stages["end_to_end"]["p50_ms"], stages["end_to_end_tiled"]["p50_ms"]
+        cost[resolution] = {"single_p50_ms": single, "tiled_p50_ms": tiled,
+                            "extra_ms": round(tiled - single, 3), "ratio": round(tiled / single, 3) if single else None}
+    return cost
+
+def compare(current, baseline, threshold):
+    """Danh sách bước có p50 chậm hơn baseline quá threshold (tỉ lệ)"""
+    regressions = []
+    for resolution, stages in current["results"].items():
+        for stage, stats in stages.items():
+            base = baseline.get("results", {}).get(resolution, {}).get(stage)
+            if not base or base["p50_ms"] < MIN_COMPARABLE_MS: continue
+            ratio = stats["p50_ms"] / base["p50_ms"]
+            if ratio > 1 + threshold:
+                regressions.append({"resolution": resolution, "stage": stage, "baseline_p50_ms": base["p50_ms"],
+                                    "current_p50_ms": stats["p50_ms"], "ratio": round(ratio, 3)})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark từng bước pipeline inference")
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--mode", choices=["graph", "predict"], default=inference.INFERENCE_MODE)
+    parser.add_argument("--standins-only", action="store_true",
+                        help="Dùng model đóng thế cho MỌI module (so sánh được giữa các máy có / không có trọng số)")
+    parser.add_argument("--tiled", action="store_true", help="Đo thêm chế độ tile độ phân giải cao cho model tổn thương")
+    parser.add_argument("--out", help="Ghi kết quả JSON ra file")
+    parser.add_argument("--baseline", help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Chậm hơn baseline quá tỉ lệ này => hồi quy")
+    args = parser.parse_args()
+
+    if args.standins_only:
+        for name, model in build_standin_models().items():
+            inference.model_registry.register(name, model)
+        standins = list(STANDIN_SHAPES)
+    else:
+        standins = fill_missing_models(inference.model_registry)
+    if standins:
+        print(f"⚠️ Dùng model đóng thế cho: {', '.join(standins)}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "opencv": cv2.__version__,
+            "backend": inference.active_backend.name,
+            "mode": args.mode,
+            "runs": args.runs,
+            "standins": standins,
+            "tiling": {"resolution": tiling.TILE_RESOLUTION, "stride": tiling.TILE_STRIDE, "models": list(tiling.TILED_MODELS),
+                       "tiles_per_image": len(tiling.tile_grid(tiling.TILE_RESOLUTION))} if args.tiled else None,
+        },
+        "results": {},
+    }
+    for resolution in args.resolutions:
+        width, height = RESOLUTIONS[resolution]
+        print(f"⏳ {resolution}...", file=sys.stderr)
+        report["results"][resolution] = bench_resolution(make_fundus_jpeg(width, height), args.runs, args.warmup, args.mode, args.tiled)
+    if args.tiled:
+        report["tiled_cost"] = tiled_cost(report["results"])
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+        if baseline.get("meta", {}).get("standins") != standins:
+            print("⚠️ Baseline dùng bộ model khác => so sánh bước model không có ý nghĩa", file=sys.stderr)
+        report["regressions"] = compare(report, baseline, args.threshold)
+        report["threshold"] = args.threshold
+        exit_code = 1 if report["regressions"] else 0
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+# aura-backend/benchmarks/loadtest/__init__.py
+# Load test API trên 1 máy: server thật (server/main.py) + mongod local, dịch vụ ngoài giả lập.
+#   python -m benchmarks.loadtest.run --spawn --duration 60
@@ -0,0 +1,213 @@
+# aura-backend/benchmarks/loadtest/run.py
+# Load test theo kịch bản: bệnh nhân upload + poll kết quả, bác sĩ xem dashboard, chat dồn dập.
+# Báo cáo throughput + p50/p95/p99 theo endpoint (pha chuẩn bị: đăng ký / đăng nhập / phân công, báo cáo riêng).
+# Cần mongod local. Chạy (từ thư mục aura-backend):
+#   python -m benchmarks.loadtest.run --spawn --duration 60 --patients 20 --doctors 4 --chatters 8 --out load.json
+#   python -m benchmarks.loadtest.run --base-url http://127.0.0.1:8765 ...   # Server đã chạy sẵn (serve.py)
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+import httpx
+
+from benchmarks.synthetic import RESOLUTIONS
+from benchmarks.loadtest.scenarios import (
+    SCENARIOS, ApiClient, LatencyRecorder, ScanImages, ScenarioContext, VirtualUser,
+)
+
+PASSWORD = "loadtest-Password1"
+# Số request đăng ký / đăng nhập đồng thời ở pha chuẩn bị (bcrypt chạy trong pool giới hạn của server)
+SETUP_CONCURRENCY = 16
+
+def spawn_server(args, log_path):
+    """Khởi động benchmarks.loadtest.serve ở process con, chờ tới khi nhận request"""
+    cmd = [sys.executable, "-m", "benchmarks.loadtest.serve", "--port", str(args.port), "--fresh",
+           "--mongo-url", args.mongo_url, "--db", args.db,
+           "--infer-base-ms", str(args.infer_base_ms), "--infer-per-image-ms", str(args.infer_per_image_ms),
+           "--oauth-latency-ms", str(args.oauth_latency_ms)]
+    log = open(log_path, "w", encoding="utf-8")
+    process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"❌ Server load test dừng sớm (mã {process.returncode}), xem {log_path}")
+        try:
+            if httpx.get(f"{args.base_url}/api/health/ready", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    sys.exit(f"❌ Server load test không sẵn sàng sau 60s, xem {log_path}")
+
+async def _login(api, name):
+    r = await api.call("POST /api/login", "POST", "/api/login", json={"userName": name, "password": PASSWORD})
+    return r.json()["access_token"] if r is not None and r.status_code == 200 else None
+
+async def _user_id(api, token):
+    r = await api.call("GET /api/users/me", "GET", "/api/users/me", token)
+    return r.json()["user_info"]["id"] if r is not None and r.status_code == 200 else None
+
+async def _password_user(api, sem, name, role):
+    async with sem:
+        await api.call("POST /api/register", "POST", "/api/register", json={"userName": name, "password": PASSWORD, "role": role})
+        token = await _login(api, name)
+        if not token: return None
+        return VirtualUser(name, token, await _user_id(api, token), role)
+
+async def _social_user(api, sem, provider, token_seed):
+    """Đăng nhập qua OAuth giả: token bất kỳ (không bắt đầu bằng 'invalid') => 1 danh tính cố định"""
+    async with sem:
+        if provider == "google":
+            r = await api.call("POST /api/google-login", "POST", "/api/google-login", json={"token": token_seed})
+        else:
+            r = await api.call("POST /api/facebook-login", "POST", "/api/facebook-login",
+                               json={"accessToken": token_seed, "userID": token_seed})
+        if r is None or r.status_code != 200: return None
+        token = r.json()["access_token"]
+        return VirtualUser(r.json()["user_info"]["userName"], token, await _user_id(api, token))
+
+async def setup_users(api, args, run_id):
+    sem = asyncio.Semaphore(SETUP_CONCURRENCY)
+    doctors = await asyncio.gather(*[_password_user(api, sem, f"lt{run_id}_dr{i}", "DOCTOR") for i in range(args.doctors)])
+    social_count = int(round(args.patients * args.social_share))
+    tasks = []
+    for i in range(args.patients):
+        if i < social_count:
+            tasks.append(_social_user(api, sem, "google" if i % 2 == 0 else "facebook", f"lt{run_id}-p{i}"))
+        else:
+            tasks.append(_password_user(api, sem, f"lt{run_id}_p{i}", "USER"))
+    patients = await asyncio.gather(*tasks)
+    doctors = [d for d in doctors if d and d.user_id]
+    patients = [p for p in patients if p and p.user_id]
+    if not doctors or not patients:
+        sys.exit("❌ Không tạo được người dùng load test (xem lỗi pha chuẩn bị)")
+
+    # Bác sĩ tự nhận bệnh nhân (API cho phép role DOCTOR) => dashboard + chat có dữ liệu
+    async def assign(patient, doctor):
+        async with sem:
+            await api.call("POST /api/admin/assign-doctor", "POST", "/api/admin/assign-doctor", doctor.token,
+                           json={"patient_id": patient.user_id, "doctor_id": doctor.user_id})
+        patient.doctor = doctor
+    await asyncio.gather(*[assign(p, doctors[i % len(doctors)]) for i, p in enumerate(patients)])
+    return doctors, patients
+
+async def run_load(args):
+    run_id = datetime.now().strftime("%H%M%S")
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.request_timeout) as http:
+        setup_recorder = LatencyRecorder()
+        setup_api = ApiClient(http, setup_recorder)
+        t0 = time.perf_counter()
+        doctors, patients = await setup_users(setup_api, args, run_id)
+        setup_elapsed = time.perf_counter() - t0
+        print(f"👥 {len(doctors)} bác sĩ, {len(patients)} bệnh nhân sẵn sàng ({setup_elapsed:.1f}s)", file=sys.stderr)
+
+        width, height = RESOLUTIONS[args.image_size]
+        images = ScanImages(width, height, cache_hit_ratio=args.cache_hit_ratio)
+        recorder = LatencyRecorder()
+        ctx = ScenarioContext(ApiClient(http, recorder), time.monotonic() + args.duration, images,
+                              think_time_s=args.think_time, poll_interval_s=args.poll_interval,
+                              scan_timeout_s=args.scan_timeout, chat_burst=args.chat_burst)
+        users = [("patient_upload_poll", p) for p in patients]
+        users += [("doctor_dashboard", d) for d in doctors]
+        users += [("chat_burst", p) for p in patients[:args.chatters]]
+        if args.scenarios:
+            users = [(s, u) for s, u in users if s in args.scenarios]
+
+        print(f"🚀 Chạy {len(users)} người dùng ảo trong {args.duration}s...", file=sys.stderr)
+        t0 = time.perf_counter()
+        await asyncio.gather(*[SCENARIOS[scenario](ctx, user) for scenario, user in users])
+        elapsed = time.perf_counter() - t0
+
+        metrics_text = None
+        try:
+            r = await http.get("/metrics")
+            if r.status_code == 200: metrics_text = r.text
+        except httpx.HTTPError:
+            pass
+
+    return {
+        "setup": {"elapsed_s": round(setup_elapsed, 2), "endpoints": setup_recorder.report(setup_elapsed)},
+        "load": {
+            "elapsed_s": round(elapsed, 2),
+            "virtual_users": {s: sum(1 for x, _ in users if x == s) for s in SCENARIOS},
+            "total_requests": sum(len(v) for k, v in recorder.samples.items() if not k.startswith("SCAN")),
+            "endpoints": recorder.report(elapsed),
+        },
+    }, metrics_text
+
+def print_table(title, rows):
+    print(f"\n{title}", file=sys.stderr)
+    print(f"{'endpoint':<44}{'req':>7}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}", file=sys.stderr)
+    for name, row in rows.items():
+        print(f"{name:<44}{row['requests']:>7}{row['errors']:>6}{row['throughput_rps']:>9}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test API AURA theo kịch bản")
+    parser.add_argument("--base-url", help="Server đã chạy sẵn (mặc định http://127.0.0.1:<port>)")
+    parser.add_argument("--spawn", action="store_true", help="Tự khởi động server load test (benchmarks.loadtest.serve)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://127.0.0.1:27017"))
+    parser.add_argument("--db", default="aura_loadtest")
+    parser.add_argument("--duration", type=float, default=60, help="Thời gian chạy kịch bản (giây)")
+    parser.add_argument("--patients", type=int, default=20, help="Số bệnh nhân ảo (upload + poll)")
+    parser.add_argument("--doctors", type=int, default=4, help="Số bác sĩ ảo (dashboard)")
+    parser.add_argument("--chatters", type=int, default=8, help="Số cặp bệnh nhân - bác sĩ chat dồn dập")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="Chỉ chạy các kịch bản này")
+    parser.add_argument("--social-share", type=float, default=0.25, help="Tỉ lệ bệnh nhân đăng nhập qua Google/Facebook giả")
+    parser.add_argument("--image-size", choices=list(RESOLUTIONS), default="1024x768")
+    parser.add_argument("--cache-hit-ratio", type=float, default=0.0, help="Tỉ lệ upload lặp lại ảnh cũ (trúng cache kết quả AI)")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Thời gian nghỉ trung bình giữa các vòng (giây)")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--scan-timeout", type=float, default=60)
+    parser.add_argument("--chat-burst", type=int, default=10, help="Số tin nhắn mỗi đợt chat")
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--infer-base-ms", type=float, default=60)
+    parser.add_argument("--infer-per-image-ms", type=float, default=25)
+    parser.add_argument("--oauth-latency-ms", type=float, default=80)
+    parser.add_argument("--out", help="Ghi báo cáo JSON ra file")
+    parser.add_argument("--metrics-out", help="Lưu /metrics của server sau khi chạy (phân tích DB vs inference)")
+    args = parser.parse_args()
+    args.base_url = (args.base_url or f"http://127.0.0.1:{args.port}").rstrip("/")
+
+    server = spawn_server(args, "loadtest_server.log") if args.spawn else None
+    try:
+        results, metrics_text = asyncio.run(run_load(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "base_url": args.base_url,
+            "spawned": bool(server),
+            "fake_inference_ms": {"base": args.infer_base_ms, "per_image": args.infer_per_image_ms} if server else None,
+            "image_size": args.image_size,
+            "think_time_s": args.think_time,
+        },
+        **results,
+    }
+    print_table("Pha chuẩn bị", report["setup"]["endpoints"])
+    print_table(f"Tải ({report['load']['elapsed_s']}s)", report["load"]["endpoints"])
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.metrics_out and metrics_text:
+        with open(args.metrics_out, "w", encoding="utf-8") as f: f.write(metrics_text)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
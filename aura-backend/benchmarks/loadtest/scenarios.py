@@ -0,0 +1,158 @@
+# aura-backend/benchmarks/loadtest/scenarios.py
+# Kịch bản người dùng ảo cho load test + bộ ghi độ trễ theo endpoint.
+# Mỗi người dùng ảo lặp kịch bản của mình tới hết thời gian chạy, nghỉ think-time giữa các vòng.
+import time
+import random
+import asyncio
+import struct
+from collections import defaultdict, Counter
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import make_fundus_jpeg
+
+STATUS_DONE = "Hoàn thành"
+RESULT_FAILED = "Lỗi phân tích"
+
+class LatencyRecorder:
+    """Gom độ trễ (ms) theo tên endpoint dạng route mẫu, VD 'GET /api/medical-records/{id}'"""
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(Counter)   # tên -> {mã lỗi / 'transport': số lần}
+
+    def record(self, name, ms, error=None):
+        self.samples[name].append(ms)
+        if error is not None: self.errors[name][str(error)] += 1
+
+    def report(self, elapsed_s):
+        rows = {}
+        for name in sorted(self.samples):
+            values = np.asarray(self.samples[name])
+            errors = sum(self.errors[name].values())
+            rows[name] = {
+                "requests": int(values.size),
+                "errors": errors,
+                "error_codes": dict(self.errors[name]),
+                "throughput_rps": round(values.size / elapsed_s, 2) if elapsed_s else 0.0,
+                "p50_ms": round(float(np.percentile(values, 50)), 2),
+                "p95_ms": round(float(np.percentile(values, 95)), 2),
+                "p99_ms": round(float(np.percentile(values, 99)), 2),
+                "max_ms": round(float(values.max()), 2),
+            }
+        return rows
+
+class ApiClient:
+    def __init__(self, http, recorder):
+        self.http = http
+        self.recorder = recorder
+
+    async def call(self, name, method, url, token=None, expect=(200,), **kwargs):
+        """Gửi request, ghi độ trễ; trả về Response (kể cả khi lỗi HTTP) hoặc None khi lỗi kết nối / timeout"""
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(name, (time.perf_counter() - start) * 1000, type(e).__name__)
+            return None
+        ms = (time.perf_counter() - start) * 1000
+        self.recorder.record(name, ms, None if response.status_code in expect else response.status_code)
+        return response
+
+class ScanImages:
+    """
+    Ảnh đáy mắt tổng hợp cho upload. Mỗi lượt upload chèn 1 segment COM (comment JPEG) khác nhau
+    => sha256 khác nhau, cache kết quả AI không trúng (trừ phần cố ý lặp lại theo cache_hit_ratio).
+    """
+    def __init__(self, width, height, variants=4, cache_hit_ratio=0.0, seed=0):
+        self.bases = [make_fundus_jpeg(width, height, seed=seed + i, quality=90) for i in range(variants)]
+        self.cache_hit_ratio = cache_hit_ratio
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    def next_upload(self):
+        base = self.rng.choice(self.bases)
+        if self.rng.random() < self.cache_hit_ratio: return base
+        self.counter += 1
+        payload = f"aura-loadtest-{self.counter}-{self.rng.getrandbits(64):016x}".encode()
+        return base[:2] + b"\xff\xfe" + struct.pack(">H", len(payload) + 2) + payload + base[2:]
+
+class VirtualUser:
+    def __init__(self, name, token=None, user_id=None, role="USER"):
+        self.name = name
+        self.token = token
+        self.user_id = user_id
+        self.role = role
+        self.doctor = None   # Bệnh nhân: VirtualUser bác sĩ phụ trách
+
+class ScenarioContext:
+    def __init__(self, api, deadline, images, think_time_s=1.0, poll_interval_s=0.5, scan_timeout_s=60.0, chat_burst=10):
+        self.api = api
+        self.deadline = deadline
+        self.images = images
+        self.think_time_s = think_time_s
+        self.poll_interval_s = poll_interval_s
+        self.scan_timeout_s = scan_timeout_s
+        self.chat_burst = chat_burst
+
+    def running(self):
+        return time.monotonic() < self.deadline
+
+    async def think(self):
+        # Phân phối mũ quanh think_time: người dùng thật không bấm đều tăm tắp
+        await asyncio.sleep(min(random.expovariate(1 / self.think_time_s), self.think_time_s * 5) if self.think_time_s else 0)
+
+async def _poll_until_done(ctx, user, record_id, uploaded_at):
+    """Poll hồ sơ như frontend; ghi 'scan turnaround' = từ lúc upload tới khi có kết quả AI"""
+    while time.monotonic() - uploaded_at < ctx.scan_timeout_s:
+        await asyncio.sleep(ctx.poll_interval_s)
+        r = await ctx.api.call("GET /api/medical-records/{id}", "GET", f"/api/medical-records/{record_id}", user.token)
+        if r is None or r.status_code != 200: continue
+        record = r.json()
+        if record["status"] == STATUS_DONE or record["result"] == RESULT_FAILED:
+            error = "failed" if record["result"] == RESULT_FAILED else None
+            ctx.api.recorder.record("SCAN turnaround (upload -> result)", (time.monotonic() - uploaded_at) * 1000, error)
+            return
+    ctx.api.recorder.record("SCAN turnaround (upload -> result)", ctx.scan_timeout_s * 1000, "timeout")
+
+async def patient_upload_and_poll(ctx, user):
+    while ctx.running():
+        image = ctx.images.next_upload()
+        uploaded_at = time.monotonic()
+        r = await ctx.api.call("POST /api/upload-eye-image", "POST", "/api/upload-eye-image", user.token,
+                               files={"file": ("fundus.jpg", image, "image/jpeg")})
+        if r is not None and r.status_code == 200:
+            await _poll_until_done(ctx, user, r.json()["record_id"], uploaded_at)
+        await ctx.api.call("GET /api/medical-records", "GET", "/api/medical-records", user.token)
+        await ctx.think()
+
+async def doctor_dashboard(ctx, user):
+    while ctx.running():
+        r = await ctx.api.call("GET /api/doctor/my-patients", "GET", "/api/doctor/my-patients", user.token)
+        if r is not None and r.status_code == 200:
+            # Mở vài hồ sơ mới nhất như bác sĩ duyệt danh sách
+            record_ids = [p["latest_scan"]["record_id"] for p in r.json()["patients"] if p["latest_scan"]["record_id"]]
+            for record_id in random.sample(record_ids, min(3, len(record_ids))):
+                await ctx.api.call("GET /api/medical-records/{id}", "GET", f"/api/medical-records/{record_id}", user.token)
+        await ctx.api.call("GET /api/chats", "GET", "/api/chats", user.token)
+        await ctx.think()
+
+async def chat_burst(ctx, user):
+    """Bệnh nhân và bác sĩ nhắn qua lại dồn dập rồi mở lịch sử + danh sách hội thoại"""
+    patient, doctor = user, user.doctor
+    while ctx.running():
+        for i in range(ctx.chat_burst):
+            sender, receiver = (patient, doctor) if i % 2 == 0 else (doctor, patient)
+            await ctx.api.call("POST /api/chat/send", "POST", "/api/chat/send", sender.token,
+                               json={"receiver_id": receiver.user_id, "content": f"load test {i} {time.time():.3f}"})
+        await ctx.api.call("GET /api/chat/history/{id}", "GET", f"/api/chat/history/{doctor.user_id}", patient.token)
+        await ctx.api.call("GET /api/chat/history/{id}", "GET", f"/api/chat/history/{patient.user_id}", doctor.token)
+        await ctx.api.call("GET /api/chats", "GET", "/api/chats", patient.token)
+        await ctx.think()
+
+SCENARIOS = {
+    "patient_upload_poll": patient_upload_and_poll,
+    "doctor_dashboard": doctor_dashboard,
+    "chat_burst": chat_burst,
+}
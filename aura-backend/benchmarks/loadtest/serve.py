@@ -0,0 +1,69 @@
+# aura-backend/benchmarks/loadtest/serve.py
+# Khởi động server/main.py cho load test: mongod local (DB riêng), storage local, OAuth giả, engine AI giả.
+# Chạy (từ thư mục aura-backend):
+#   python -m benchmarks.loadtest.serve --port 8765 --fresh
+# Thường không cần chạy tay: benchmarks.loadtest.run --spawn tự khởi động process này.
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+from benchmarks.loadtest.stubs import StubOAuthServer, FakeInferenceEngine, install_fake_inference
+
+def configure_env(args, stub):
+    """Phải gọi TRƯỚC khi import server.main: cấu hình đọc từ env lúc import module"""
+    os.environ.update({
+        "MONGO_URL": args.mongo_url,
+        "AURA_DB_NAME": args.db,
+        "SECRET_KEY": os.getenv("SECRET_KEY", "aura-loadtest-secret"),
+        "AURA_STORAGE_BACKEND": "local",
+        "AURA_LOCAL_STORAGE_DIR": os.path.join(args.work_dir, "media"),
+        "AURA_LOCAL_STORAGE_BASE_URL": f"http://{args.host}:{args.port}/media",
+        "AURA_RESULT_CACHE_DIR": os.path.join(args.work_dir, "result_cache"),
+        "AURA_MODEL_SET_VERSION": "loadtest-fake",
+        "GOOGLE_USERINFO_URL": f"{stub.base_url}/google/userinfo",
+        "FACEBOOK_GRAPH_URL": f"{stub.base_url}/facebook/me",
+        "AURA_MODEL_WARMUP": "0",        # Engine giả không cần warm-up
+        "AURA_EMBEDDED_WORKER": "1",
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="Server AURA cho load test (dịch vụ ngoài giả lập)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://127.0.0.1:27017"))
+    parser.add_argument("--db", default="aura_loadtest", help="Database riêng cho load test (KHÔNG dùng aura_db)")
+    parser.add_argument("--fresh", action="store_true", help="Xóa database load test trước khi chạy")
+    parser.add_argument("--work-dir", help="Thư mục ảnh + cache (mặc định: thư mục tạm, xóa khi dừng)")
+    parser.add_argument("--oauth-latency-ms", type=float, default=80)
+    parser.add_argument("--infer-base-ms", type=float, default=60, help="Thời gian 'model' cố định mỗi batch")
+    parser.add_argument("--infer-per-image-ms", type=float, default=25, help="Thời gian 'model' thêm cho mỗi ảnh")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    if args.db == "aura_db":
+        sys.exit("❌ Không chạy load test trên database thật 'aura_db'")
+    temp_dir = None
+    if not args.work_dir:
+        args.work_dir = temp_dir = tempfile.mkdtemp(prefix="aura_loadtest_")
+
+    stub = StubOAuthServer(port=0, latency_ms=args.oauth_latency_ms).start()
+    configure_env(args, stub)
+    if args.fresh:
+        from pymongo import MongoClient
+        MongoClient(args.mongo_url).drop_database(args.db)
+
+    install_fake_inference(FakeInferenceEngine(args.infer_base_ms, args.infer_per_image_ms))
+    print(f"🧪 Load-test server: http://{args.host}:{args.port} | DB {args.db} | OAuth giả {stub.base_url} | thư mục {args.work_dir}")
+
+    import uvicorn
+    from server.main import app
+    try:
+        uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level, access_log=False)
+    finally:
+        stub.stop()
+        if temp_dir: shutil.rmtree(temp_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
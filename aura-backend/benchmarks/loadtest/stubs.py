@@ -0,0 +1,149 @@
+# aura-backend/benchmarks/loadtest/stubs.py
+# Thay thế dịch vụ ngoài khi load test trên 1 máy:
+#   - StubOAuthServer: giả Google userinfo + Facebook Graph (danh tính suy ra từ token, có độ trễ mạng giả lập)
+#   - FakeInferenceEngine: thay run_aura_inference_batch, không cần TensorFlow / trọng số model.
+#     Vẫn giải mã ảnh + phân tích ổ thật (ai/image_io, ai/lesions), phần "model" là sleep theo kích thước batch.
+# Blob store giả = LocalStorage (AURA_STORAGE_BACKEND=local), xem serve.py.
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import cv2
+import numpy as np
+
+from ai.image_io import decode_image
+from ai.lesions import analyze_components
+
+# Token bắt đầu bằng tiền tố này => nhà cung cấp trả lỗi (kiểm tra đường từ chối)
+INVALID_TOKEN_PREFIX = "invalid"
+
+def _identity_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class _OAuthHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass   # Không in mỗi request
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        token = parse_qs(url.query).get("access_token", [""])[0]
+        if url.path == "/stats":
+            return self._reply(200, server.stats_snapshot())
+        if server.latency_s: time.sleep(server.latency_s)
+        valid = bool(token) and not token.startswith(INVALID_TOKEN_PREFIX)
+
+        if url.path == "/google/userinfo":
+            server.count("google", valid)
+            if not valid: return self._reply(401, {"error": "invalid_token"})
+            uid = _identity_hash(token)[:21]
+            return self._reply(200, {"sub": uid, "email": f"g{uid}@google.loadtest", "name": f"Google {uid[:6]}", "picture": ""})
+
+        if url.path == "/facebook/me":
+            server.count("facebook", valid)
+            if not valid: return self._reply(400, {"error": {"message": "Invalid OAuth access token", "code": 190}})
+            uid = str(int(_identity_hash(token)[:15], 16))
+            return self._reply(200, {"id": uid, "name": f"Facebook {uid[:6]}", "email": f"f{uid}@facebook.loadtest",
+                                     "picture": {"data": {"url": ""}}})
+        self._reply(404, {"error": "not_found"})
+
+class StubOAuthServer(ThreadingHTTPServer):
+    """Chạy ở luồng nền; GET /stats trả số lượt gọi mỗi nhà cung cấp (kiểm tra cache token phía API)"""
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=80):
+        super().__init__((host, port), _OAuthHandler)
+        self.latency_s = latency_ms / 1000.0
+        self._stats = {"google": {"valid": 0, "invalid": 0}, "facebook": {"valid": 0, "invalid": 0}}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, provider, valid):
+        with self._lock:
+            self._stats[provider]["valid" if valid else "invalid"] += 1
+
+    def stats_snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="aura-stub-oauth", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class FakeInferenceEngine:
+    """
+    Cùng chữ ký + định dạng kết quả với ai.inference.run_aura_inference_batch.
+    Thời gian "model" = base_ms + per_image_ms * kích thước batch (sleep nhả GIL như TF thật),
+    nên hiệu quả gom batch của InferenceScheduler vẫn thể hiện trong kết quả load test.
+    """
+    OUT_SIZE = 256
+
+    def __init__(self, base_ms=60.0, per_image_ms=25.0):
+        self.base_s = base_ms / 1000.0
+        self.per_image_s = per_image_ms / 1000.0
+
+    def __call__(self, images_bytes):
+        results = []
+        for image_bytes in images_bytes:
+            try:
+                results.append(self._report(image_bytes))
+            except Exception as e:
+                results.append(e)
+        time.sleep(self.base_s + self.per_image_s * len(images_bytes))
+        return results
+
+    def _report(self, image_bytes):
+        rgb = cv2.resize(decode_image(image_bytes, min_side=self.OUT_SIZE), (self.OUT_SIZE, self.OUT_SIZE),
+                         interpolation=cv2.INTER_AREA)
+        green = rgb[:, :, 1]
+        retina = rgb.max(axis=2) > 20
+        # "Dự đoán" giả: chấm tối trên kênh xanh lá ~ xuất huyết, vùng sáng ~ xuất tiết
+        he_mask, he = analyze_components(retina & (green < 25), 3, lesion_type="HE")
+        ex_mask, ex = analyze_components(retina & (green > 180), 5, lesion_type="EX")
+        lesion_counts = {"HE": len(he), "MA": 0, "EX": len(ex), "SE": 0}
+
+        overlay = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR).astype(np.float32)
+        overlay[he_mask > 0] = overlay[he_mask > 0] * 0.5 + np.float32([0, 0, 127])
+        overlay[ex_mask > 0] = overlay[ex_mask > 0] * 0.5 + np.float32([0, 127, 127])
+
+        he_px, ex_px = float(he_mask.sum()), float(ex_mask.sum())
+        if he_px > 800: diagnosis = "Nặng (Severe NPDR)"
+        elif he_px > 80 or ex_px > 150: diagnosis = "Trung bình (Moderate NPDR)"
+        elif he_px > 20: diagnosis = "Nhẹ (Mild NPDR)"
+        else: diagnosis = "Bình thường (No DR)"
+        return {
+            "overlay": np.clip(overlay, 0, 255).astype(np.uint8),
+            "diagnosis": diagnosis,
+            "risk_text": f"[LOAD TEST] Kết quả giả lập - HE: {lesion_counts['HE']} | EX: {lesion_counts['EX']}",
+            "findings": {"HE_Count": he_px, "EX_Count": ex_px},
+            "lesion_counts": lesion_counts,
+            "lesions": (he + ex)[:50],
+            "mask_size": self.OUT_SIZE,
+        }
+
+def install_fake_inference(engine):
+    """Gắn engine giả vào bộ gom batch dùng chung (gọi TRƯỚC khi server nhận job đầu tiên)"""
+    from ai.batching import inference_scheduler
+    inference_scheduler.infer_batch_fn = engine
+    return inference_scheduler
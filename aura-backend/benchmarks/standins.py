@@ -0,0 +1,53 @@
+# aura-backend/benchmarks/standins.py
+# Model "đóng thế" khởi tạo ngẫu nhiên, CÙNG input/output shape với MODEL_PATHS,
+# để chạy benchmark khi không có file trọng số .keras thật.
+import tensorflow as tf
+
+STANDIN_SHAPES = {
+    'EX': (256, 256, 3),
+    'HE': (256, 256, 3),
+    'SE': (256, 256, 3),
+    'MA': (256, 256, 3),
+    'OD': (256, 256, 3),
+    'Vessels': (512, 512, 1),
+    'CLASSIFIER': (224, 224, 3),
+}
+
+def build_standin_unet(input_shape, name):
+    """U-Net thu nhỏ: 1 tầng encoder/decoder, đầu ra sigmoid 1 kênh cùng kích thước input"""
+    inputs = tf.keras.Input(shape=input_shape)
+    x1 = tf.keras.layers.Conv2D(8, 3, padding="same", activation="relu")(inputs)
+    x = tf.keras.layers.MaxPooling2D()(x1)
+    x = tf.keras.layers.Conv2D(16, 3, padding="same", activation="relu")(x)
+    x = tf.keras.layers.UpSampling2D()(x)
+    x = tf.keras.layers.Concatenate()([x, x1])
+    outputs = tf.keras.layers.Conv2D(1, 1, activation="sigmoid")(x)
+    return tf.keras.Model(inputs, outputs, name=f"standin_{name}")
+
+def build_standin_classifier(input_shape=(224, 224, 3), num_classes=5):
+    inputs = tf.keras.Input(shape=input_shape)
+    x = tf.keras.layers.Conv2D(16, 3, strides=2, activation="relu")(inputs)
+    x = tf.keras.layers.Conv2D(32, 3, strides=2, activation="relu")(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(num_classes, activation="softmax")(x)
+    return tf.keras.Model(inputs, outputs, name="standin_CLASSIFIER")
+
+def build_standin_models(names=None, seed=0):
+    """Trả về dict tên -> model đóng thế"""
+    tf.keras.utils.set_random_seed(seed)
+    models = {}
+    for name in (names or STANDIN_SHAPES):
+        shape = STANDIN_SHAPES[name]
+        if name == 'CLASSIFIER':
+            models[name] = build_standin_classifier(shape)
+        else:
+            models[name] = build_standin_unet(shape, name)
+    return models
+
+def fill_missing_models(registry):
+    """Nạp model thật nếu có file, còn lại đăng ký model đóng thế; trả về list tên đã thay"""
+    registry.warm_up()
+    missing = [n for n in STANDIN_SHAPES if not registry.is_loaded(n)]
+    for name, model in build_standin_models(missing).items():
+        registry.register(name, model)
+    return missing
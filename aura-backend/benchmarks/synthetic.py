@@ -0,0 +1,54 @@
+# aura-backend/benchmarks/synthetic.py
+# Ảnh đáy mắt tổng hợp (tất định theo seed) cho benchmark: nền đen, đĩa võng mạc cam đỏ tối dần ra rìa,
+# đĩa thị sáng, mạch máu phân nhánh, vài chấm xuất huyết / xuất tiết. Không dùng cho đánh giá độ chính xác.
+import cv2
+import numpy as np
+
+RESOLUTIONS = {
+    "1024x768": (1024, 768),
+    "2048x1536": (2048, 1536),
+    "4000x3000": (4000, 3000),   # ~12MP, cỡ máy chụp đáy mắt thật
+}
+
+def make_fundus_image(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    cx, cy, radius = width // 2, height // 2, min(width, height) // 2 - max(4, min(width, height) // 50)
+    yy, xx = np.ogrid[:height, :width]
+    dist = np.sqrt((xx - cx) ** 2 + (yy - cy) ** 2) / radius
+    inside = dist <= 1.0
+
+    # Nền võng mạc (BGR) tối dần về rìa
+    shade = np.clip(1.0 - 0.45 * dist ** 2, 0, 1)
+    img = np.zeros((height, width, 3), np.float32)
+    for c, base in enumerate((20, 60, 170)):
+        img[:, :, c] = base * shade
+
+    # Đĩa thị sáng lệch về 1 bên
+    od_x, od_y, od_r = int(cx + 0.45 * radius), cy, max(3, radius // 7)
+    cv2.circle(img, (od_x, od_y), od_r, (120, 190, 235), -1)
+
+    # Mạch máu: các đường cong tỏa ra từ đĩa thị, mảnh dần
+    for _ in range(12):
+        angle = rng.uniform(0, 2 * np.pi)
+        x, y, thickness = float(od_x), float(od_y), max(1, radius // 60)
+        for _ in range(40):
+            angle += rng.normal(0, 0.15)
+            nx, ny = x + np.cos(angle) * radius / 25, y + np.sin(angle) * radius / 25
+            cv2.line(img, (int(x), int(y)), (int(nx), int(ny)), (15, 25, 90), thickness)
+            x, y = nx, ny
+            if rng.random() < 0.1: thickness = max(1, thickness - 1)
+
+    # Tổn thương: chấm đỏ sẫm (HE/MA) và mảng vàng (EX)
+    for _ in range(40):
+        r, a = radius * np.sqrt(rng.random()) * 0.9, rng.uniform(0, 2 * np.pi)
+        cv2.circle(img, (int(cx + r * np.cos(a)), int(cy + r * np.sin(a))), int(rng.integers(1, max(2, radius // 80))), (10, 10, 80), -1)
+    for _ in range(15):
+        r, a = radius * np.sqrt(rng.random()) * 0.8, rng.uniform(0, 2 * np.pi)
+        cv2.circle(img, (int(cx + r * np.cos(a)), int(cy + r * np.sin(a))), int(rng.integers(1, max(2, radius // 60))), (90, 200, 220), -1)
+
+    img += rng.normal(0, 4, img.shape).astype(np.float32)
+    img[~inside] = 0   # Ngoài đĩa võng mạc là nền đen
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+def make_fundus_jpeg(width, height, seed=0, quality=95):
+    return cv2.imencode(".jpg", make_fundus_image(width, height, seed), [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
@@ -1,74 +1,329 @@
 # aura-backend/databases/backup_manager.py
-import subprocess
+# Sao lưu / khôi phục MongoDB bằng MongoDB Database Tools (mongodump / mongorestore):
+#   - Bản FULL: 1 file archive nén gzip, stream thẳng từ mongodump (dump song song nhiều collection),
+#     sha256 tính ngay khi ghi.
+#   - Bản INCREMENTAL (cần replica set): chỉ các thao tác oplog của aura_db kể từ bản trước => không
+#     phải dump lại toàn bộ medical_records mỗi đêm. Khôi phục = bản full gốc + phát lại lần lượt các oplog.
+#   - Mỗi bản có manifest JSON: checksum, vị trí oplog; bản full kèm số document + dbHash (md5) từng collection
+#     lấy ngay trước khi dump, đối chiếu lại khi khôi phục (--drop) hoặc verify --restore-check.
+#   - Giữ N bản full gần nhất (kèm các bản incremental phụ thuộc), xóa phần còn lại.
+# Chạy: python -m databases.backup_manager backup [--incremental] | list | verify NAME [--restore-check]
+#       | restore NAME [--drop] | prune [--keep N]
+# Thử với mongod local: MONGO_URL=mongodb://localhost:27017 python -m databases.backup_manager backup
 import os
+import sys
+import json
+import gzip
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
 from datetime import datetime
 from dotenv import load_dotenv
+from pymongo import MongoClient
 
 # Load biến môi trường để lấy MONGO_URL
 load_dotenv()
 
 # Cấu hình
 MONGO_URI = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-DB_NAME = "aura_db"  # Tên database của bạn
-BACKUP_DIR = "backups" # Thư mục chứa file backup
-
-def create_backup():
-    """Tạo một bản sao lưu mới"""
-    # 1. Tạo tên file theo thời gian (VD: 2023-12-25_15-30-00)
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    target_dir = os.path.join(BACKUP_DIR, timestamp)
-    
-    # 2. Tạo lệnh mongodump
-    # Lệnh: mongodump --uri="..." --db=aura_db --out="backups/..."
-    command = [
-        "mongodump",
-        f"--uri={MONGO_URI}",
-        f"--db={DB_NAME}",
-        f"--out={target_dir}"
-    ]
-    
+DB_NAME = os.getenv("AURA_DB_NAME", "aura_db")  # Tên database của bạn
+BACKUP_DIR = os.getenv("AURA_BACKUP_DIR", "backups") # Thư mục chứa file backup
+PARALLEL_COLLECTIONS = int(os.getenv("AURA_BACKUP_PARALLEL", 4))
+KEEP_FULL_BACKUPS = int(os.getenv("AURA_BACKUP_KEEP_FULL", 7))
+CHUNK_SIZE = 1024 * 1024
+
+FULL = "full"
+INCREMENTAL = "incremental"
+
+def _manifest_path(name):
+    return os.path.join(BACKUP_DIR, f"{name}.manifest.json")
+
+def _load_manifest(name):
+    with open(_manifest_path(name), encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_manifest(manifest):
+    path = _manifest_path(manifest["name"])
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+def list_backups():
+    """Manifest của mọi bản backup, cũ -> mới"""
+    if not os.path.isdir(BACKUP_DIR): return []
+    names = [f[:-len(".manifest.json")] for f in os.listdir(BACKUP_DIR) if f.endswith(".manifest.json")]
+    return sorted((_load_manifest(n) for n in names), key=lambda m: m["created_at"])
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class _HashingWriter:
+    """File-like: ghi xuống file thật và cập nhật sha256 + số byte cùng lúc"""
+    def __init__(self, raw):
+        self.raw, self.digest, self.size = raw, hashlib.sha256(), 0
+
+    def write(self, data):
+        self.digest.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+def _stream_to_file(command, target, compress=False):
+    """
+    Chạy lệnh, stream stdout vào file (ghi .part rồi đổi tên), trả về (sha256, số byte) của file trên đĩa.
+    compress=True: nén gzip trong lúc ghi (dùng cho output chưa nén, VD: BSON oplog).
+    """
+    part = target + ".part"
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        with open(part, "wb") as raw:
+            hashing = _HashingWriter(raw)
+            out = gzip.GzipFile(fileobj=hashing, mode="wb") if compress else hashing
+            for chunk in iter(lambda: process.stdout.read(CHUNK_SIZE), b""):
+                out.write(chunk)
+            if compress: out.close()
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, command[0])
+        os.replace(part, target)
+        return hashing.digest.hexdigest(), hashing.size
+    except BaseException:
+        process.kill()
+        process.wait()
+        if os.path.exists(part): os.remove(part)
+        raise
+
+def _collection_stats(db, names=None):
+    """Số document + md5 (lệnh dbHash) từng collection, để đối chiếu sau khi khôi phục"""
+    if names is None:
+        names = sorted(n for n in db.list_collection_names() if not n.startswith("system."))
+    hashes = db.command("dbHash", collections=list(names)).get("collections", {})
+    return {n: {"count": db[n].count_documents({}), "md5": hashes.get(n)} for n in names}
+
+def _compare_stats(expected, db):
+    """Đối chiếu database đã khôi phục với số liệu trong manifest; trả về danh sách collection lệch"""
+    actual = _collection_stats(db, sorted(expected))
+    mismatched = [n for n in sorted(expected) if actual[n] != expected[n]]
+    for n in mismatched:
+        print(f"❌ {n}: manifest {expected[n]['count']} docs / {expected[n]['md5']}, "
+              f"khôi phục {actual[n]['count']} docs / {actual[n]['md5']}")
+    return mismatched
+
+def _latest_oplog_ts(client):
+    """Timestamp oplog mới nhất; None nếu MongoDB không chạy replica set (không có oplog)"""
     try:
-        print(f"⏳ Đang backup database '{DB_NAME}'...")
-        # Chạy lệnh hệ thống
-        subprocess.run(command, check=True, shell=True)
-        print(f"✅ Backup thành công! Dữ liệu lưu tại: {target_dir}")
-        return target_dir
+        entry = client.local["oplog.rs"].find_one(sort=[("$natural", -1)], projection={"ts": 1})
+    except Exception:
+        return None
+    return {"t": entry["ts"].time, "i": entry["ts"].inc} if entry else None
+
+def create_backup(incremental=False, uri=MONGO_URI):
+    """Tạo một bản sao lưu mới; incremental=True cần replica set + đã có bản trước"""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    client = MongoClient(uri)
+    try:
+        oplog_ts = _latest_oplog_ts(client)
+        backups = list_backups()
+        previous = backups[-1] if backups else None
+        if incremental and (oplog_ts is None or previous is None or not previous.get("oplog_ts")):
+            print("⚠️ Không dùng được incremental (chưa có bản trước hoặc MongoDB không phải replica set) => backup FULL")
+            incremental = False
+
+        # 1. Tạo tên file theo thời gian (VD: 2023-12-25_15-30-00)
+        name = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        manifest = {"name": name, "type": INCREMENTAL if incremental else FULL, "db": DB_NAME,
+                    "created_at": datetime.now().isoformat(), "oplog_ts": oplog_ts}
+        print(f"⏳ Đang backup {manifest['type']} database '{DB_NAME}'...")
+
+        if not incremental:
+            # Số liệu đối chiếu lấy ngay trước khi dump (O(database) => chỉ bản full). Có ghi đồng thời trong
+            # lúc dump thì bản dump có thể lệch vài document: chạy backup full lúc ít ghi để đối chiếu khớp.
+            manifest["collections"] = _collection_stats(client[DB_NAME])
+
+        if incremental:
+            # 2a. Chỉ các thao tác oplog của aura_db trong (bản trước, thời điểm hiện tại]
+            since = previous["oplog_ts"]
+            query = json.dumps({
+                "ts": {"$gt": {"$timestamp": since}, "$lte": {"$timestamp": oplog_ts}},
+                "ns": {"$regex": f"^{DB_NAME}\\."},
+            })
+            manifest.update(file=f"{name}.oplog.bson.gz", base=previous["name"], oplog_from=since)
+            command = ["mongodump", f"--uri={uri}", "--db=local", "--collection=oplog.rs", f"--query={query}", "--out=-"]
+            sha256, size = _stream_to_file(command, os.path.join(BACKUP_DIR, manifest["file"]), compress=True)
+        else:
+            # 2b. 1 archive nén, dump song song nhiều collection; vị trí oplog lấy TRƯỚC khi dump
+            #     => bản incremental sau phát lại từ đây (thao tác oplog idempotent nên chồng lấn không sao)
+            manifest["file"] = f"{name}.archive.gz"
+            command = ["mongodump", f"--uri={uri}", f"--db={DB_NAME}", "--archive", "--gzip",
+                       f"--numParallelCollections={PARALLEL_COLLECTIONS}"]
+            sha256, size = _stream_to_file(command, os.path.join(BACKUP_DIR, manifest["file"]))
+        manifest.update(sha256=sha256, size_bytes=size)
+        _write_manifest(manifest)
+        print(f"✅ Backup thành công! {manifest['file']} ({size / 2**20:.1f} MB)")
+        return name
     except subprocess.CalledProcessError as e:
         print(f"❌ Lỗi khi backup: {e}")
         return None
     except FileNotFoundError:
         print("❌ Lỗi: Không tìm thấy lệnh 'mongodump'. Hãy cài đặt MongoDB Database Tools.")
+        return None
+    finally:
+        client.close()
+
+def verify_backup(name):
+    """So checksum file với manifest (phát hiện file hỏng / bị sửa)"""
+    manifest = _load_manifest(name)
+    path = os.path.join(BACKUP_DIR, manifest["file"])
+    ok = os.path.exists(path) and _file_sha256(path) == manifest["sha256"]
+    print(f"{'✅' if ok else '❌'} {name}: checksum {'khớp' if ok else 'KHÔNG khớp'}")
+    return ok
+
+def restore_check(name, uri=MONGO_URI):
+    """
+    Khôi phục thử bản full (hoặc bản full gốc của 1 incremental) vào database tạm, đối chiếu số document + md5
+    với manifest rồi xóa database tạm. Phát hiện bản dump không khôi phục được / thiếu dữ liệu.
+    """
+    full = _backup_chain(name)[0]
+    if not full.get("collections"):
+        print(f"❌ Bản {full['name']} không có số liệu collection để đối chiếu")
+        return False
+    scratch = f"{DB_NAME}_restore_check"
+    client = MongoClient(uri)
+    try:
+        client.drop_database(scratch)
+        print(f"⏳ Khôi phục thử bản '{full['name']}' vào '{scratch}'...")
+        subprocess.run(["mongorestore", f"--uri={uri}", f"--archive={os.path.join(BACKUP_DIR, full['file'])}", "--gzip",
+                        f"--numParallelCollections={PARALLEL_COLLECTIONS}", f"--nsInclude={full['db']}.*",
+                        f"--nsFrom={full['db']}.*", f"--nsTo={scratch}.*"], check=True)
+        ok = not _compare_stats(full["collections"], client[scratch])
+        print(f"{'✅' if ok else '❌'} {full['name']}: dữ liệu khôi phục {'khớp' if ok else 'KHÔNG khớp'} manifest")
+        return ok
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Lỗi khi khôi phục thử: {e}")
+        return False
+    finally:
+        client.drop_database(scratch)
+        client.close()
+
+def _backup_chain(name):
+    """[bản full gốc, incremental..., name]"""
+    chain = [_load_manifest(name)]
+    while chain[0]["type"] == INCREMENTAL:
+        chain.insert(0, _load_manifest(chain[0]["base"]))
+    return chain
+
+def _replay_oplog(manifest, uri):
+    with tempfile.TemporaryDirectory() as tmp:
+        oplog_file = os.path.join(tmp, "oplog.bson")
+        with gzip.open(os.path.join(BACKUP_DIR, manifest["file"]), "rb") as src, open(oplog_file, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        empty_dump = os.path.join(tmp, "dump")
+        os.makedirs(empty_dump)
+        subprocess.run(["mongorestore", f"--uri={uri}", "--oplogReplay", f"--oplogFile={oplog_file}", empty_dump], check=True)
 
-def restore_backup(backup_folder_name):
-    """Khôi phục từ một bản backup cụ thể"""
-    # Đường dẫn đến file BSON cần restore
-    source_path = os.path.join(BACKUP_DIR, backup_folder_name, DB_NAME)
-    
-    if not os.path.exists(source_path):
-        print(f"❌ Không tìm thấy bản backup: {source_path}")
-        return
-
-    # Lệnh: mongorestore --uri="..." --db=aura_db --drop "path/to/dump"
-    # --drop: Xóa dữ liệu cũ trước khi chép đè (cho sạch sẽ)
-    command = [
-        "mongorestore",
-        f"--uri={MONGO_URI}",
-        f"--db={DB_NAME}",
-        "--drop", 
-        source_path
-    ]
-    
+def restore_backup(backup_name, drop=False, collections=None, uri=MONGO_URI):
+    """
+    Khôi phục tới thời điểm của bản backup_name (full, hoặc full gốc + các incremental).
+    drop=True: xóa collection trước khi chép đè. collections: chỉ khôi phục các collection này (bản full).
+    """
+    if not os.path.exists(_manifest_path(backup_name)):
+        print(f"❌ Không tìm thấy bản backup: {backup_name}")
+        return False
+    chain = _backup_chain(backup_name)
+    if not all(verify_backup(m["name"]) for m in chain):
+        print("❌ Dừng khôi phục: có file backup hỏng")
+        return False
+    if collections and len(chain) > 1:
+        print("❌ Khôi phục từng collection chỉ hỗ trợ bản full")
+        return False
+
+    full = chain[0]
+    command = ["mongorestore", f"--uri={uri}", f"--archive={os.path.join(BACKUP_DIR, full['file'])}", "--gzip",
+               f"--numParallelCollections={PARALLEL_COLLECTIONS}", f"--nsInclude={DB_NAME}.*"]
+    if collections:
+        command[-1:] = [f"--nsInclude={DB_NAME}.{c}" for c in collections]
+    if drop: command.append("--drop")
     try:
-        print(f"⏳ Đang khôi phục database từ bản '{backup_folder_name}'...")
-        subprocess.run(command, check=True, shell=True)
+        print(f"⏳ Đang khôi phục database từ bản '{full['name']}'...")
+        subprocess.run(command, check=True)
+        for manifest in chain[1:]:
+            print(f"⏳ Phát lại oplog bản '{manifest['name']}'...")
+            _replay_oplog(manifest, uri)
         print(f"✅ Khôi phục thành công!")
+        # Chỉ đối chiếu được khi DB đích = đúng bản full (--drop, không phát lại oplog sau đó)
+        if drop and len(chain) == 1 and full.get("collections"):
+            expected = {c: v for c, v in full["collections"].items() if not collections or c in collections}
+            client = MongoClient(uri)
+            try:
+                if _compare_stats(expected, client[DB_NAME]):
+                    print("⚠️ Dữ liệu khôi phục lệch số liệu trong manifest (xem danh sách trên)")
+                    return False
+            finally:
+                client.close()
+            print("✅ Dữ liệu khôi phục khớp manifest")
+        return True
     except subprocess.CalledProcessError as e:
         print(f"❌ Lỗi khi khôi phục: {e}")
+        return False
+
+def prune_backups(keep_full=KEEP_FULL_BACKUPS):
+    """Giữ keep_full bản full mới nhất + incremental dựa trên chúng; xóa phần còn lại"""
+    backups = list_backups()
+    fulls = [m for m in backups if m["type"] == FULL]
+    if len(fulls) <= keep_full: return []
+    cutoff = fulls[-keep_full]["created_at"] if keep_full > 0 else None
+    removed = []
+    for manifest in backups:
+        if cutoff is not None and manifest["created_at"] >= cutoff: continue
+        for path in (os.path.join(BACKUP_DIR, manifest["file"]), _manifest_path(manifest["name"])):
+            if os.path.exists(path): os.remove(path)
+        removed.append(manifest["name"])
+    if removed: print(f"🧹 Đã xóa {len(removed)} bản backup cũ")
+    return removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Sao lưu / khôi phục MongoDB của AURA")
+    parser.add_argument("--uri", default=MONGO_URI)
+    sub = parser.add_subparsers(dest="action", required=True)
+    backup = sub.add_parser("backup")
+    backup.add_argument("--incremental", action="store_true")
+    backup.add_argument("--no-prune", action="store_true")
+    sub.add_parser("list")
+    verify = sub.add_parser("verify")
+    verify.add_argument("name")
+    verify.add_argument("--restore-check", action="store_true", help="Khôi phục thử vào DB tạm và đối chiếu manifest")
+    restore = sub.add_parser("restore")
+    restore.add_argument("name")
+    restore.add_argument("--drop", action="store_true", help="Xóa collection trước khi khôi phục")
+    restore.add_argument("--collection", action="append", help="Chỉ khôi phục collection này (lặp lại được)")
+    prune = sub.add_parser("prune")
+    prune.add_argument("--keep", type=int, default=KEEP_FULL_BACKUPS)
+    args = parser.parse_args()
+
+    if args.action == "backup":
+        name = create_backup(args.incremental, args.uri)
+        if name and not args.no_prune: prune_backups()
+        sys.exit(0 if name else 1)
+    if args.action == "list":
+        for m in list_backups():
+            docs = f"{sum(c['count'] for c in m['collections'].values())} docs" if m.get("collections") else ""
+            print(f"{m['name']}  {m['type']:<11}  {m['size_bytes'] / 2**20:8.1f} MB  {docs}")
+    elif args.action == "verify":
+        ok = verify_backup(args.name)
+        if ok and args.restore_check: ok = restore_check(args.name, args.uri)
+        sys.exit(0 if ok else 1)
+    elif args.action == "restore":
+        sys.exit(0 if restore_backup(args.name, args.drop, args.collection, args.uri) else 1)
+    elif args.action == "prune":
+        prune_backups(args.keep)
 
 # --- PHẦN CHẠY THỬ (TEST) ---
 if __name__ == "__main__":
-    # Để test backup, bỏ comment dòng dưới:
-    create_backup()
-    
-    # Để test restore, bỏ comment dòng dưới và điền tên folder backup vừa tạo:
-    # restore_backup("2025-12-25_16-00-00")
\ No newline at end of file
+    main()
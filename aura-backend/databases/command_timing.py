@@ -0,0 +1,57 @@
+# aura-backend/databases/command_timing.py
+# Móc đo độ trễ từng lệnh MongoDB (CommandListener của pymongo, gắn vào client motor ở databases/mongodb.py),
+# không phụ thuộc tầng services: phía server đăng ký listener (services/metrics.py) để ghi histogram.
+# Chưa có listener nào (script, benchmark) => bỏ qua ngay ở started(), gần như 0 chi phí.
+import threading
+
+from pymongo import monitoring
+
+# Lệnh bắt tay / xác thực: không phải truy vấn của ứng dụng
+_IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "buildInfo", "saslStart", "saslContinue", "endSessions"}
+# Chặn rò bộ nhớ nếu mất sự kiện kết thúc (hiếm, vd client bị đóng giữa chừng)
+_MAX_PENDING_COMMANDS = 10_000
+
+_listeners = []
+
+def add_command_listener(fn):
+    """fn(collection, command, seconds, failed)"""
+    if fn not in _listeners: _listeners.append(fn)
+
+def remove_command_listener(fn):
+    if fn in _listeners: _listeners.remove(fn)
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    pymongo gọi listener ở luồng thực thi lệnh (nhiều luồng cùng lúc với client đồng bộ / executor):
+    chỉ ghi nhận, không làm gì chậm; _pending được khóa.
+    """
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if not _listeners or event.command_name in _IGNORED_COMMANDS: return
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore": target = event.command.get("collection")
+        with self._lock:
+            if len(self._pending) > _MAX_PENDING_COMMANDS: self._pending.clear()
+            self._pending[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event, failed):
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None: return
+        for fn in list(_listeners):
+            try:
+                fn(collection, event.command_name, event.duration_micros / 1e6, failed)
+            except Exception as e:
+                print(f"⚠️ Lỗi listener đo lệnh MongoDB: {e}")
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+# Instance dùng chung (truyền vào AsyncIOMotorClient(event_listeners=...))
+command_timer = MongoCommandTimer()
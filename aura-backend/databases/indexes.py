@@ -0,0 +1,175 @@
+# aura-backend/databases/indexes.py
+# Khai báo index cho mọi truy vấn nóng + kiểm tra query plan bằng explain().
+#   - apply_indexes(db): tạo index (idempotent, chạy lúc init_db)
+#   - verify_query_plans(db): explain() từng truy vấn trong hot_queries(), báo lỗi nếu rơi về COLLSCAN
+#     hoặc phải SORT trong bộ nhớ (index không cho sẵn thứ tự)
+# Chạy kiểm tra (CI / sau khi đổi truy vấn): python -m databases.indexes --check
+import os
+import sys
+import asyncio
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure
+
+
+# Job DONE / DEAD (services/job_queue) được MongoDB tự xóa sau ngần này ngày; kết quả nằm ở medical_records
+JOB_RETENTION_DAYS = float(os.getenv("AURA_JOB_RETENTION_DAYS", 7))
+
+# collection -> danh sách index. Không đặt 'name' => MongoDB tự đặt tên theo key (VD: userName_1),
+# tạo lại index giống hệt là no-op.
+INDEX_SPECS = {
+    "users": [
+        # get_current_user / login / register tra theo userName; code giả định userName là duy nhất
+        {"keys": [("userName", 1)], "unique": True},
+        # Không unique: tài khoản đăng ký bằng tên (không phải email) dùng chung email giả "no_email@example.com"
+        {"keys": [("email", 1)]},
+        # Chỉ unique với SĐT đã điền (bỏ qua null / chuỗi rỗng)
+        {"keys": [("phone", 1)], "unique": True, "partialFilterExpression": {"phone": {"$gt": ""}}},
+        {"keys": [("assigned_doctor_id", 1), ("userName", 1)]},
+    ],
+    "medical_records": [
+        # Phân trang keyset sort (upload_date, _id) => _id nằm trong index, không SORT trong bộ nhớ
+        {"keys": [("user_id", 1), ("upload_date", -1), ("_id", -1)]},
+        # Chỉ hồ sơ đang chờ (enqueue_orphaned_records lúc khởi động) => index rất nhỏ
+        {"keys": [("ai_analysis_status", 1)], "partialFilterExpression": {"ai_analysis_status": "PENDING"}},
+    ],
+    "messages": [
+        # Lịch sử chat 2 chiều, phân trang keyset sort (timestamp, _id): mỗi chiều 1 IXSCAN đã đúng thứ tự => SORT_MERGE
+        {"keys": [("sender_id", 1), ("receiver_id", 1), ("timestamp", 1), ("_id", 1)]},
+    ],
+    "analysis_jobs": [
+        # Nhận job theo trạng thái + thời điểm sẵn sàng / hết hạn khóa
+        {"keys": [("status", 1), ("available_at", 1)]},
+        {"keys": [("status", 1), ("locked_until", 1)]},
+        {"keys": [("record_id", 1)]},
+        # TTL: chỉ job đã kết thúc (partialFilterExpression với $in cần MongoDB >= 6.0) => collection không phình mãi
+        {"keys": [("finished_at", 1)], "expireAfterSeconds": int(JOB_RETENTION_DAYS * 86400),
+         "partialFilterExpression": {"status": {"$in": ["DONE", "DEAD"]}}},
+    ],
+}
+
+# Index cũ đã bị index khác thay thế (VD: thêm _id vào cuối cho phân trang keyset) => xóa để không tốn công ghi
+RETIRED_INDEXES = {
+    "medical_records": ["user_id_1_upload_date_-1"],
+    "messages": ["sender_id_1_receiver_id_1_timestamp_1"],
+    # get_summaries chỉ tra theo _id (= cặp người dùng) => index participants chỉ tốn công ghi
+    "conversations": ["participants_1"],
+}
+
+_SAMPLE_ID = str(ObjectId())
+_NOW = datetime.utcnow()
+
+def _keyset_pages(name, collection, query, sort_field, direction=-1):
+    """
+    2 truy vấn y hệt fetch_page (services/pagination): trang đầu + trang sau (kèm điều kiện cursor),
+    sort (sort_field, _id), limit = page size + 1
+    """
+    # Import khi cần: tầng databases không phụ thuộc services lúc import (services dùng databases)
+    from services.pagination import keyset_filter, DEFAULT_PAGE_SIZE
+    page = {"collection": collection, "sort": {sort_field: direction, "_id": direction}, "limit": DEFAULT_PAGE_SIZE + 1}
+    after = keyset_filter(sort_field, direction, _NOW, ObjectId())
+    return [
+        dict(page, name=f"{name} (trang đầu)", filter=query),
+        dict(page, name=f"{name} (trang sau)", filter={"$and": [query, after]}),
+    ]
+
+# Truy vấn nóng (dạng find tương đương) cần có index. Giá trị chỉ là mẫu: plan phụ thuộc hình dạng truy vấn.
+HOT_QUERIES = [
+    {"name": "get_current_user / login", "collection": "users", "filter": {"userName": "bench_user"}},
+    {"name": "social login theo email", "collection": "users", "filter": {"email": "a@b.c"}},
+    {"name": "trùng email khi sửa hồ sơ", "collection": "users", "filter": {"email": "a@b.c", "_id": {"$ne": ObjectId()}}},
+    {"name": "trùng SĐT khi sửa hồ sơ", "collection": "users", "filter": {"phone": "0900000000", "_id": {"$ne": ObjectId()}}},
+    {"name": "bệnh nhân của bác sĩ", "collection": "users", "filter": {"assigned_doctor_id": _SAMPLE_ID}, "sort": {"userName": 1}},
+    {"name": "lần quét mới nhất ($lookup)", "collection": "medical_records", "filter": {"user_id": _SAMPLE_ID}, "sort": {"upload_date": -1}, "limit": 1},
+    {"name": "hồ sơ PENDING bị bỏ sót", "collection": "medical_records", "filter": {"ai_analysis_status": "PENDING"}},
+    {"name": "đánh dấu đã đọc (tin trong trang)", "collection": "messages",
+     "filter": {"_id": {"$in": [ObjectId()]}, "receiver_id": _SAMPLE_ID, "is_read": False}},
+    {"name": "tóm tắt hội thoại", "collection": "conversations", "filter": {"_id": {"$in": [f"{_SAMPLE_ID}:other"]}}},
+    {"name": "nhận job", "collection": "analysis_jobs", "filter": {"$or": [
+        {"status": "QUEUED", "available_at": {"$lte": _NOW}}, {"status": "RUNNING", "locked_until": {"$lt": _NOW}}],
+        "image_ready": {"$ne": False}, "attempts": {"$lt": 5}}, "sort": {"available_at": 1},
+     # Nhánh RUNNING đi theo index locked_until nên phải SORT: chỉ trên các job đủ điều kiện nhận (tập nhỏ)
+     "allow_sort": True},
+    {"name": "job hết hạn khóa", "collection": "analysis_jobs", "filter": {"status": "RUNNING", "locked_until": {"$lt": _NOW}}},
+    {"name": "job của hồ sơ", "collection": "analysis_jobs", "filter": {"record_id": _SAMPLE_ID}},
+]
+
+# Danh sách phân trang keyset (fetch_page): (tên, collection, điều kiện, trường sắp xếp)
+KEYSET_QUERIES = [
+    ("lịch sử khám", "medical_records", {"user_id": _SAMPLE_ID}, "upload_date"),
+    ("lịch sử chat", "messages", {"$or": [
+        {"sender_id": _SAMPLE_ID, "receiver_id": "other"}, {"sender_id": "other", "receiver_id": _SAMPLE_ID}]}, "timestamp"),
+]
+
+def hot_queries():
+    """HOT_QUERIES + 2 trang (đầu / sau cursor) của mỗi truy vấn phân trang keyset"""
+    return HOT_QUERIES + [q for args in KEYSET_QUERIES for q in _keyset_pages(*args)]
+
+async def apply_indexes(db, specs=INDEX_SPECS, retired=RETIRED_INDEXES):
+    """
+    Tạo toàn bộ index khai báo rồi xóa index đã bị thay thế;
+    trả về danh sách lỗi (VD: dữ liệu cũ bị trùng nên không tạo được unique)
+    """
+    errors = []
+    for collection, indexes in specs.items():
+        for spec in indexes:
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            try:
+                await db[collection].create_index(spec["keys"], **options)
+            except OperationFailure as e:
+                errors.append(f"{collection} {spec['keys']}: {e}")
+                print(f"   ⚠️ Không tạo được index {collection} {spec['keys']}: {e}")
+    for collection, names in retired.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection].drop_index(name)
+                print(f"   🧹 Đã xóa index cũ {collection}.{name}")
+    return errors
+
+def _plan_stages(plan):
+    """Duyệt cây plan của explain() (cả engine cổ điển lẫn SBE), trả về mọi tên stage"""
+    if isinstance(plan, dict):
+        if "stage" in plan: yield plan["stage"]
+        for key in ("inputStage", "queryPlan", "winningPlan"):
+            if key in plan: yield from _plan_stages(plan[key])
+        for child in plan.get("inputStages", []):
+            yield from _plan_stages(child)
+
+async def explain_query(db, query):
+    command = {"find": query["collection"], "filter": query["filter"]}
+    if "sort" in query: command["sort"] = query["sort"]
+    if "limit" in query: command["limit"] = query["limit"]
+    result = await db.command("explain", command, verbosity="queryPlanner")
+    return list(_plan_stages(result["queryPlanner"]["winningPlan"]))
+
+async def verify_query_plans(db, queries=None):
+    """
+    Trả về danh sách (tên truy vấn, các stage) bị COLLSCAN hoặc SORT trong bộ nhớ (trừ truy vấn đánh dấu allow_sort);
+    rỗng = mọi truy vấn nóng đều dùng index, kể cả cho thứ tự sắp xếp
+    """
+    failures = []
+    for query in queries if queries is not None else hot_queries():
+        stages = await explain_query(db, query)
+        bad = [s for s in ("COLLSCAN", "SORT") if s in stages and not (s == "SORT" and query.get("allow_sort"))]
+        if bad:
+            failures.append((query["name"], stages))
+            print(f"   ❌ {'/'.join(bad)}: {query['name']} ({query['collection']}) -> {' > '.join(stages)}")
+    return failures
+
+async def _check():
+    from .mongodb import db
+    from .init_db import init_db
+    await init_db()   # Tạo collection còn thiếu (explain trên collection không tồn tại luôn ra EOF)
+    errors = await apply_indexes(db)
+    failures = await verify_query_plans(db)
+    if not errors and not failures:
+        print(f"✅ {len(hot_queries())} truy vấn nóng đều dùng index")
+    return 1 if errors or failures else 0
+
+if __name__ == "__main__":
+    if "--check" not in sys.argv[1:]:
+        print("Dùng: python -m databases.indexes --check")
+        sys.exit(2)
+    sys.exit(asyncio.run(_check()))
@@ -1,12 +1,20 @@
 # aura-backend/databases/init_db.py
+import os
 from .mongodb import db
+from .indexes import apply_indexes, verify_query_plans
+
+# Bật để kiểm tra query plan (COLLSCAN / SORT) mỗi lần khởi động; CI dùng: python -m databases.indexes --check
+VERIFY_QUERY_PLANS = os.getenv("AURA_VERIFY_QUERY_PLANS", "0") == "1"
 
 # Danh sách các bảng cần có
 REQUIRED_COLLECTIONS = [
     "users",
     "medical_records",
     "messages",
-    "payments"
+    "payments",
+    "analysis_jobs",  # Hàng đợi phân tích AI (services/job_queue.py)
+    "inference_cache", # Cache kết quả AI theo nội dung ảnh (services/result_cache.py)
+    "conversations"   # Tóm tắt hội thoại cho danh sách chat (services/conversations.py)
 ]
 
 async def init_db():
@@ -18,6 +26,15 @@ async def init_db():
             if col not in existing:
                 await db.create_collection(col)
                 print(f"   ✅ Đã tạo bảng: {col}")
+        # Lần đầu có 'conversations': dựng lại từ tin nhắn cũ
+        if "conversations" not in existing and "messages" in existing:
+            from services.conversations import backfill_conversations   # Chỉ cần 1 lần; databases không phụ thuộc services lúc import
+            count = await backfill_conversations(db.messages, db.conversations)
+            print(f"   ✅ Đã dựng {count} hội thoại từ tin nhắn cũ")
+        # Index khai báo tập trung ở databases/indexes.py (tạo lại là no-op)
+        await apply_indexes(db)
+        if VERIFY_QUERY_PLANS:
+            await verify_query_plans(db)
         print("🚀 [Database] Sẵn sàng!")
     except Exception as e:
         print(f"❌ [Database] Lỗi: {e}")
\ No newline at end of file
@@ -3,19 +3,24 @@ import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
+from .command_timing import command_timer
+
 load_dotenv()
 
 class MongoDB:
     def __init__(self):
         self.mongo_url = os.getenv("MONGO_URL", "mongodb://mongo_db:27017")
+        # Đổi tên DB khi load test / benchmark để không đụng dữ liệu thật
+        self.db_name = os.getenv("AURA_DB_NAME", "aura_db")
         self.client = None
         self.db = None
 
     def connect(self):
         """Kết nối tới MongoDB (Async)"""
         try:
-            self.client = AsyncIOMotorClient(self.mongo_url)
-            self.db = self.client.aura_db  # Tên database là 'aura_db'
+            # Móc đo độ trễ từng lệnh (services/metrics đăng ký listener cho GET /metrics)
+            self.client = AsyncIOMotorClient(self.mongo_url, event_listeners=[command_timer])
+            self.db = self.client[self.db_name]  # Mặc định 'aura_db'
             print("✅ Kết nối MongoDB (Async) thành công!")
             return self.db
         except Exception as e:
@@ -1,34 +1,76 @@
 # aura-backend/main.py
 import os
-import io
-import cv2
-import bcrypt
-import requests
+import asyncio
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, BackgroundTasks
+from typing import Optional, List
+from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-import cloudinary
-import cloudinary.uploader
 from bson.objectid import ObjectId
 
 # --- IMPORT MODULES CỦA DỰ ÁN (STRUCTURE MỚI) ---
 from databases import db, init_db  # Import DB từ folder databases
-from ai.inference import run_aura_inference # Import logic AI từ folder ai
 from models import User, UserProfile, Message, Payment # Import Models Pydantic
+from services import close_http_client
+from services.analysis import analysis_queue, result_cache, MODEL_WARMUP, original_url, submit_scan, store_scan # Hàng đợi phân tích AI bền vững (MongoDB)
+from services.storage import storage, LOCAL_STORAGE_DIR
+from services.patients import list_doctor_patients
+from services.user_cache import user_cache
+from services.ingest import ingest_upload, RejectedUpload, UploadSizeLimitMiddleware, MAX_UPLOAD_BYTES
+from services.events import event_bus, new_message_event, sse_stream, run_change_stream_relay, CHANGE_STREAMS_ENABLED
+from services.passwords import hash_password, verify_password, PasswordPoolBusy
+from services.pagination import fetch_page, InvalidCursor
+from services.conversations import record_message, mark_read, get_summaries as get_conversation_summaries
+from services.social_auth import verify_google_token, verify_facebook_token, SocialAuthError
+from services.analysis_worker import AnalysisWorker
+from services.metrics import metrics_registry, MetricsMiddleware, register_queue_metrics, METRICS_ENABLED, METRICS_TOKEN, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from ai.registry import model_registry # Trạng thái nạp model (không kéo theo TensorFlow)
 # ------------------------------------------------
 
 
 load_dotenv()
 app = FastAPI()
 
+# Số ảnh tối đa mỗi lượt upload nhiều ảnh
+UPLOAD_MAX_FILES = int(os.getenv("AURA_UPLOAD_MAX_FILES", 12))
+# Worker AI chạy ngay trong process API (tắt bằng AURA_EMBEDDED_WORKER=0 khi đã có process worker riêng)
+EMBEDDED_WORKER = os.getenv("AURA_EMBEDDED_WORKER", "1") == "1"
+embedded_worker = None
+embedded_worker_task = None
+event_relay_task = None
+
 @app.on_event("startup")
 async def startup_event():
+    global embedded_worker, embedded_worker_task, event_relay_task
     # Gọi hàm init giống hệt thầy
     await init_db()
-# Cấu hình CORS
+    if EMBEDDED_WORKER:
+        embedded_worker = AnalysisWorker()
+        embedded_worker_task = asyncio.create_task(embedded_worker.run())
+    if CHANGE_STREAMS_ENABLED:
+        # Sự kiện từ worker AI / process API khác tới qua MongoDB change stream
+        event_relay_task = asyncio.create_task(run_change_stream_relay(db))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if embedded_worker:
+        embedded_worker.stop()
+        await embedded_worker_task
+    if event_relay_task:
+        event_relay_task.cancel()
+    await close_http_client()
+
+# Chặn body quá lớn trước khi parse multipart (thêm ~1MB cho phần đầu/biên multipart)
+app.add_middleware(UploadSizeLimitMiddleware, limits={
+    "/api/upload-eye-image": MAX_UPLOAD_BYTES + 2**20,
+    "/api/upload-eye-images": MAX_UPLOAD_BYTES * UPLOAD_MAX_FILES + 2**20,
+})
+
+# Cấu hình CORS (thêm sau => bọc ngoài cùng, response 413 vẫn có header CORS)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -37,10 +79,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Đo độ trễ / số request đang xử lý theo route (ngoài cùng => tính cả request bị 413 / preflight CORS)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    register_queue_metrics(analysis_queue)
+
+@app.exception_handler(RejectedUpload)
+async def rejected_upload_handler(request, exc):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+@app.exception_handler(PasswordPoolBusy)
+async def password_pool_busy_handler(request, exc):
+    # Đợt login dồn dập vượt hàng đợi băm mật khẩu => từ chối sớm, client thử lại sau
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# Storage local (test / cơ sở không có Internet): server tự phục vụ ảnh qua /media
+if storage.name == "local":
+    app.mount("/media", StaticFiles(directory=LOCAL_STORAGE_DIR), name="media")
+
 # KẾT NỐI DATABASE (Lấy từ module databases)
 users_collection = db.users
 medical_records_collection = db.medical_records
 messages_collection = db.messages
+conversations_collection = db.conversations
 
 # Cấu hình Bảo mật
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -52,14 +113,6 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
-# Cấu hình Cloudinary
-cloudinary.config( 
-    cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"), 
-    api_key = os.getenv("CLOUDINARY_API_KEY"), 
-    api_secret = os.getenv("CLOUDINARY_API_SECRET"),
-    secure = True
-)
-
 # --- CÁC MODEL REQUEST (Pydantic cho API Input) ---
 from pydantic import BaseModel
 class LoginRequest(BaseModel):
@@ -116,75 +169,61 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         if userName is None: raise credentials_exception
     except JWTError: raise credentials_exception
 
-    user = await users_collection.find_one({"userName": userName})
+    user_info = user_cache.get(userName)
+    if user_info is not None: return user_info
+
+    user = await users_collection.find_one({"userName": userName}, {"password": 0})
     if user is None: raise credentials_exception
     
     # Trả về full info để tiện dùng
     user_info = user.copy()
     user_info["id"] = str(user["_id"])
     del user_info["_id"] # Xóa _id dạng object để tránh lỗi json
-    if "password" in user_info: del user_info["password"]
+    user_cache.set(userName, user_info)
     return user_info
 
-# --- TÁC VỤ NGẦM: CHẠY AI (Đã gọi hàm từ module ai/inference.py) ---
-async def real_ai_analysis(record_id: str, image_url: str):
-    print(f"🤖 AI AURA đang phân tích hồ sơ: {record_id}...")
-    try:
-        # 1. Tải ảnh
-        response = requests.get(image_url)
-        if response.status_code != 200: raise Exception("Lỗi tải ảnh Cloudinary")
-        image_bytes = response.content
-
-        # 2. GỌI MODULE AI MỚI
-        overlay_img, diagnosis_result, detailed_risk = run_aura_inference(image_bytes)
-        
-        # 3. Upload kết quả
-        is_success, buffer = cv2.imencode(".png", overlay_img)
-        annotated_file = io.BytesIO(buffer.tobytes())
-        
-        upload_result = cloudinary.uploader.upload(
-            file=annotated_file, 
-            public_id=f"aura_scan_{record_id}", 
-            folder="aura_results",
-            resource_type="image"
-        )
-        annotated_url = upload_result.get("secure_url")
-        
-        # 4. Update DB
-        await medical_records_collection.update_one(
-            {"_id": ObjectId(record_id)},
-            {
-                "$set": {
-                    "ai_analysis_status": "COMPLETED",
-                    "ai_result": diagnosis_result,
-                    "doctor_note": detailed_risk,
-                    "annotated_image_url": annotated_url
-                }
-            }
-        )
-        print(f"✅ Hồ sơ {record_id} hoàn tất.")
-    
-    except Exception as e:
-        print(f"❌ Lỗi AI: {e}")
-        await medical_records_collection.update_one(
-            {"_id": ObjectId(record_id)},
-            {"$set": {"ai_analysis_status": "FAILED", "ai_result": "Lỗi phân tích"}}
-        )
-
 # --- CÁC API ENDPOINTS ---
 
+@app.get("/api/health/ready")
+async def readiness():
+    """Probe cho orchestrator: chỉ định tuyến traffic tới worker đã warm-up model"""
+    if not EMBEDDED_WORKER:
+        # AI chạy ở process worker riêng (xem --health-port của services.analysis_worker)
+        return {"ready": True, "inference": "external"}
+    state = model_registry.status()
+    if not MODEL_WARMUP:
+        state["ready"] = True  # Chế độ lazy: model nạp ở job đầu tiên, không chờ warm-up
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content=state)
+    return state
+
+@app.get("/api/events")
+async def stream_events(request: Request, token: Optional[str] = None):
+    """SSE: đẩy 'analysis_status' (hồ sơ phân tích xong) và 'new_message' thay cho poll"""
+    # EventSource của trình duyệt không gửi được header Authorization => nhận token qua query
+    if token is None:
+        auth = request.headers.get("Authorization", "")
+        token = auth[7:] if auth.startswith("Bearer ") else None
+    if not token: raise HTTPException(status_code=401, detail="Thiếu token")
+    current_user = await get_current_user(token)
+    return StreamingResponse(
+        sse_stream(current_user["id"], request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/api/register")
 async def register(data: RegisterRequest):
     existing_user = await users_collection.find_one({"userName": data.userName})
     if existing_user: raise HTTPException(status_code=400, detail="Tên tài khoản đã được sử dụng")
     
-    hashed_password = bcrypt.hashpw(data.password.encode('utf-8'), bcrypt.gensalt())
+    hashed_password = await hash_password(data.password)  # Băm trong pool riêng, không chặn event loop
     
     # SỬ DỤNG MODEL USER (ORM)
     new_user_model = User(
         username=data.userName,
         email=data.userName if "@" in data.userName else "no_email@example.com",
-        password_hash=hashed_password.decode('utf-8'),
+        password_hash=hashed_password,
         role=data.role,
         profile=UserProfile(full_name="New User")
     )
@@ -198,7 +237,7 @@ async def login(data: LoginRequest):
     user = await users_collection.find_one({"userName": data.userName})
     if not user: raise HTTPException(status_code=400, detail="Tên tài khoản không tồn tại")
     
-    if not bcrypt.checkpw(data.password.encode('utf-8'), user["password"].encode('utf-8')):
+    if not await verify_password(data.password, user.get("password")):
          raise HTTPException(status_code=400, detail="Sai mật khẩu")
 
     token_data = {"sub": user["userName"], "role": user["role"]}
@@ -213,31 +252,104 @@ async def login(data: LoginRequest):
 async def read_users_me(current_user: dict = Depends(get_current_user)):
     return {"message": "Dữ liệu người dùng", "user_info": current_user}
 
+def _new_scan_record(record_id, current_user, img_url, upload_date, batch_id=None, content_hash=None):
+    record = {
+        "_id": record_id,
+        "user_id": current_user["id"],
+        "userName": current_user["userName"],
+        "image_url": img_url,
+        "upload_date": upload_date,
+        "ai_analysis_status": "PENDING",
+        "ai_result": "Đang phân tích..." 
+    }
+    if batch_id: record["batch_id"] = batch_id  # Các ảnh của cùng 1 lượt khám
+    if content_hash: record["content_hash"] = content_hash
+    return record
+
+def _wake_embedded_worker():
+    if embedded_worker: embedded_worker.notify()
+
 @app.post("/api/upload-eye-image")
-async def upload_eye_image(bg_tasks: BackgroundTasks, file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
-    if not file.content_type.startswith("image/"): raise HTTPException(400, "File không hợp lệ")
+async def upload_eye_image(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+    # Đọc theo khối: kiểm tra dung lượng, định dạng thật (magic bytes) + kích thước từ header, tính hash
+    image = await ingest_upload(file)
     try:
-        res = cloudinary.uploader.upload(file.file, folder="aura_retina")
-        img_url = res.get("secure_url")
-        
-        record = {
-            "user_id": current_user["id"],
-            "userName": current_user["userName"],
-            "image_url": img_url,
-            "upload_date": datetime.utcnow(),
-            "ai_analysis_status": "PENDING",
-            "ai_result": "Đang phân tích..." 
-        }
-        new_rec = await medical_records_collection.insert_one(record)
-        bg_tasks.add_task(real_ai_analysis, str(new_rec.inserted_id), img_url)
-        return {"message": "Upload thành công!", "url": img_url, "record_id": str(new_rec.inserted_id)}
+        record_id = ObjectId()
+        img_url = original_url(str(record_id), image.ext)
+        record = _new_scan_record(record_id, current_user, img_url, datetime.utcnow(), content_hash=image.sha256)
+        if EMBEDDED_WORKER:
+            # Giữ bytes đã nhận để đưa thẳng cho AI; ảnh gốc upload lên storage ở nền (song song với AI)
+            await medical_records_collection.insert_one(record)
+            submit_scan(str(record_id), image.data, image.ext, image.sha256)
+            # Xếp hàng bền vững: process khởi động lại thì worker vẫn nhận lại job
+            await analysis_queue.enqueue(str(record_id), img_url, image_ready=False)
+            _wake_embedded_worker()
+        else:
+            # Worker ở process khác tải ảnh từ storage => lưu ảnh xong rồi mới tạo hồ sơ + xếp hàng
+            await store_scan(str(record_id), image.data, image.ext)
+            await medical_records_collection.insert_one(dict(record, image_stored=True))
+            await analysis_queue.enqueue(str(record_id), img_url)
+        return {"message": "Upload thành công!", "url": img_url, "record_id": str(record_id)}
     except Exception as e: raise HTTPException(500, f"Lỗi server: {e}")
 
+@app.post("/api/upload-eye-images")
+async def upload_eye_images(files: List[UploadFile] = File(...), current_user: dict = Depends(get_current_user)):
+    """Upload nhiều ảnh của 1 lượt khám (2 mắt, trung tâm hoàng điểm / đĩa thị) trong 1 request"""
+    if len(files) > UPLOAD_MAX_FILES:
+        raise HTTPException(400, f"Tối đa {UPLOAD_MAX_FILES} ảnh mỗi lượt")
+    batch_id = str(ObjectId())
+    upload_date = datetime.utcnow()
+    results, accepted = [], []  # accepted: (vị trí trong results, record_id, IngestedImage, url)
+    for file in files:
+        item = {"filename": file.filename}
+        results.append(item)
+        try:
+            image = await ingest_upload(file)
+        except RejectedUpload as e:
+            item.update(status="REJECTED", error=str(e))
+            continue
+        record_id = ObjectId()
+        accepted.append((len(results) - 1, record_id, image, original_url(str(record_id), image.ext)))
+
+    if accepted:
+        try:
+            records = [_new_scan_record(rid, current_user, url, upload_date, batch_id, image.sha256) for _, rid, image, url in accepted]
+            if not EMBEDDED_WORKER:
+                # Worker ở process khác: upload song song cả lượt, xong hết mới tạo hồ sơ + xếp hàng
+                await asyncio.gather(*[store_scan(str(rid), image.data, image.ext) for _, rid, image, _ in accepted])
+                for record in records: record["image_stored"] = True
+            # 1 lệnh insert_many cho cả lượt + 1 lệnh insert_many cho các job
+            await medical_records_collection.insert_many(records)
+            if EMBEDDED_WORKER:
+                for _, rid, image, _ in accepted:
+                    submit_scan(str(rid), image.data, image.ext, image.sha256)
+            await analysis_queue.enqueue_many([(str(rid), url) for _, rid, _, url in accepted], image_ready=not EMBEDDED_WORKER)
+        except Exception as e: raise HTTPException(500, f"Lỗi server: {e}")
+        # Đánh thức cùng lúc => các slot nhận job đồng thời, bộ gom batch gộp chung lần predict
+        _wake_embedded_worker()
+        for index, rid, _, url in accepted:
+            results[index].update(status="QUEUED", record_id=str(rid), url=url)
+
+    if not accepted: raise HTTPException(400, {"message": "Không có ảnh hợp lệ", "results": results})
+    return {
+        "message": f"Đã nhận {len(accepted)}/{len(files)} ảnh",
+        "batch_id": batch_id,
+        "accepted": len(accepted),
+        "rejected": len(files) - len(accepted),
+        "results": results,
+    }
+
 @app.get("/api/medical-records")
-async def get_medical_records(current_user: dict = Depends(get_current_user)):
-    cursor = medical_records_collection.find({"user_id": current_user["id"]}).sort("upload_date", -1)
+async def get_medical_records(limit: Optional[int] = None, cursor: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    # Phân trang keyset (upload_date, _id) giảm dần; 'next_cursor' = None khi hết
+    try:
+        docs, next_cursor = await fetch_page(
+            medical_records_collection, {"user_id": current_user["id"]}, "upload_date", -1, limit, cursor,
+            projection={"upload_date": 1, "ai_result": 1, "ai_analysis_status": 1, "image_url": 1},
+        )
+    except InvalidCursor as e: raise HTTPException(status_code=400, detail=str(e))
     results = []
-    async for doc in cursor:
+    for doc in docs:
         results.append({
             "id": str(doc["_id"]),
             "date": doc["upload_date"].strftime("%d/%m/%Y"), 
@@ -246,7 +358,7 @@ async def get_medical_records(current_user: dict = Depends(get_current_user)):
             "status": "Hoàn thành" if doc["ai_analysis_status"] == "COMPLETED" else "Đang xử lý",
             "image_url": doc["image_url"]
         })
-    return {"history": results}
+    return {"history": results, "next_cursor": next_cursor}
 
 @app.get("/api/medical-records/{record_id}")
 async def get_single_record(record_id: str, current_user: dict = Depends(get_current_user)):
@@ -267,7 +379,9 @@ async def get_single_record(record_id: str, current_user: dict = Depends(get_cur
             "status": "Hoàn thành" if record["ai_analysis_status"] == "COMPLETED" else "Đang xử lý",
             "image_url": record["image_url"],
             "annotated_image_url": record.get("annotated_image_url"),
-            "doctor_note": record.get("doctor_note", "")
+            "doctor_note": record.get("doctor_note", ""),
+            "lesion_counts": record.get("lesion_counts", {}),
+            "lesions": record.get("lesions", [])
         }
     except Exception as e: # <--- BẮT LỖI TẠI ĐÂY
         print(f"Lỗi: {e}")
@@ -303,16 +417,17 @@ async def assign_doctor(data: AssignDoctorRequest, current_user: dict = Depends(
             {"$set": {"assigned_doctor_id": data.doctor_id}}
         )
         if result.modified_count == 0: raise HTTPException(status_code=404, detail="Không tìm thấy bệnh nhân.")
+        user_cache.invalidate_user_id(data.patient_id)
         return {"message": "Phân công bác sĩ thành công.", "doctor_name": doctor["userName"]}
     except HTTPException as http_err: raise http_err
     except Exception as e: raise HTTPException(status_code=400, detail="Lỗi server.")
 
 @app.post("/api/google-login")
 async def google_login(data: GoogleLoginRequest):
-    google_response = requests.get(f"https://www.googleapis.com/oauth2/v3/userinfo?access_token={data.token}")
-    if google_response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Token Google không hợp lệ")
-    google_user = google_response.json()
+    try:
+        google_user = await verify_google_token(data.token)
+    except SocialAuthError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     email = google_user.get('email')
     name = google_user.get('name', 'Google User')
     if not email: raise HTTPException(status_code=400, detail="Không lấy được email")
@@ -335,17 +450,11 @@ async def google_login(data: GoogleLoginRequest):
 
 @app.post("/api/facebook-login")
 async def facebook_login(data: FacebookLoginRequest):
-    # 1. Gọi sang Facebook để lấy thông tin người dùng từ token
-    fb_url = f"https://graph.facebook.com/me?fields=id,name,email,picture&access_token={data.accessToken}"
-    
+    # 1. Gọi sang Facebook để lấy thông tin người dùng từ token (có cache ngắn hạn)
     try:
-        fb_response = requests.get(fb_url)
-        fb_data = fb_response.json()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail="Không thể kết nối tới Facebook")
-
-    if "error" in fb_data:
-        raise HTTPException(status_code=400, detail="Token Facebook không hợp lệ hoặc đã hết hạn")
+        fb_data = await verify_facebook_token(data.accessToken)
+    except SocialAuthError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # 2. Lấy thông tin
     email = fb_data.get("email")
@@ -425,11 +534,11 @@ async def set_username(data: UpdateUsernameRequest, current_user: dict = Depends
             raise HTTPException(status_code=400, detail="Mật khẩu phải từ 6 ký tự trở lên")
         
         # Mã hóa mật khẩu
-        hashed_password = bcrypt.hashpw(data.new_password.encode('utf-8'), bcrypt.gensalt())
-        update_data["password"] = hashed_password.decode('utf-8')
+        update_data["password"] = await hash_password(data.new_password)
 
     # Thực hiện update vào DB
     await users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
+    user_cache.invalidate(current_user["userName"])
     
     # Tạo token mới với tên mới
     new_token_data = {"sub": new_username, "role": current_user["role"]}
@@ -455,33 +564,49 @@ async def update_user_profile(data: UserProfileUpdate, current_user: dict = Depe
             if existing: raise HTTPException(status_code=400, detail="SĐT đã dùng")
         update_data = {k: v for k, v in data.dict().items() if v is not None}
         await users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
+        user_cache.invalidate(current_user["userName"])
         return {"message": "Cập nhật hồ sơ thành công", "data": update_data}
     except HTTPException as e: raise e
     except Exception as e: raise HTTPException(status_code=500, detail="Lỗi server")
 
 @app.get("/api/doctor/my-patients")
-async def get_doctor_assigned_patients(current_user: dict = Depends(get_current_user)):
+async def get_doctor_assigned_patients(sort_by: str = "userName", order: str = "asc", ai_status: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "DOCTOR": raise HTTPException(status_code=403, detail="Quyền bị từ chối.")
-    doctor_id = current_user["id"]
-    patient_cursor = users_collection.find({"assigned_doctor_id": doctor_id}).sort("userName", 1)
-    patients_list = []
-    async for patient in patient_cursor:
-        patient_id = str(patient["_id"])
-        latest_record = await medical_records_collection.find_one({"user_id": patient_id}, sort=[("upload_date", -1)])
-        patients_list.append({
-            "id": patient_id, "userName": patient["userName"], "email": patient.get("email", "N/A"), "phone": patient.get("phone", "N/A"), "status": patient.get("status", "ACTIVE"),
-            "latest_scan": {"record_id": str(latest_record["_id"]) if latest_record else None, "date": latest_record["upload_date"].strftime("%d/%m/%Y") if latest_record else "Chưa có", "result": latest_record["ai_result"] if latest_record else "Chưa có dữ liệu", "ai_status": latest_record["ai_analysis_status"] if latest_record else "NA"}
-        })
+    try:
+        # 1 aggregation ($lookup lần quét mới nhất) thay cho 1 truy vấn medical_records mỗi bệnh nhân
+        patients_list = await list_doctor_patients(users_collection, current_user["id"], sort_by, -1 if order == "desc" else 1, ai_status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"patients": patients_list}
 
+@app.get("/api/admin/cache-stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "ADMIN": raise HTTPException(status_code=403, detail="Quyền bị từ chối.")
+    # Số liệu của process này (worker nhúng); tổng lượt hit dùng chung nằm ở trường 'hits' trong inference_cache
+    return {"result_cache": result_cache.snapshot(), "user_cache": user_cache.snapshot()}
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    # Prometheus scrape: không dùng JWT người dùng, chỉ token riêng (nếu cấu hình)
+    if not METRICS_ENABLED: raise HTTPException(status_code=404, detail="Metrics đang tắt.")
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Sai token metrics.")
+    return Response(content=await metrics_registry.render(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
 @app.get("/api/admin/users")
-async def get_all_users(current_user: dict = Depends(get_current_user)):
+async def get_all_users(limit: Optional[int] = None, cursor: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "ADMIN": raise HTTPException(status_code=403, detail="Quyền bị từ chối.")
-    user_cursor = users_collection.find() 
+    # Chỉ lấy trường cần trả về (không tải hash mật khẩu), phân trang theo _id
+    try:
+        users, next_cursor = await fetch_page(
+            users_collection, {}, None, 1, limit, cursor,
+            projection={"userName": 1, "email": 1, "role": 1, "status": 1, "assigned_doctor_id": 1},
+        )
+    except InvalidCursor as e: raise HTTPException(status_code=400, detail=str(e))
     users_list = []
-    async for user in user_cursor:
+    for user in users:
         users_list.append({"id": str(user["_id"]), "userName": user["userName"], "email": user.get("email", ""), "role": user.get("role", "USER"), "status": user.get("status", "ACTIVE"), "assigned_doctor_id": user.get("assigned_doctor_id", None)})
-    return {"users": users_list}
+    return {"users": users_list, "next_cursor": next_cursor}
 
 # --- CÁC API CHAT (CẬP NHẬT MỚI: ĐÃ FIX LỖI OBJECTID) ---
 
@@ -517,6 +642,8 @@ async def send_message(data: SendMessageRequest, current_user: dict = Depends(ge
         }
         
         await messages_collection.insert_one(new_message)
+        await record_message(conversations_collection, new_message)  # Cập nhật tóm tắt hội thoại (tin cuối, chưa đọc)
+        event_bus.publish(data.receiver_id, new_message_event(new_message))  # Đẩy ngay tới người nhận (SSE)
         print("✅ Đã lưu tin nhắn vào DB")
         return {"message": "Đã gửi tin nhắn"}
 
@@ -527,7 +654,7 @@ async def send_message(data: SendMessageRequest, current_user: dict = Depends(ge
         raise HTTPException(status_code=500, detail="Lỗi server nội bộ")
 
 @app.get("/api/chat/history/{other_user_id}")
-async def get_chat_history(other_user_id: str, current_user: dict = Depends(get_current_user)):
+async def get_chat_history(other_user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     user_id = current_user["id"]
     
     # Xử lý chat với hệ thống
@@ -543,16 +670,22 @@ async def get_chat_history(other_user_id: str, current_user: dict = Depends(get_
             ]
         }
 
-    # Lấy tin nhắn 2 chiều (Tôi gửi HỌ hoặc HỌ gửi TÔI)
-    cursor = messages_collection.find({
-        "$or": [
-            {"sender_id": user_id, "receiver_id": other_user_id},
-            {"sender_id": other_user_id, "receiver_id": user_id}
-        ]
-    }).sort("timestamp", 1) # Sắp xếp cũ nhất -> mới nhất
+    # Lấy tin nhắn 2 chiều (Tôi gửi HỌ hoặc HỌ gửi TÔI): trang mới nhất trước,
+    # 'next_cursor' dùng để tải tiếp các tin CŨ hơn
+    try:
+        docs, next_cursor = await fetch_page(
+            messages_collection,
+            {"$or": [
+                {"sender_id": user_id, "receiver_id": other_user_id},
+                {"sender_id": other_user_id, "receiver_id": user_id}
+            ]},
+            "timestamp", -1, limit, cursor,
+            projection={"sender_id": 1, "content": 1, "timestamp": 1},
+        )
+    except InvalidCursor as e: raise HTTPException(status_code=400, detail=str(e))
     
     messages = []
-    async for msg in cursor:
+    for msg in reversed(docs): # Sắp xếp cũ nhất -> mới nhất trong trang
         messages.append({
             "id": str(msg["_id"]),
             "sender_id": msg["sender_id"],
@@ -562,13 +695,17 @@ async def get_chat_history(other_user_id: str, current_user: dict = Depends(get_
             "is_me": msg["sender_id"] == user_id
         })
         
-    # Đánh dấu đã đọc các tin nhắn do người kia gửi cho mình
-    await messages_collection.update_many(
-        {"sender_id": other_user_id, "receiver_id": user_id, "is_read": False},
-        {"$set": {"is_read": True}}
-    )
+    # Đánh dấu đã đọc các tin nhắn do người kia gửi cho mình - CHỈ các tin trong trang vừa trả về
+    received_ids = [msg["_id"] for msg in docs if msg["sender_id"] == other_user_id]
+    if received_ids:
+        result = await messages_collection.update_many(
+            {"_id": {"$in": received_ids}, "receiver_id": user_id, "is_read": False},
+            {"$set": {"is_read": True}}
+        )
+        if result.modified_count:
+            await mark_read(conversations_collection, user_id, other_user_id, result.modified_count)
         
-    return {"messages": messages}
+    return {"messages": messages, "next_cursor": next_cursor}
 
 @app.get("/api/chats")
 async def get_chats(current_user: dict = Depends(get_current_user)):
@@ -576,28 +713,7 @@ async def get_chats(current_user: dict = Depends(get_current_user)):
     role = current_user["role"]
     chats = []
 
-    # Hàm phụ để lấy thông tin chat (tin cuối, số tin chưa đọc)
-    async def get_chat_info(partner_id, partner_name):
-        unread = await messages_collection.count_documents({
-            "sender_id": partner_id, "receiver_id": user_id, "is_read": False
-        })
-        last_msg = await messages_collection.find_one(
-            {"$or": [{"sender_id": user_id, "receiver_id": partner_id}, 
-                     {"sender_id": partner_id, "receiver_id": user_id}]},
-            sort=[("timestamp", -1)]
-        )
-        preview = last_msg["content"] if last_msg else "Bắt đầu cuộc trò chuyện..."
-        time_str = (last_msg["timestamp"] + timedelta(hours=7)).strftime("%H:%M") if last_msg else ""
-        
-        return {
-            "id": partner_id,
-            "sender": partner_name,
-            "preview": preview,
-            "time": time_str,
-            "unread": unread > 0,
-            "unread_count": unread
-        }
-
+    partners = []  # (partner_id, tên hiển thị, full_name)
 
     # 1. Nếu là Bệnh nhân -> Lấy Bác sĩ phụ trách
     if role == "USER":
@@ -616,24 +732,32 @@ async def get_chats(current_user: dict = Depends(get_current_user)):
                         # Nếu chưa cập nhật tên thật -> dùng tạm userName cũ
                         display_name = f"BS. {doctor['userName']}"
 
-                    # Gọi hàm lấy thông tin chat với tên hiển thị mới
-                    chat_info = await get_chat_info(str(doctor["_id"]), display_name)
-                    
                     # (Tùy chọn) Gửi kèm trường full_name gốc để Frontend dùng nếu cần logic riêng
-                    chat_info['full_name'] = doc_real_name if doc_real_name else ""
-                    
-                    chats.append(chat_info)
-                    # -------------------
+                    partners.append((str(doctor["_id"]), display_name, doc_real_name if doc_real_name else ""))
             except Exception as e: print(f"Lỗi lấy chat user: {e}")
 
     # 2. Nếu là Bác sĩ -> Lấy danh sách bệnh nhân
     elif role == "DOCTOR":
-        patients = users_collection.find({"assigned_doctor_id": user_id})
+        patients = users_collection.find({"assigned_doctor_id": user_id}, {"userName": 1, "full_name": 1})
         async for p in patients:
             display_name = p.get("full_name") or p.get("userName")
-            chat_info = await get_chat_info(str(p["_id"]), display_name)
-            chat_info["full_name"] = p.get("full_name", "")
-            chats.append(chat_info)
+            partners.append((str(p["_id"]), display_name, p.get("full_name", "")))
+
+    # Tin cuối + số tin chưa đọc của mọi cặp lấy trong 1 truy vấn (collection 'conversations')
+    summaries = await get_conversation_summaries(conversations_collection, user_id, [pid for pid, _, _ in partners])
+    for partner_id, display_name, full_name in partners:
+        conv = summaries.get(partner_id)
+        last_msg = conv.get("last_message") if conv else None
+        unread = conv.get("unread", {}).get(user_id, 0) if conv else 0
+        chats.append({
+            "id": partner_id,
+            "sender": display_name,
+            "preview": last_msg["content"] if last_msg else "Bắt đầu cuộc trò chuyện...",
+            "time": (last_msg["timestamp"] + timedelta(hours=7)).strftime("%H:%M") if last_msg else "",
+            "unread": unread > 0,
+            "unread_count": unread,
+            "full_name": full_name,
+        })
 
     # Chat Hệ thống (Đổi ID thành "system" chuẩn)
     chats.append({
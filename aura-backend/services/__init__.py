@@ -0,0 +1,6 @@
+# aura-backend/services/__init__.py
+# Các dịch vụ dùng chung cho server (HTTP client, thread pool...)
+from .http_client import get_http_client, close_http_client
+from .executors import run_cpu_bound, run_blocking_io, analysis_slot
+
+__all__ = ["get_http_client", "close_http_client", "run_cpu_bound", "run_blocking_io", "analysis_slot"]
@@ -0,0 +1,171 @@
+# aura-backend/services/analysis.py
+# Pipeline phân tích AI cho 1 hồ sơ. Dùng chung cho API (worker nhúng) và process worker riêng.
+import os
+import cv2
+import asyncio
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+
+from databases import db
+from .executors import run_cpu_bound, analysis_slot
+from .storage import storage, blob_handoff, original_key, overlay_key
+from .job_queue import AnalysisJobQueue
+from .result_cache import InferenceResultCache, content_hash
+from .events import event_bus, analysis_status_event
+
+load_dotenv()
+
+medical_records_collection = db.medical_records
+analysis_queue = AnalysisJobQueue(db.analysis_jobs)
+result_cache = InferenceResultCache(db.inference_cache)
+
+# Warm-up model ở luồng nền khi worker khởi động (0 = chỉ nạp khi có job đầu tiên)
+MODEL_WARMUP = os.getenv("AURA_MODEL_WARMUP", "1") == "1"
+
+def _import_inference():
+    import ai.inference  # noqa: F401  (nạp TensorFlow + gắn hook warm-up cho registry)
+
+def start_model_warmup():
+    """Nạp + chạy forward giả cho các module đang bật mà không chặn event loop"""
+    from ai.registry import model_registry
+    if MODEL_WARMUP:
+        model_registry.start_background_warmup(before=_import_inference)
+    return model_registry
+
+# --- TÁC VỤ PHÂN TÍCH (Đã gọi hàm từ module ai/inference.py) ---
+async def _complete_record(record_id, image_hash, result):
+    record = await medical_records_collection.find_one_and_update(
+        {"_id": ObjectId(record_id)},
+        {
+            "$set": {
+                "ai_analysis_status": "COMPLETED",
+                "ai_result": result["diagnosis"],
+                "doctor_note": result["risk_text"],
+                "annotated_image_url": result["overlay_url"],
+                # Bảng tổn thương theo từng ổ (ai/lesions.py) + số liệu pixel gốc
+                "lesion_counts": result["lesion_counts"],
+                "lesions": result["lesions"],
+                "findings": result["findings"],
+                "content_hash": image_hash
+            }
+        },
+        projection={"user_id": 1},
+    )
+    if record:
+        event_bus.publish(record["user_id"], analysis_status_event(dict(record, ai_analysis_status="COMPLETED", ai_result=result["diagnosis"])))
+
+async def real_ai_analysis(record_id: str, image_url: str):
+    """Chạy AI cho 1 hồ sơ và cập nhật DB. Ném lỗi ra ngoài để hàng đợi quyết định thử lại."""
+    print(f"🤖 AI AURA đang phân tích hồ sơ: {record_id}...")
+    # 1. Lấy ảnh: bytes API vừa nhận (cùng process) => không tải lại; nếu không thì đọc từ storage
+    image_bytes, image_hash = blob_handoff.pop(record_id)
+    if image_bytes is None:
+        image_bytes = await storage.get(image_url)
+
+    # 2. Ảnh đã từng phân tích với cùng bộ model => hoàn tất ngay từ cache
+    if image_hash is None:
+        image_hash = await run_cpu_bound(content_hash, image_bytes)
+    cached = await result_cache.get(image_hash)
+    if cached is not None:
+        await _complete_record(record_id, image_hash, cached)
+        print(f"⚡ Hồ sơ {record_id} hoàn tất từ cache.")
+        return
+
+    # Import muộn: process API chỉ xếp hàng (AURA_EMBEDDED_WORKER=0) không cần nạp TensorFlow
+    from ai.batching import inference_scheduler
+
+    # Giới hạn số phân tích đồng thời; mọi bước blocking đều chạy ngoài event loop
+    async with analysis_slot():
+        # 3. GỌI MODULE AI MỚI (qua bộ gom batch: các lượt quét đồng thời dùng chung 1 lần predict)
+        ai_output = await inference_scheduler.infer(image_bytes)
+
+        # 4. Upload overlay (encode trong CPU pool); chạy song song với upload ảnh gốc ở nền
+        is_success, buffer = await run_cpu_bound(cv2.imencode, ".png", ai_output["overlay"])
+    overlay_url = await storage.put(overlay_key(record_id), buffer.tobytes(), ext="png")
+
+    # 5. Update DB + lưu cache
+    result = {
+        "diagnosis": ai_output["diagnosis"],
+        "risk_text": ai_output["risk_text"],
+        "findings": ai_output["findings"],
+        "lesion_counts": ai_output["lesion_counts"],
+        "lesions": ai_output["lesions"],
+        "overlay_url": overlay_url,
+    }
+    await _complete_record(record_id, image_hash, result)
+    await result_cache.put(image_hash, result)
+    print(f"✅ Hồ sơ {record_id} hoàn tất.")
+
+# --- UPLOAD ẢNH GỐC Ở NỀN ---
+ORIGINAL_UPLOAD_RETRIES = 3
+_background_uploads = set()   # Giữ tham chiếu để task không bị GC giữa chừng
+
+async def _store_original(record_id, data, ext):
+    last_error = None
+    for attempt in range(1, ORIGINAL_UPLOAD_RETRIES + 1):
+        try:
+            await storage.put(original_key(record_id), data, ext=ext)
+            await medical_records_collection.update_one({"_id": ObjectId(record_id)}, {"$set": {"image_stored": True}})
+            await analysis_queue.mark_image_ready(record_id)   # Worker ở process khác giờ mới tải được ảnh
+            return
+        except Exception as e:
+            last_error = e
+            print(f"❌ Lỗi upload ảnh gốc {record_id} (lần {attempt}): {e}")
+            await asyncio.sleep(2 ** attempt)
+    # Hết lượt thử: ảnh gốc không có trên storage => lượt quét thất bại (không để job chờ mãi / tải URL 404)
+    blob_handoff.pop(record_id)
+    await medical_records_collection.update_one({"_id": ObjectId(record_id)}, {"$set": {"image_stored": False}})
+    if await analysis_queue.fail_unstored(record_id, f"Không lưu được ảnh gốc: {last_error}"):
+        await mark_record_failed(record_id)
+    else:
+        print(f"⚠️ Hồ sơ {record_id} đã phân tích xong nhưng ảnh gốc chưa lưu được lên storage.")
+
+def original_url(record_id, ext="jpg"):
+    """URL ảnh gốc tính trước khi upload (để lưu hồ sơ ngay)"""
+    return storage.url_for(original_key(record_id), ext)
+
+async def store_scan(record_id, data, ext="jpg"):
+    """
+    Không có worker nhúng: worker ở process khác sẽ tải ảnh từ storage => phải upload XONG trước khi
+    lưu hồ sơ + xếp hàng (không giữ bytes trong RAM của process API). Lỗi ném ra cho API.
+    """
+    return await storage.put(original_key(record_id), data, ext=ext)
+
+def submit_scan(record_id, data, ext="jpg", digest=None):
+    """
+    Có worker nhúng: giao bytes ảnh cho worker cùng process + upload ảnh gốc ở nền (gọi SAU khi đã lưu hồ sơ).
+    Job phải xếp hàng với image_ready=False: worker khác chỉ nhận sau khi upload xong (mark_image_ready).
+    """
+    blob_handoff.put(record_id, data, digest)
+    task = asyncio.create_task(_store_original(record_id, data, ext))
+    _background_uploads.add(task)
+    task.add_done_callback(_background_uploads.discard)
+
+async def mark_record_failed(record_id: str):
+    record = await medical_records_collection.find_one_and_update(
+        {"_id": ObjectId(record_id)},
+        {"$set": {"ai_analysis_status": "FAILED", "ai_result": "Lỗi phân tích"}},
+        projection={"user_id": 1},
+    )
+    if record:
+        event_bus.publish(record["user_id"], analysis_status_event(dict(record, ai_analysis_status="FAILED", ai_result="Lỗi phân tích")))
+
+async def enqueue_orphaned_records():
+    """Hồ sơ PENDING nhưng không có job (tạo trước khi có hàng đợi, hoặc process chết giữa chừng) => xếp hàng lại"""
+    pipeline = [
+        {"$match": {"ai_analysis_status": "PENDING"}},
+        {"$lookup": {
+            "from": "analysis_jobs",
+            "let": {"rid": {"$toString": "$_id"}},
+            "pipeline": [{"$match": {"$expr": {"$eq": ["$record_id", "$$rid"]}}}, {"$limit": 1}],
+            "as": "jobs",
+        }},
+        {"$match": {"jobs": {"$size": 0}}},
+        {"$project": {"image_url": 1}},
+    ]
+    count = 0
+    async for record in medical_records_collection.aggregate(pipeline):
+        await analysis_queue.enqueue(str(record["_id"]), record["image_url"])
+        count += 1
+    if count: print(f"🔁 Đã xếp hàng lại {count} hồ sơ PENDING bị bỏ sót.")
+    return count
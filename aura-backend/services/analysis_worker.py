@@ -0,0 +1,150 @@
+# aura-backend/services/analysis_worker.py
+# Worker rút job từ hàng đợi 'analysis_jobs' và chạy AI.
+# Chạy process riêng (scale ngang độc lập với API):  python -m services.analysis_worker --concurrency 8
+import os
+import json
+import signal
+import socket
+import asyncio
+import argparse
+
+from .analysis import analysis_queue, real_ai_analysis, mark_record_failed, enqueue_orphaned_records, start_model_warmup
+from .storage import blob_handoff
+from .executors import MAX_CONCURRENT_ANALYSES
+from .http_client import close_http_client
+from .job_queue import DEAD
+from .metrics import metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+POLL_INTERVAL_SECONDS = float(os.getenv("AURA_JOB_POLL_INTERVAL", 1.0))
+
+class AnalysisWorker:
+    def __init__(self, queue=analysis_queue, concurrency=MAX_CONCURRENT_ANALYSES, poll_interval=POLL_INTERVAL_SECONDS):
+        self.queue = queue
+        self.concurrency = max(1, int(concurrency))
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = asyncio.Event()
+        self._wake = asyncio.Event()
+
+    def stop(self):
+        self._stop.set()
+        self.notify()
+
+    def notify(self):
+        """Đánh thức ngay các slot đang rảnh (job mới vừa xếp hàng trong cùng process) thay vì chờ hết chu kỳ poll:
+        nhiều ảnh của cùng 1 lượt upload được nhận cùng lúc => bộ gom batch gộp chung 1 lần predict"""
+        self._wake.set()
+        self._wake.clear()
+
+    async def run(self):
+        print(f"👷 [Worker {self.worker_id}] Bắt đầu rút job (x{self.concurrency})...")
+        start_model_warmup()
+        await enqueue_orphaned_records()
+        # Mỗi slot nhận job độc lập => các job đồng thời sẽ được bộ gom batch gộp lại
+        slots = [asyncio.create_task(self._slot_loop()) for _ in range(self.concurrency)]
+        reaper = asyncio.create_task(self._reaper_loop())
+        await self._stop.wait()
+        for task in slots + [reaper]: task.cancel()
+        await asyncio.gather(*slots, reaper, return_exceptions=True)
+        print(f"🛑 [Worker {self.worker_id}] Đã dừng.")
+
+    async def _sleep_or_stop(self, seconds):
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _wait_for_work(self, seconds):
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _slot_loop(self):
+        while not self._stop.is_set():
+            try:
+                # Hồ sơ có bytes ảnh trong RAM của process này được nhận cả khi ảnh gốc chưa upload xong
+                job = await self.queue.claim(self.worker_id, blob_handoff.keys())
+            except Exception as e:
+                print(f"❌ [Worker] Lỗi nhận job: {e}")
+                job = None
+            if job is None:
+                await self._wait_for_work(self.poll_interval)
+                continue
+            await self._process(job)
+
+    async def _heartbeat_loop(self, job):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            if not await self.queue.heartbeat(job, self.worker_id): return
+
+    async def _process(self, job):
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job))
+        try:
+            await real_ai_analysis(job["record_id"], job["image_url"])
+            if not await self.queue.complete(job):
+                print(f"⚠️ [Worker] Mất quyền job {job['_id']} (hết hạn khóa) trước khi ghi DONE; lượt nhận khác quyết định")
+        except Exception as e:
+            print(f"❌ Lỗi AI (lần {job['attempts']}): {e}")
+            new_status = await self.queue.fail(job, e)
+            if new_status is None:
+                print(f"⚠️ [Worker] Mất quyền job {job['_id']} (hết hạn khóa), bỏ qua kết quả lỗi của lượt này")
+            elif new_status == DEAD:
+                await mark_record_failed(job["record_id"])
+        finally:
+            heartbeat.cancel()
+            try:
+                await heartbeat
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print(f"❌ [Worker] Lỗi gia hạn khóa job {job['_id']}, gia hạn đã dừng: {e}")
+
+    async def _reaper_loop(self):
+        while not self._stop.is_set():
+            try:
+                for job in await self.queue.dead_letter_expired() + await self.queue.dead_letter_unstored():
+                    await mark_record_failed(job["record_id"])
+            except Exception as e:
+                print(f"❌ [Worker] Lỗi dọn job quá hạn: {e}")
+            await self._sleep_or_stop(self.queue.visibility_timeout / 2)
+
+async def _serve_readiness(reader, writer):
+    """
+    HTTP tối giản cho probe của orchestrator: 200 khi model đã warm-up, 503 khi chưa.
+    GET /metrics: số liệu Prometheus của process worker (thời gian model, lệnh MongoDB).
+    """
+    from ai.registry import model_registry
+    request_line = (await reader.readline()).decode("latin-1").split()
+    path = request_line[1] if len(request_line) > 1 else "/"
+    if path == "/metrics":
+        body = (await metrics_registry.render()).encode()
+        status_line, content_type = "200 OK", METRICS_CONTENT_TYPE
+    else:
+        state = model_registry.status()
+        body = json.dumps(state).encode()
+        status_line = "200 OK" if state["ready"] else "503 Service Unavailable"
+        content_type = "application/json"
+    writer.write(f"HTTP/1.1 {status_line}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    writer.close()
+
+async def _main(concurrency, health_port):
+    worker = AnalysisWorker(concurrency=concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    server = await asyncio.start_server(_serve_readiness, "0.0.0.0", health_port) if health_port else None
+    try:
+        await worker.run()
+    finally:
+        if server: server.close()
+        await close_http_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AURA analysis worker")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_ANALYSES)
+    parser.add_argument("--health-port", type=int, default=int(os.getenv("AURA_WORKER_HEALTH_PORT", 0)),
+                        help="Cổng HTTP trả trạng thái sẵn sàng của model + /metrics (0 = tắt)")
+    args = parser.parse_args()
+    asyncio.run(_main(args.concurrency, args.health_port))
@@ -0,0 +1,88 @@
+# aura-backend/services/conversations.py
+# Tóm tắt hội thoại dựng sẵn (collection 'conversations'), 1 document cho mỗi cặp người dùng:
+#   _id = "<id nhỏ>:<id lớn>", participants, last_message {content, sender_id, timestamp}, unread {<user_id>: số tin chưa đọc}
+# Cập nhật nguyên tử khi gửi tin / khi đọc => danh sách chat chỉ cần 1 truy vấn theo _id, không phụ thuộc số bệnh nhân.
+from datetime import datetime
+
+PREVIEW_MAX_CHARS = 200
+
+def conversation_id(user_a, user_b):
+    return ":".join(sorted((user_a, user_b)))
+
+async def record_message(conversations_collection, message):
+    """Gọi sau khi lưu tin nhắn: cập nhật tin cuối + tăng unread của người nhận trong 1 lệnh (upsert)"""
+    sender, receiver = message["sender_id"], message["receiver_id"]
+    timestamp = message["timestamp"]
+    last_message = {
+        "content": {"$literal": message["content"][:PREVIEW_MAX_CHARS]},
+        "sender_id": {"$literal": sender},
+        "timestamp": {"$literal": timestamp},
+    }
+    # Update dạng pipeline: chỉ thay tin cuối nếu tin này mới hơn (2 request gửi đồng thời không làm lùi preview)
+    await conversations_collection.update_one(
+        {"_id": conversation_id(sender, receiver)},
+        [{"$set": {
+            "participants": {"$literal": sorted((sender, receiver))},
+            "last_message": {"$cond": [
+                {"$gte": [timestamp, {"$ifNull": ["$last_message.timestamp", datetime.min]}]},
+                last_message,
+                "$last_message",
+            ]},
+            f"unread.{receiver}": {"$add": [{"$ifNull": [f"$unread.{receiver}", 0]}, 1]},
+            f"unread.{sender}": {"$ifNull": [f"$unread.{sender}", 0]},
+            "updated_at": {"$max": ["$updated_at", timestamp]},
+        }}],
+        upsert=True,
+    )
+
+async def mark_read(conversations_collection, reader_id, other_id, count=None):
+    """count=None: đọc hết; count=N: vừa đọc N tin (VD: 1 trang lịch sử) => chỉ trừ N, không xuống dưới 0"""
+    if count is None:
+        update = {"$set": {f"unread.{reader_id}": 0}}
+    else:
+        update = [{"$set": {f"unread.{reader_id}": {"$max": [0, {"$subtract": [{"$ifNull": [f"$unread.{reader_id}", 0]}, count]}]}}}]
+    await conversations_collection.update_one({"_id": conversation_id(reader_id, other_id)}, update)
+
+async def get_summaries(conversations_collection, user_id, partner_ids):
+    """partner_id -> document hội thoại (1 truy vấn theo _id)"""
+    ids = {conversation_id(user_id, pid): pid for pid in partner_ids}
+    if not ids: return {}
+    summaries = {}
+    async for conv in conversations_collection.find({"_id": {"$in": list(ids)}}):
+        summaries[ids[conv["_id"]]] = conv
+    return summaries
+
+async def backfill_conversations(messages_collection, conversations_collection):
+    """Dựng lại toàn bộ 'conversations' từ 'messages' (chạy trên server MongoDB bằng $merge)"""
+    pair_id = {"$cond": [
+        {"$lt": ["$sender_id", "$receiver_id"]},
+        {"$concat": ["$sender_id", ":", "$receiver_id"]},
+        {"$concat": ["$receiver_id", ":", "$sender_id"]},
+    ]}
+    pipeline = [
+        {"$sort": {"timestamp": 1}},
+        # Theo (cặp, người nhận): số tin chưa đọc + tin cuối người đó nhận
+        {"$group": {
+            "_id": {"pair": pair_id, "receiver": "$receiver_id"},
+            "participants": {"$first": {"$sortArray": {"input": ["$sender_id", "$receiver_id"], "sortBy": 1}}},
+            "unread": {"$sum": {"$cond": [{"$eq": ["$is_read", False]}, 1, 0]}},
+            "last_message": {"$last": {"content": {"$substrCP": ["$content", 0, PREVIEW_MAX_CHARS]}, "sender_id": "$sender_id", "timestamp": "$timestamp"}},
+        }},
+        {"$sort": {"last_message.timestamp": 1}},
+        {"$group": {
+            "_id": "$_id.pair",
+            "participants": {"$first": "$participants"},
+            "last_message": {"$last": "$last_message"},
+            "unread_pairs": {"$push": {"k": "$_id.receiver", "v": "$unread"}},
+        }},
+        {"$project": {
+            "participants": 1,
+            "last_message": 1,
+            "unread": {"$arrayToObject": "$unread_pairs"},
+            "updated_at": "$last_message.timestamp",
+        }},
+        {"$merge": {"into": conversations_collection.name, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    async for _ in messages_collection.aggregate(pipeline):
+        pass
+    return await conversations_collection.count_documents({})
@@ -0,0 +1,119 @@
+# aura-backend/services/events.py
+# Đẩy sự kiện tới frontend (SSE /api/events) thay cho poll liên tục:
+#   - "analysis_status": hồ sơ phân tích xong (COMPLETED / FAILED)
+#   - "new_message": có tin nhắn mới
+# Pub/sub trong process: publish() giao thẳng cho các kết nối SSE của user trên process này.
+# Nhiều process (API scale ngang, worker AI riêng): bật AURA_EVENT_CHANGE_STREAMS=1 => mọi process API
+# đọc MongoDB change stream (cần replica set) và phát lại sự kiện; publish() cục bộ khi đó bị bỏ qua để không trùng.
+# docker-compose chạy worker AI riêng nên bật sẵn (mongo chạy replica set 1 node 'rs0').
+import os
+import json
+import asyncio
+from datetime import timedelta
+
+# --- CẤU HÌNH SỰ KIỆN ---
+CHANGE_STREAMS_ENABLED = os.getenv("AURA_EVENT_CHANGE_STREAMS", "0") == "1"
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("AURA_EVENT_QUEUE_SIZE", 100))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("AURA_SSE_HEARTBEAT", 15))
+
+class EventBus:
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = {}   # user_id -> set(asyncio.Queue)
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None: return
+        queues.discard(queue)
+        if not queues: del self._subscribers[user_id]
+
+    def deliver(self, user_id, event):
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()   # Client đọc chậm: bỏ sự kiện cũ nhất, giữ sự kiện mới
+            queue.put_nowait(event)
+
+    def publish(self, user_id, event):
+        """Gọi từ code nghiệp vụ; khi bật change stream thì sự kiện sẽ tới qua relay"""
+        if not CHANGE_STREAMS_ENABLED:
+            self.deliver(user_id, event)
+
+    def subscriber_count(self):
+        return sum(len(q) for q in self._subscribers.values())
+
+# Instance dùng chung
+event_bus = EventBus()
+
+def analysis_status_event(record):
+    return {
+        "type": "analysis_status",
+        "record_id": str(record["_id"]),
+        "status": record.get("ai_analysis_status"),
+        "result": record.get("ai_result"),
+    }
+
+def new_message_event(message):
+    return {
+        "type": "new_message",
+        "id": str(message["_id"]),
+        "sender_id": message["sender_id"],
+        "sender_name": message.get("sender_name"),
+        "content": message["content"],
+        "time": (message["timestamp"] + timedelta(hours=7)).strftime("%H:%M %d/%m"),
+    }
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+async def sse_stream(user_id, is_disconnected, bus=event_bus):
+    """Generator cho StreamingResponse: sự kiện của user + comment heartbeat giữ kết nối qua proxy"""
+    queue = bus.subscribe(user_id)
+    try:
+        yield ": connected\n\n"
+        while not await is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        bus.unsubscribe(user_id, queue)
+
+# --- RELAY TỪ MONGODB CHANGE STREAM (nhiều process) ---
+_CHANGE_PIPELINE = [{"$match": {"$or": [
+    {"ns.coll": "messages", "operationType": "insert"},
+    {"ns.coll": "medical_records", "operationType": "update",
+     "updateDescription.updatedFields.ai_analysis_status": {"$in": ["COMPLETED", "FAILED"]}},
+]}}]
+
+def _event_from_change(change):
+    doc = change.get("fullDocument")
+    if not doc: return None, None
+    if change["ns"]["coll"] == "messages":
+        return doc["receiver_id"], new_message_event(doc)
+    return doc.get("user_id"), analysis_status_event(doc)
+
+async def run_change_stream_relay(db, bus=event_bus):
+    """Chạy suốt vòng đời process API; tự nối lại (tiếp từ resume token) khi mất kết nối"""
+    resume_token, delay = None, 1
+    while True:
+        try:
+            async with db.watch(_CHANGE_PIPELINE, full_document="updateLookup", resume_after=resume_token) as stream:
+                print("📡 [Events] Đang nghe MongoDB change stream")
+                delay = 1
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    user_id, event = _event_from_change(change)
+                    if user_id: bus.deliver(user_id, event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ [Events] Change stream lỗi: {e} (thử lại sau {delay}s)")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
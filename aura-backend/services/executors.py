@@ -0,0 +1,44 @@
+# aura-backend/services/executors.py
+import os
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from ai.batching import BATCH_MAX_SIZE
+
+# --- CẤU HÌNH POOL & GIỚI HẠN ĐỒNG THỜI ---
+# CPU_WORKERS: số luồng cho tác vụ nặng CPU (encode ảnh...). OpenCV/NumPy nhả GIL nên thread là đủ.
+CPU_WORKERS = int(os.getenv("AURA_CPU_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# IO_WORKERS: số luồng cho SDK chỉ có API blocking (VD: cloudinary.uploader)
+IO_WORKERS = int(os.getenv("AURA_IO_WORKERS", 8))
+# Số lượt phân tích AI được chạy cùng lúc trên 1 worker (phần còn lại xếp hàng).
+# Mỗi lượt giữ slot trong lúc chờ bộ gom batch => phải >= BATCH_MAX_SIZE thì mới gom đủ 1 batch
+MAX_CONCURRENT_ANALYSES = int(os.getenv("AURA_MAX_CONCURRENT_ANALYSES", BATCH_MAX_SIZE))
+if MAX_CONCURRENT_ANALYSES < BATCH_MAX_SIZE:
+    print(f"⚠️ AURA_MAX_CONCURRENT_ANALYSES={MAX_CONCURRENT_ANALYSES} < AURA_BATCH_MAX_SIZE={BATCH_MAX_SIZE}: "
+          f"batch không bao giờ vượt {MAX_CONCURRENT_ANALYSES} ảnh")
+
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="aura-cpu")
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="aura-io")
+
+_analysis_semaphore = None
+
+async def run_cpu_bound(fn, *args, **kwargs):
+    """Chạy hàm nặng CPU trong pool giới hạn, trả quyền cho event loop trong lúc chờ"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, functools.partial(fn, *args, **kwargs))
+
+async def run_blocking_io(fn, *args, **kwargs):
+    """Chạy lời gọi mạng blocking (SDK bên thứ 3) ngoài event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(fn, *args, **kwargs))
+
+@asynccontextmanager
+async def analysis_slot():
+    """Giới hạn số phân tích AI chạy đồng thời để login/chat không bị ảnh hưởng"""
+    global _analysis_semaphore
+    if _analysis_semaphore is None:
+        _analysis_semaphore = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+    async with _analysis_semaphore:
+        yield
@@ -0,0 +1,34 @@
+# aura-backend/services/http_client.py
+import os
+import httpx
+
+# --- CẤU HÌNH HTTP CLIENT DÙNG CHUNG ---
+HTTP_TIMEOUT_SECONDS = float(os.getenv("AURA_HTTP_TIMEOUT", 20))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("AURA_HTTP_CONNECT_TIMEOUT", 5))
+# Pool kết nối: giữ kết nối TLS sống để các lần gọi sau (Google, Facebook, Cloudinary) không bắt tay lại
+HTTP_MAX_CONNECTIONS = int(os.getenv("AURA_HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv("AURA_HTTP_MAX_KEEPALIVE", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("AURA_HTTP_KEEPALIVE_EXPIRY", 30))
+
+_client = None
+
+def get_http_client():
+    """Trả về AsyncClient dùng chung (tạo lần đầu khi cần) để không chặn event loop"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            follow_redirects=True,
+        )
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
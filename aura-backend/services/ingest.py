@@ -0,0 +1,136 @@
+# aura-backend/services/ingest.py
+# Nhận ảnh upload theo từng khối: giới hạn dung lượng, nhận dạng định dạng + kích thước từ header
+# (không giải mã), kiểm tra file bị cắt cụt và tính sha256 ngay khi đọc.
+# Ảnh hỏng / quá lớn bị từ chối ngay tại API, trước khi tốn chi phí storage hay inference.
+import os
+import hashlib
+
+from ai.image_io import read_image_header
+
+# --- CẤU HÌNH NHẬN ẢNH ---
+UPLOAD_MAX_MB = float(os.getenv("AURA_UPLOAD_MAX_MB", 25))
+UPLOAD_MIN_SIDE = int(os.getenv("AURA_UPLOAD_MIN_SIDE", 224))          # Nhỏ hơn input classifier thì vô nghĩa
+UPLOAD_MAX_PIXELS = int(os.getenv("AURA_UPLOAD_MAX_PIXELS", 80_000_000)) # Chặn "bom giải nén" (header khai kích thước khổng lồ)
+CHUNK_SIZE = 1024 * 1024
+# Marker SOF của JPEG có thể nằm sau khối EXIF / ICC lớn; quá ngưỡng này vẫn chưa thấy => coi là hỏng
+HEADER_SCAN_LIMIT = 512 * 1024
+
+MAX_UPLOAD_BYTES = int(UPLOAD_MAX_MB * 1024 * 1024)
+
+class RejectedUpload(Exception):
+    """Ảnh bị từ chối khi nhận (API trả status_code kèm message)"""
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class IngestedImage:
+    def __init__(self, data, fmt, width, height, sha256):
+        self.data = data
+        self.fmt = fmt
+        self.width = width
+        self.height = height
+        self.sha256 = sha256
+
+    @property
+    def ext(self):
+        return "png" if self.fmt == "png" else "jpg"
+
+def _looks_complete(fmt, data):
+    """File bị cắt cụt (upload đứt giữa chừng) thường thiếu marker kết thúc"""
+    if fmt == "jpeg":
+        return b"\xff\xd9" in data[-4096:]   # EOI, cho phép vài byte đệm phía sau
+    return b"IEND" in data[-32:]
+
+def _check_header(header, buffered):
+    if header is None:
+        if len(buffered) >= 8 and not (buffered.startswith(b"\xff\xd8") or buffered.startswith(b"\x89PNG")):
+            raise RejectedUpload("Chỉ nhận ảnh JPEG hoặc PNG", 415)
+        return None
+    fmt, width, height = header
+    if width == 0 or height == 0:
+        raise RejectedUpload("Ảnh hỏng (kích thước 0)")
+    if min(width, height) < UPLOAD_MIN_SIDE:
+        raise RejectedUpload(f"Ảnh quá nhỏ ({width}x{height}), cần cạnh >= {UPLOAD_MIN_SIDE}px")
+    if width * height > UPLOAD_MAX_PIXELS:
+        raise RejectedUpload(f"Ảnh quá lớn ({width}x{height})", 413)
+    return header
+
+async def ingest_upload(file, max_bytes=MAX_UPLOAD_BYTES):
+    """Đọc UploadFile theo khối; ném RejectedUpload ngay khi phát hiện lỗi (không đọc hết phần còn lại)"""
+    digest = hashlib.sha256()
+    chunks, size, header = [], 0, None
+    buffered = b""   # Phần đầu file, chỉ giữ tới khi đọc được header
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk: break
+        size += len(chunk)
+        if size > max_bytes:
+            raise RejectedUpload(f"Ảnh vượt quá {max_bytes / 2**20:g} MB", 413)
+        digest.update(chunk)
+        chunks.append(chunk)
+        if header is None:
+            buffered += chunk
+            header = _check_header(read_image_header(buffered), buffered)
+            if header is None and len(buffered) >= HEADER_SCAN_LIMIT:
+                raise RejectedUpload("Không đọc được header ảnh (file hỏng hoặc không phải ảnh)")
+            if header is not None: buffered = b""
+    if size == 0:
+        raise RejectedUpload("File rỗng")
+    if header is None:
+        raise RejectedUpload("Không đọc được header ảnh (file hỏng hoặc không phải ảnh)")
+    data = b"".join(chunks)
+    if not _looks_complete(header[0], data):
+        raise RejectedUpload("Ảnh bị cắt cụt (upload chưa hoàn tất)")
+    return IngestedImage(data, header[0], header[1], header[2], digest.hexdigest())
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware: chặn body upload vượt giới hạn TRƯỚC khi FastAPI parse multipart ra file tạm.
+    Kiểm tra Content-Length nếu có, và đếm byte thực nhận (trường hợp chunked / khai man).
+    Vượt giới hạn giữa chừng: middleware tự trả 413, báo app "client ngắt kết nối" để app ngừng đọc
+    và bỏ qua response / lỗi của app (nếu không, lỗi khi parse form bị FastAPI đổi thành 400).
+    limits: {path: số byte tối đa}
+    """
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        declared = dict(scope.get("headers") or []).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            return await _send_413(send, limit)
+
+        received = 0
+        rejected = False
+        response_started = False
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected: return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    if not response_started: await _send_413(send, limit)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected: return   # Đã trả 413 => bỏ response của app
+            if message["type"] == "http.response.start": response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected: raise   # App lỗi vì body bị cắt ngang: 413 đã gửi, không phải lỗi thật
+
+async def _send_413(send, limit):
+    body = f'{{"detail": "Request vượt quá {limit / 2**20:g} MB"}}'.encode("utf-8")
+    await send({"type": "http.response.start", "status": 413,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
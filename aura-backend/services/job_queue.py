@@ -0,0 +1,196 @@
+# aura-backend/services/job_queue.py
+import os
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+
+# --- CẤU HÌNH HÀNG ĐỢI PHÂN TÍCH ---
+# Job bị "giữ" quá thời gian này mà không gia hạn => coi như worker đã chết, job được nhận lại
+VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("AURA_JOB_VISIBILITY_TIMEOUT", 300))
+MAX_ATTEMPTS = int(os.getenv("AURA_JOB_MAX_ATTEMPTS", 5))
+RETRY_BASE_SECONDS = float(os.getenv("AURA_JOB_RETRY_BASE", 10))
+RETRY_MAX_SECONDS = float(os.getenv("AURA_JOB_RETRY_MAX", 600))
+# Job chờ ảnh gốc upload xong (image_ready=False) quá thời gian này => process API đã chết giữa chừng, ảnh mất
+IMAGE_WAIT_TIMEOUT_SECONDS = int(os.getenv("AURA_JOB_IMAGE_WAIT_TIMEOUT", 900))
+
+# Trạng thái job
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+DONE = "DONE"
+DEAD = "DEAD"   # Dead-letter: hết số lần thử, cần người xem xét
+
+class AnalysisJobQueue:
+    """
+    Hàng đợi bền vững trên collection MongoDB 'analysis_jobs'.
+    Nhận job bằng find_one_and_update (nguyên tử) nên nhiều process worker có thể cùng đọc.
+    """
+    def __init__(self, collection, visibility_timeout=VISIBILITY_TIMEOUT_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.collection = collection
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+
+    def _new_job(self, record_id, image_url, now, image_ready=True):
+        return {
+            "record_id": record_id,
+            "image_url": image_url,
+            # False: ảnh gốc đang upload ở nền => chỉ worker cùng process (giữ bytes trong RAM) được nhận
+            "image_ready": image_ready,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "available_at": now,
+            "locked_until": None,
+            "worker_id": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    async def enqueue(self, record_id, image_url, image_ready=True):
+        result = await self.collection.insert_one(self._new_job(record_id, image_url, datetime.utcnow(), image_ready))
+        return str(result.inserted_id)
+
+    async def enqueue_many(self, items, image_ready=True):
+        """items: [(record_id, image_url)] => 1 lệnh insert_many; các job cùng lúc sẵn sàng nên được gom chung batch model"""
+        if not items: return []
+        now = datetime.utcnow()
+        result = await self.collection.insert_many([self._new_job(rid, url, now, image_ready) for rid, url in items])
+        return [str(i) for i in result.inserted_ids]
+
+    def claim_filter(self, now, local_record_ids=()):
+        """
+        Job nhận được: sẵn sàng (hoặc RUNNING quá hạn khóa), còn lượt thử, và ảnh gốc đã nằm trên storage
+        - trừ các hồ sơ mà worker này đang giữ bytes ảnh trong RAM (local_record_ids).
+        """
+        image_condition = {"image_ready": {"$ne": False}}
+        if local_record_ids:
+            image_condition = {"$or": [image_condition, {"record_id": {"$in": list(local_record_ids)}}]}
+        return {
+            "$and": [
+                {"$or": [
+                    {"status": QUEUED, "available_at": {"$lte": now}},
+                    {"status": RUNNING, "locked_until": {"$lt": now}},
+                ]},
+                image_condition,
+            ],
+            "attempts": {"$lt": self.max_attempts},
+        }
+
+    async def claim(self, worker_id, local_record_ids=()):
+        """Nhận 1 job sẵn sàng (hoặc job RUNNING đã quá hạn khóa). Trả về None nếu hết việc."""
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            self.claim_filter(now, local_record_ids),
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker_id": worker_id,
+                    "locked_until": now + timedelta(seconds=self.visibility_timeout),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def _owned(job):
+        """
+        Điều kiện 'job vẫn thuộc lượt nhận này': attempts tăng mỗi lần claim nên (worker_id, attempts) phân biệt
+        cả trường hợp slot khác của CÙNG worker nhận lại job sau khi hết hạn khóa
+        """
+        return {"_id": job["_id"], "status": RUNNING, "worker_id": job["worker_id"], "attempts": job["attempts"]}
+
+    async def heartbeat(self, job, worker_id):
+        """Gia hạn khóa cho job đang chạy lâu; trả về False nếu job đã bị worker khác nhận lại"""
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            dict(self._owned(job), worker_id=worker_id),
+            {"$set": {"locked_until": now + timedelta(seconds=self.visibility_timeout), "updated_at": now}},
+        )
+        return result.matched_count == 1
+
+    async def complete(self, job):
+        """Trả về False nếu đã mất quyền sở hữu job (hết hạn khóa, worker khác nhận lại / reaper chuyển DEAD)"""
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            self._owned(job),
+            {"$set": {"status": DONE, "locked_until": None, "finished_at": now, "updated_at": now}},
+        )
+        return result.matched_count == 1
+
+    async def fail(self, job, error):
+        """
+        Lỗi: thử lại với backoff lũy thừa, hoặc chuyển sang DEAD nếu hết lượt. Trả về trạng thái mới,
+        None nếu đã mất quyền sở hữu job (không ghi đè trạng thái do lượt nhận mới / reaper đặt).
+        """
+        now = datetime.utcnow()
+        if job["attempts"] >= job.get("max_attempts", self.max_attempts):
+            new_status, update = DEAD, {"finished_at": now}
+        else:
+            delay = min(RETRY_BASE_SECONDS * (2 ** (job["attempts"] - 1)), RETRY_MAX_SECONDS)
+            new_status, update = QUEUED, {"available_at": now + timedelta(seconds=delay)}
+        update.update({"status": new_status, "locked_until": None, "last_error": str(error)[:500], "updated_at": now})
+        result = await self.collection.update_one(self._owned(job), {"$set": update})
+        return new_status if result.matched_count == 1 else None
+
+    async def mark_image_ready(self, record_id):
+        """Ảnh gốc đã upload xong => worker ở process khác cũng nhận được job"""
+        now = datetime.utcnow()
+        await self.collection.update_many(
+            {"record_id": record_id, "image_ready": False},
+            {"$set": {"image_ready": True, "updated_at": now}},
+        )
+
+    async def fail_unstored(self, record_id, error):
+        """Không lưu được ảnh gốc => job chưa xong chuyển DEAD. Trả về True nếu có job bị dừng."""
+        now = datetime.utcnow()
+        result = await self.collection.update_many(
+            {"record_id": record_id, "status": {"$in": [QUEUED, RUNNING]}},
+            {"$set": {"status": DEAD, "locked_until": None, "last_error": str(error)[:500], "finished_at": now, "updated_at": now}},
+        )
+        return result.modified_count > 0
+
+    async def dead_letter_unstored(self, timeout=IMAGE_WAIT_TIMEOUT_SECONDS):
+        """Job chờ ảnh gốc quá lâu (process API chết trước khi upload xong, bytes đã mất) => DEAD"""
+        now = datetime.utcnow()
+        expired = []
+        cursor = self.collection.find({
+            "status": QUEUED,
+            "image_ready": False,
+            "created_at": {"$lt": now - timedelta(seconds=timeout)},
+        })
+        async for job in cursor:
+            result = await self.collection.update_one(
+                {"_id": job["_id"], "status": QUEUED, "image_ready": False},
+                {"$set": {"status": DEAD, "last_error": "Không lưu được ảnh gốc (process API dừng giữa chừng)", "finished_at": now, "updated_at": now}},
+            )
+            if result.modified_count: expired.append(job)
+        return expired
+
+    async def dead_letter_expired(self):
+        """Job RUNNING quá hạn khóa nhưng đã hết lượt thử (worker chết ở lần cuối) => DEAD"""
+        now = datetime.utcnow()
+        expired = []
+        cursor = self.collection.find({
+            "status": RUNNING,
+            "locked_until": {"$lt": now},
+            "attempts": {"$gte": self.max_attempts},
+        })
+        async for job in cursor:
+            result = await self.collection.update_one(
+                {"_id": job["_id"], "status": RUNNING, "locked_until": job["locked_until"]},
+                {"$set": {"status": DEAD, "last_error": "Hết thời gian xử lý (worker mất kết nối)", "finished_at": now, "updated_at": now}},
+            )
+            if result.modified_count: expired.append(job)
+        return expired
+
+    async def stats(self):
+        """Số job theo trạng thái + tuổi job QUEUED lâu nhất (giây). Gọi mỗi lần scrape /metrics."""
+        # Đếm từng trạng thái: mỗi lệnh chỉ quét index (status, ...), không $group cả collection
+        counts = {}
+        for state in (QUEUED, RUNNING, DONE, DEAD):
+            counts[state] = await self.collection.count_documents({"status": state})
+        oldest = await self.collection.find_one({"status": QUEUED}, sort=[("created_at", 1)])
+        oldest_age = (datetime.utcnow() - oldest["created_at"]).total_seconds() if oldest else 0.0
+        return {"counts": counts, "oldest_queued_age_seconds": oldest_age}
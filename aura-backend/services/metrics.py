@@ -0,0 +1,144 @@
+# aura-backend/services/metrics.py
+# Số liệu vận hành dạng Prometheus (prometheus_client, GET /metrics):
+#   - HTTP: histogram độ trễ + số request đang xử lý theo route (middleware, nhãn là route mẫu, không phải URL thật)
+#   - Hàng đợi phân tích: số job theo trạng thái + tuổi job QUEUED lâu nhất (đọc lúc scrape)
+#   - AI: thời gian từng model / từng bước pipeline (listener của ai/timing.py)
+#   - MongoDB: độ trễ từng lệnh theo collection (listener của databases/command_timing.py)
+# => phân biệt được dashboard chậm do DB hay do inference. Số liệu theo từng process (API, worker riêng).
+import os
+import time
+from starlette.routing import Match
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST, disable_created_metrics
+
+from ai.timing import add_timing_listener
+from databases.command_timing import add_command_listener
+
+# --- CẤU HÌNH METRICS ---
+METRICS_ENABLED = os.getenv("AURA_METRICS", "1") == "1"
+# Đặt token => /metrics yêu cầu header "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("AURA_METRICS_TOKEN", "")
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+INFERENCE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+# Bỏ chuỗi *_created (thời điểm tạo từng nhãn): gấp đôi số dòng mỗi lần scrape mà dashboard không dùng
+disable_created_metrics()
+
+class MetricsRegistry:
+    """CollectorRegistry của prometheus_client + các collector async chạy ngay trước mỗi lần scrape"""
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return Counter(name, documentation, labelnames, registry=self.registry)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return Gauge(name, documentation, labelnames, registry=self.registry)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=HTTP_BUCKETS):
+        return Histogram(name, documentation, labelnames, buckets=buckets, registry=self.registry)
+
+    def add_collector(self, fn):
+        """fn: coroutine cập nhật gauge ngay trước mỗi lần scrape (số liệu phải truy vấn mới có)"""
+        self._collectors.append(fn)
+
+    async def render(self):
+        for collect in self._collectors:
+            try:
+                await collect()
+            except Exception as e:
+                print(f"⚠️ Lỗi thu thập metrics: {e}")
+        return generate_latest(self.registry).decode("utf-8")
+
+# Registry dùng chung của process
+metrics_registry = MetricsRegistry()
+
+http_requests_total = metrics_registry.counter(
+    "aura_http_requests_total", "Số HTTP request đã xử lý", ("method", "route", "status"))
+http_request_duration = metrics_registry.histogram(
+    "aura_http_request_duration_seconds", "Độ trễ HTTP request theo route", ("method", "route"), HTTP_BUCKETS)
+http_requests_in_flight = metrics_registry.gauge(
+    "aura_http_requests_in_flight", "Số HTTP request đang xử lý", ("method", "route"))
+
+analysis_queue_jobs = metrics_registry.gauge(
+    "aura_analysis_queue_jobs", "Số job phân tích theo trạng thái", ("status",))
+analysis_queue_oldest_age = metrics_registry.gauge(
+    "aura_analysis_queue_oldest_queued_age_seconds", "Tuổi job QUEUED lâu nhất")
+
+inference_model_duration = metrics_registry.histogram(
+    "aura_inference_model_duration_seconds", "Thời gian 1 lần gọi model (cả batch)", ("model",), INFERENCE_BUCKETS)
+inference_stage_duration = metrics_registry.histogram(
+    "aura_inference_stage_duration_seconds", "Thời gian từng bước pipeline AI", ("stage",), INFERENCE_BUCKETS)
+
+mongo_command_duration = metrics_registry.histogram(
+    "aura_mongo_command_duration_seconds", "Độ trễ lệnh MongoDB", ("collection", "command"), MONGO_BUCKETS)
+mongo_command_failures = metrics_registry.counter(
+    "aura_mongo_command_failures_total", "Số lệnh MongoDB lỗi", ("collection", "command"))
+
+# --- HTTP ---
+UNMATCHED_ROUTE = "<unmatched>"
+
+def _route_template(scope):
+    """Route mẫu (vd /api/medical-records/{record_id}) => số nhãn hữu hạn dù URL chứa id"""
+    partial = None
+    for route in getattr(scope.get("app"), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL: return route.path
+        if match == Match.PARTIAL and partial is None: partial = route.path   # Sai method => 405
+    return partial or UNMATCHED_ROUTE
+
+class MetricsMiddleware:
+    """Middleware ASGI: đo từ lúc nhận request tới khi gửi xong response (SSE: tới khi đóng stream)"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, route = scope["method"], _route_template(scope)
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start": status["code"] = message["status"]
+            await send(message)
+
+        in_flight = http_requests_in_flight.labels(method=method, route=route)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            http_request_duration.labels(method=method, route=route).observe(time.perf_counter() - start)
+            http_requests_total.labels(method=method, route=route, status=status["code"]).inc()
+
+# --- HÀNG ĐỢI PHÂN TÍCH ---
+def register_queue_metrics(queue):
+    async def collect():
+        stats = await queue.stats()
+        for state, count in stats["counts"].items():
+            analysis_queue_jobs.labels(status=state).set(count)
+        analysis_queue_oldest_age.set(stats["oldest_queued_age_seconds"])
+    metrics_registry.add_collector(collect)
+
+# --- AI ---
+def _observe_inference(kind, name, seconds):
+    if kind == "model":
+        inference_model_duration.labels(model=name).observe(seconds)
+    else:
+        inference_stage_duration.labels(stage=name).observe(seconds)
+
+if METRICS_ENABLED:
+    add_timing_listener(_observe_inference)
+
+# --- MONGODB ---
+def _observe_mongo_command(collection, command, seconds, failed):
+    labels = {"collection": collection, "command": command}
+    mongo_command_duration.labels(**labels).observe(seconds)
+    if failed: mongo_command_failures.labels(**labels).inc()
+
+if METRICS_ENABLED:
+    add_command_listener(_observe_mongo_command)
@@ -0,0 +1,67 @@
+# aura-backend/services/pagination.py
+# Phân trang keyset (theo trường sắp xếp + _id) với continuation token mờ (base64 JSON).
+# Khác skip/limit: trang sau chỉ đọc đúng số document cần, kể cả khi danh sách rất dài.
+import os
+import json
+import base64
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+# --- CẤU HÌNH PHÂN TRANG ---
+DEFAULT_PAGE_SIZE = int(os.getenv("AURA_PAGE_SIZE_DEFAULT", 50))
+MAX_PAGE_SIZE = int(os.getenv("AURA_PAGE_SIZE_MAX", 200))
+
+class InvalidCursor(ValueError):
+    """Token phân trang hỏng / không khớp endpoint (API trả 400)"""
+
+def clamp_page_size(limit):
+    if limit is None: return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+def encode_cursor(doc, sort_field=None):
+    """Token trỏ tới document cuối của trang hiện tại"""
+    payload = {"id": str(doc["_id"])}
+    if sort_field:
+        value = doc[sort_field]
+        payload["v"] = value.isoformat() if isinstance(value, datetime) else value
+        payload["dt"] = isinstance(value, datetime)
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(token, sort_field=None):
+    """Trả về (giá trị trường sắp xếp, ObjectId)"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        last_id = ObjectId(payload["id"])
+        if not sort_field: return None, last_id
+        value = payload["v"]
+        if payload.get("dt"): value = datetime.fromisoformat(value)
+        return value, last_id
+    except Exception:
+        raise InvalidCursor("Token phân trang không hợp lệ")
+
+def keyset_filter(sort_field, direction, value, last_id):
+    """Điều kiện 'sau document cuối' theo thứ tự (sort_field, _id) cùng chiều direction"""
+    op = "$lt" if direction < 0 else "$gt"
+    if not sort_field:
+        return {"_id": {op: last_id}}
+    return {"$or": [{sort_field: {op: value}}, {sort_field: value, "_id": {op: last_id}}]}
+
+async def fetch_page(collection, query, sort_field=None, direction=-1, limit=None, cursor=None, projection=None):
+    """
+    Trả về (docs, next_cursor). next_cursor = None khi đã hết dữ liệu.
+    sort_field=None => chỉ phân trang theo _id.
+    Luôn giới hạn số document (không có limit => DEFAULT_PAGE_SIZE): client đi theo next_cursor để tải tiếp.
+    """
+    sort = [(sort_field, direction), ("_id", direction)] if sort_field else [("_id", direction)]
+    limit = clamp_page_size(limit)
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_field)
+        query = {"$and": [query, keyset_filter(sort_field, direction, value, last_id)]}
+    # Lấy dư 1 document để biết còn trang sau hay không
+    docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
@@ -0,0 +1,66 @@
+# aura-backend/services/passwords.py
+# Băm / kiểm tra mật khẩu bcrypt trong pool luồng riêng (bcrypt nhả GIL khi băm):
+# mỗi lần băm tốn ~100-300ms CPU, chạy thẳng trong handler async sẽ đóng băng event loop.
+# Giới hạn số yêu cầu đang chờ: đợt login dồn dập bị từ chối sớm (503) thay vì xếp hàng vô hạn.
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# --- CẤU HÌNH BCRYPT ---
+BCRYPT_ROUNDS = int(os.getenv("AURA_BCRYPT_ROUNDS", 12))   # Cost factor cho mật khẩu MỚI (hash cũ vẫn kiểm tra được)
+PASSWORD_WORKERS = int(os.getenv("AURA_PASSWORD_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Tối đa số yêu cầu (đang chạy + đang chờ) trong pool
+PASSWORD_QUEUE_LIMIT = int(os.getenv("AURA_PASSWORD_QUEUE_LIMIT", 64))
+
+class PasswordPoolBusy(Exception):
+    """Pool băm mật khẩu đã đầy hàng đợi (API trả 503 + Retry-After)"""
+
+class PasswordHasher:
+    def __init__(self, workers=PASSWORD_WORKERS, queue_limit=PASSWORD_QUEUE_LIMIT, rounds=BCRYPT_ROUNDS):
+        self.rounds = rounds
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aura-bcrypt")
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def _submit(self, fn, *args):
+        # Chỉ chạy trên event loop (1 luồng) => đếm không cần khóa
+        if self.in_flight >= self.queue_limit:
+            self.rejected += 1
+            raise PasswordPoolBusy("Hệ thống đang bận, vui lòng thử lại")
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    def _hash(self, password):
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=self.rounds)).decode("utf-8")
+
+    @staticmethod
+    def _verify(password, hashed):
+        try:
+            return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+        except ValueError:
+            return False   # Hash rỗng / hỏng (VD: tài khoản Google/Facebook không có mật khẩu)
+
+    async def hash(self, password):
+        return await self._submit(self._hash, password)
+
+    async def verify(self, password, hashed):
+        if not hashed: return False
+        return await self._submit(self._verify, password, hashed)
+
+    def snapshot(self):
+        return {"rounds": self.rounds, "in_flight": self.in_flight, "queue_limit": self.queue_limit, "rejected": self.rejected}
+
+# Instance dùng chung
+password_hasher = PasswordHasher()
+
+async def hash_password(password):
+    return await password_hasher.hash(password)
+
+async def verify_password(password, hashed):
+    return await password_hasher.verify(password, hashed)
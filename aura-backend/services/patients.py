@@ -0,0 +1,61 @@
+# aura-backend/services/patients.py
+# Danh sách bệnh nhân của bác sĩ bằng 1 aggregation duy nhất (thay cho N+1 find_one mỗi bệnh nhân):
+# $lookup sang medical_records với sub-pipeline sort + limit 1 để lấy lần quét mới nhất.
+# Cần index medical_records(user_id, upload_date, _id) để mỗi lookup chỉ đọc 1 entry index.
+
+# Trường sắp xếp cho phép (tham số API -> trường trong pipeline)
+DOCTOR_PATIENT_SORTS = {
+    "userName": "userName",
+    "latest_scan": "latest_scan.upload_date",
+    "ai_status": "latest_scan.ai_analysis_status",
+}
+# "NA" = bệnh nhân chưa có lần quét nào
+AI_STATUS_FILTERS = {"PENDING", "COMPLETED", "FAILED", "NA"}
+
+def doctor_patients_pipeline(doctor_id, sort_by="userName", order=1, ai_status=None):
+    if sort_by not in DOCTOR_PATIENT_SORTS:
+        raise ValueError(f"Không hỗ trợ sắp xếp theo: {sort_by}")
+    if ai_status is not None and ai_status not in AI_STATUS_FILTERS:
+        raise ValueError(f"Trạng thái AI không hợp lệ: {ai_status}")
+
+    pipeline = [
+        {"$match": {"assigned_doctor_id": doctor_id}},
+        {"$project": {"userName": 1, "email": 1, "phone": 1, "status": 1, "patient_id": {"$toString": "$_id"}}},
+        # medical_records.user_id lưu dạng chuỗi => join theo patient_id (cú pháp localField + pipeline, MongoDB >= 5.0)
+        {"$lookup": {
+            "from": "medical_records",
+            "localField": "patient_id",
+            "foreignField": "user_id",
+            "pipeline": [
+                {"$sort": {"upload_date": -1}},
+                {"$limit": 1},
+                {"$project": {"upload_date": 1, "ai_result": 1, "ai_analysis_status": 1}},
+            ],
+            "as": "latest_scan",
+        }},
+        {"$set": {"latest_scan": {"$first": "$latest_scan"}}},
+    ]
+    if ai_status == "NA":
+        pipeline.append({"$match": {"latest_scan": None}})
+    elif ai_status:
+        pipeline.append({"$match": {"latest_scan.ai_analysis_status": ai_status}})
+    sort = {DOCTOR_PATIENT_SORTS[sort_by]: order}
+    if sort_by != "userName": sort["userName"] = 1   # Thứ tự ổn định khi trùng khóa
+    pipeline.append({"$sort": sort})
+    return pipeline
+
+def format_patient_row(patient):
+    latest = patient.get("latest_scan")
+    return {
+        "id": patient["patient_id"], "userName": patient["userName"], "email": patient.get("email", "N/A"), "phone": patient.get("phone", "N/A"), "status": patient.get("status", "ACTIVE"),
+        "latest_scan": {
+            "record_id": str(latest["_id"]) if latest else None,
+            "date": latest["upload_date"].strftime("%d/%m/%Y") if latest else "Chưa có",
+            "result": latest.get("ai_result") if latest else "Chưa có dữ liệu",
+            "ai_status": latest.get("ai_analysis_status") if latest else "NA",
+        },
+    }
+
+async def list_doctor_patients(users_collection, doctor_id, sort_by="userName", order=1, ai_status=None):
+    pipeline = doctor_patients_pipeline(doctor_id, sort_by, order, ai_status)
+    return [format_patient_row(p) async for p in users_collection.aggregate(pipeline)]
@@ -0,0 +1,141 @@
+# aura-backend/services/result_cache.py
+# Cache kết quả AI theo nội dung ảnh: khóa = sha256(bytes ảnh) + phiên bản bộ model.
+# 2 tầng: LRU trên đĩa local (giới hạn dung lượng, theo từng worker) -> collection Mongo 'inference_cache' (dùng chung).
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+from ai.registry import MODEL_PATHS, active_backend, ENABLED_MODELS
+from ai.tiling import tiling_signature
+from .executors import run_blocking_io
+
+# --- CẤU HÌNH CACHE ---
+RESULT_CACHE_ENABLED = os.getenv("AURA_RESULT_CACHE", "1") == "1"
+RESULT_CACHE_DIR = os.getenv("AURA_RESULT_CACHE_DIR", ".cache/aura_results")
+RESULT_CACHE_MAX_MB = float(os.getenv("AURA_RESULT_CACHE_MAX_MB", 256))
+# Tăng số này khi đổi logic hậu xử lý / luật hội chẩn để vô hiệu cache cũ
+PIPELINE_VERSION = "3"
+
+def compute_model_set_version():
+    """Phiên bản bộ model: backend + cấu hình tile + module bật + (tên, kích thước, mtime) từng file model"""
+    override = os.getenv("AURA_MODEL_SET_VERSION")
+    if override: return override
+    h = hashlib.sha256(f"{PIPELINE_VERSION}|{active_backend.name}|{getattr(active_backend, 'precision', '')}".encode())
+    if tiling_signature(): h.update(f"|{tiling_signature()}".encode())   # Chế độ tile cho kết quả khác
+    for name, path in sorted(active_backend.model_paths(MODEL_PATHS).items()):
+        if name not in ENABLED_MODELS: continue
+        try:
+            st = os.stat(path)
+            h.update(f"|{name}:{os.path.basename(path)}:{st.st_size}:{int(st.st_mtime)}".encode())
+        except OSError:
+            h.update(f"|{name}:missing".encode())
+    return h.hexdigest()[:16]
+
+def content_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+class DiskLRUCache:
+    """Mỗi entry là 1 file JSON; thứ tự LRU giữ trong RAM, khởi tạo lại từ mtime khi process khởi động"""
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index = OrderedDict()   # key -> kích thước file
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for fname in os.listdir(directory):
+            if fname.endswith(".json"):
+                st = os.stat(os.path.join(directory, fname))
+                files.append((st.st_mtime, fname[:-5], st.st_size))
+        for _, key, size in sorted(files):
+            self._index[key] = size
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._index: return None
+            self._index.move_to_end(key)
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(self._path(key))
+            return value
+        except (OSError, ValueError):
+            with self._lock: self._index.pop(key, None)
+            return None
+
+    def put(self, key, value):
+        data = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f: f.write(data)
+        os.replace(tmp, self._path(key))   # Ghi nguyên tử
+        with self._lock:
+            self._index[key] = len(data)
+            self._index.move_to_end(key)
+            while sum(self._index.values()) > self.max_bytes and len(self._index) > 1:
+                old_key, _ = self._index.popitem(last=False)
+                try: os.remove(self._path(old_key))
+                except OSError: pass
+
+    def size_bytes(self):
+        with self._lock:
+            return sum(self._index.values())
+
+class InferenceResultCache:
+    def __init__(self, collection, disk_dir=RESULT_CACHE_DIR, disk_max_mb=RESULT_CACHE_MAX_MB, enabled=RESULT_CACHE_ENABLED):
+        self.collection = collection
+        self.enabled = enabled
+        self.model_version = compute_model_set_version()
+        self.disk = DiskLRUCache(disk_dir, int(disk_max_mb * 1024 * 1024)) if enabled else None
+        self.stats = {"hits_disk": 0, "hits_mongo": 0, "misses": 0, "stores": 0}
+
+    def key_for(self, image_hash):
+        return f"{image_hash}-{self.model_version}"
+
+    async def get(self, image_hash):
+        if not self.enabled: return None
+        key = self.key_for(image_hash)
+        value = await run_blocking_io(self.disk.get, key)
+        if value is not None:
+            self.stats["hits_disk"] += 1
+            return value
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.utcnow()}},
+            projection={"_id": 0, "hits": 0, "last_hit_at": 0, "created_at": 0},
+        )
+        if doc is not None:
+            self.stats["hits_mongo"] += 1
+            await run_blocking_io(self.disk.put, key, doc)   # Đưa lên tầng nhanh hơn
+            return doc
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, image_hash, value):
+        """value: dict gồm diagnosis, risk_text, findings, lesion_counts, lesions, overlay_url"""
+        if not self.enabled: return
+        key = self.key_for(image_hash)
+        value = dict(value, model_version=self.model_version)
+        await run_blocking_io(self.disk.put, key, value)
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": value, "$setOnInsert": {"created_at": datetime.utcnow(), "hits": 0}},
+            upsert=True,
+        )
+        self.stats["stores"] += 1
+
+    def snapshot(self):
+        hits = self.stats["hits_disk"] + self.stats["hits_mongo"]
+        total = hits + self.stats["misses"]
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            model_version=self.model_version,
+            hit_rate=round(hits / total, 4) if total else 0.0,
+            disk_size_mb=round(self.disk.size_bytes() / 2**20, 2) if self.disk else 0,
+        )
@@ -0,0 +1,76 @@
+# aura-backend/services/social_auth.py
+# Xác minh access token Google / Facebook qua HTTP client async dùng chung (pool kết nối, timeout).
+# Kết quả token -> danh tính được cache ngắn hạn: đăng nhập lặp lại / frontend retry không gọi lại nhà cung cấp.
+# Endpoint cấu hình được qua env để trỏ sang stub server khi load test.
+import os
+import asyncio
+import hashlib
+
+import httpx
+from dotenv import load_dotenv
+
+from .http_client import get_http_client
+from .ttl_cache import TTLCache
+
+load_dotenv()
+
+# --- CẤU HÌNH ĐĂNG NHẬP MẠNG XÃ HỘI ---
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v3/userinfo")
+FACEBOOK_GRAPH_URL = os.getenv("FACEBOOK_GRAPH_URL", "https://graph.facebook.com/me").rstrip("/")
+SOCIAL_TOKEN_CACHE_TTL = float(os.getenv("AURA_SOCIAL_TOKEN_CACHE_TTL", 300))
+SOCIAL_TOKEN_CACHE_SIZE = int(os.getenv("AURA_SOCIAL_TOKEN_CACHE_SIZE", 10000))
+
+class SocialAuthError(Exception):
+    """Token không hợp lệ / không kết nối được nhà cung cấp (API trả 400 kèm message)"""
+
+# Khóa cache là hash của token => không giữ token thô trong RAM lâu hơn cần thiết
+token_identity_cache = TTLCache(SOCIAL_TOKEN_CACHE_TTL, SOCIAL_TOKEN_CACHE_SIZE)
+_inflight = {}   # Gộp các request xác minh cùng 1 token đang chạy đồng thời (VD: frontend bấm 2 lần)
+
+def _cache_key(provider, token):
+    return f"{provider}:{hashlib.sha256(token.encode()).hexdigest()}"
+
+async def _fetch_google_identity(token):
+    try:
+        response = await get_http_client().get(GOOGLE_USERINFO_URL, params={"access_token": token})
+    except httpx.HTTPError:
+        raise SocialAuthError("Không thể kết nối tới Google")
+    if response.status_code != 200:
+        raise SocialAuthError("Token Google không hợp lệ")
+    return response.json()
+
+async def _fetch_facebook_identity(token):
+    try:
+        response = await get_http_client().get(
+            FACEBOOK_GRAPH_URL,
+            params={"fields": "id,name,email,picture", "access_token": token},
+        )
+        data = response.json()
+    except (httpx.HTTPError, ValueError):
+        raise SocialAuthError("Không thể kết nối tới Facebook")
+    if "error" in data or response.status_code != 200:
+        raise SocialAuthError("Token Facebook không hợp lệ hoặc đã hết hạn")
+    return data
+
+_PROVIDERS = {"google": _fetch_google_identity, "facebook": _fetch_facebook_identity}
+
+async def verify_social_token(provider, token):
+    """Trả về dict danh tính từ nhà cung cấp; chỉ cache kết quả hợp lệ"""
+    key = _cache_key(provider, token)
+    identity = token_identity_cache.get(key)
+    if identity is not None:
+        return identity
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_PROVIDERS[provider](token))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    identity = await asyncio.shield(task)
+    token_identity_cache.set(key, identity)
+    return identity
+
+async def verify_google_token(token):
+    return await verify_social_token("google", token)
+
+async def verify_facebook_token(token):
+    return await verify_social_token("facebook", token)
@@ -0,0 +1,147 @@
+# aura-backend/services/storage.py
+# Lưu trữ ảnh (ảnh gốc + ảnh overlay) qua 1 interface chung:
+#   - CloudinaryStorage: production
+#   - LocalStorage: thư mục local, dùng cho test / cơ sở không có Internet (server tự phục vụ qua /media)
+# URL được tính TRƯỚC khi upload (public_id cố định) => có thể lưu hồ sơ + chạy AI song song với upload.
+import os
+import io
+import threading
+from collections import OrderedDict
+
+import cloudinary
+import cloudinary.uploader
+from dotenv import load_dotenv
+
+from .http_client import get_http_client
+from .executors import run_blocking_io
+
+load_dotenv()
+
+# --- CẤU HÌNH LƯU TRỮ ---
+STORAGE_BACKEND = os.getenv("AURA_STORAGE_BACKEND", "cloudinary")   # cloudinary | local
+LOCAL_STORAGE_DIR = os.getenv("AURA_LOCAL_STORAGE_DIR", "media")
+LOCAL_STORAGE_BASE_URL = os.getenv("AURA_LOCAL_STORAGE_BASE_URL", "http://127.0.0.1:8000/media").rstrip("/")
+# Giới hạn bộ nhớ giữ bytes ảnh vừa upload để worker cùng process dùng luôn (MB)
+HANDOFF_MAX_MB = float(os.getenv("AURA_HANDOFF_MAX_MB", 256))
+
+def original_key(record_id):
+    return f"aura_retina/{record_id}"
+
+def overlay_key(record_id):
+    return f"aura_results/aura_scan_{record_id}"
+
+class CloudinaryStorage:
+    name = "cloudinary"
+
+    def __init__(self):
+        cloudinary.config(
+            cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key = os.getenv("CLOUDINARY_API_KEY"),
+            api_secret = os.getenv("CLOUDINARY_API_SECRET"),
+            secure = True
+        )
+
+    def url_for(self, key, ext="jpg"):
+        # Không kèm version/định dạng: Cloudinary trả đúng định dạng gốc
+        return cloudinary.CloudinaryImage(key).build_url(secure=True)
+
+    async def put(self, key, data, ext="jpg"):
+        # SDK Cloudinary chỉ có API blocking => chạy trong IO pool
+        result = await run_blocking_io(
+            cloudinary.uploader.upload,
+            io.BytesIO(data),
+            public_id=key,
+            resource_type="image",
+            overwrite=True,
+        )
+        return result.get("secure_url")
+
+    async def get(self, url):
+        response = await get_http_client().get(url)
+        if response.status_code != 200:
+            raise FileNotFoundError(f"Không tải được ảnh ({response.status_code}): {url}")
+        return response.content
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, directory=LOCAL_STORAGE_DIR, base_url=LOCAL_STORAGE_BASE_URL):
+        self.directory = directory
+        self.base_url = base_url
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def url_for(self, key, ext="jpg"):
+        return f"{self.base_url}/{key}.{ext}"
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f: f.write(data)
+        os.replace(tmp, path)
+
+    def _read(self, path):
+        with open(path, "rb") as f: return f.read()
+
+    async def put(self, key, data, ext="jpg"):
+        await run_blocking_io(self._write, self._path(key, ext), data)
+        return self.url_for(key, ext)
+
+    async def get(self, url):
+        if url.startswith(self.base_url + "/"):
+            relative = url[len(self.base_url) + 1:]
+            path = os.path.normpath(os.path.join(self.directory, relative))
+            if not path.startswith(os.path.normpath(self.directory) + os.sep):
+                raise FileNotFoundError(url)
+            return await run_blocking_io(self._read, path)
+        response = await get_http_client().get(url)
+        if response.status_code != 200:
+            raise FileNotFoundError(f"Không tải được ảnh ({response.status_code}): {url}")
+        return response.content
+
+class BlobHandoff:
+    """
+    Giữ tạm bytes ảnh vừa nhận trong RAM (giới hạn dung lượng) để worker nhúng cùng process
+    chạy AI ngay mà không phải tải lại ảnh từ storage. Worker ở process khác sẽ tải từ storage.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, key, data, digest=None):
+        """digest: sha256 đã tính khi nhận ảnh (nếu có) => worker không phải băm lại"""
+        with self._lock:
+            if key in self._items: self._size -= len(self._items.pop(key)[0])
+            self._items[key] = (data, digest)
+            self._size += len(data)
+            while self._size > self.max_bytes and self._items:
+                _, (old, _) = self._items.popitem(last=False)
+                self._size -= len(old)
+
+    def keys(self):
+        """Các key đang giữ (worker cùng process được nhận job của những hồ sơ này trước khi ảnh lên storage)"""
+        with self._lock:
+            return list(self._items)
+
+    def pop(self, key):
+        """Trả về (bytes, digest); (None, None) nếu không có"""
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None: return None, None
+            self._size -= len(item[0])
+            return item
+
+STORAGE_BACKENDS = {"cloudinary": CloudinaryStorage, "local": LocalStorage}
+
+def create_storage(name=STORAGE_BACKEND):
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Storage không hỗ trợ: {name} (chọn: {', '.join(STORAGE_BACKENDS)})")
+    return STORAGE_BACKENDS[name]()
+
+# Instance dùng chung
+storage = create_storage()
+blob_handoff = BlobHandoff(int(HANDOFF_MAX_MB * 1024 * 1024))
@@ -0,0 +1,63 @@
+# aura-backend/services/ttl_cache.py
+# Cache trong RAM có hạn dùng (TTL) + giới hạn số phần tử (bỏ phần tử cũ nhất khi đầy).
+# Dùng cho dữ liệu ngắn hạn theo từng process (VD: token mạng xã hội đã xác minh).
+import time
+import threading
+from collections import OrderedDict
+
+class TTLCache:
+    def __init__(self, ttl_seconds, max_size=10000):
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self._items = OrderedDict()   # key -> (hết hạn lúc, giá trị)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] <= now:
+                if item is not None: del self._items[key]
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl_seconds=None):
+        expires_at = time.monotonic() + (self.ttl if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._items.pop(key, None)
+        return default if item is None else item[1]
+
+    def pop_where(self, predicate):
+        """Xóa mọi phần tử có predicate(key, value) đúng; trả về số phần tử đã xóa"""
+        with self._lock:
+            keys = [k for k, (_, v) in self._items.items() if predicate(k, v)]
+            for k in keys: del self._items[k]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def snapshot(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,38 @@
+# aura-backend/services/user_cache.py
+# Cache thông tin người dùng đã xác thực (theo 'sub' của JWT) cho get_current_user:
+# poll chat / dashboard không còn tốn 1 lượt MongoDB mỗi request chỉ để xác thực.
+# Endpoint sửa user phải gọi invalidate_*; TTL ngắn giới hạn độ trễ khi process khác sửa user.
+import os
+
+from .ttl_cache import TTLCache
+
+# --- CẤU HÌNH CACHE USER ---
+USER_CACHE_TTL = float(os.getenv("AURA_USER_CACHE_TTL", 30))
+USER_CACHE_SIZE = int(os.getenv("AURA_USER_CACHE_SIZE", 5000))
+
+class UserCache:
+    def __init__(self, ttl_seconds=USER_CACHE_TTL, max_size=USER_CACHE_SIZE):
+        self.enabled = ttl_seconds > 0
+        self._cache = TTLCache(ttl_seconds, max_size)
+        self.invalidations = 0
+
+    def get(self, subject):
+        if not self.enabled: return None
+        user_info = self._cache.get(subject)
+        # Trả bản sao: caller có thể sửa dict mà không làm bẩn cache
+        return dict(user_info) if user_info is not None else None
+
+    def set(self, subject, user_info):
+        if self.enabled: self._cache.set(subject, dict(user_info))
+
+    def invalidate(self, subject):
+        if self._cache.pop(subject) is not None: self.invalidations += 1
+
+    def invalidate_user_id(self, user_id):
+        self.invalidations += self._cache.pop_where(lambda _, info: info.get("id") == user_id)
+
+    def snapshot(self):
+        return dict(self._cache.snapshot(), enabled=self.enabled, ttl_seconds=self._cache.ttl, invalidations=self.invalidations)
+
+# Instance dùng chung cho process API
+user_cache = UserCache()
@@ -0,0 +1,48 @@
+# aura-backend/tests/test_ingest.py
+# Kiểm tra UploadSizeLimitMiddleware. Chạy (từ thư mục aura-backend): python -m pytest tests
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from services.ingest import UploadSizeLimitMiddleware
+
+LIMIT = 64 * 1024
+BOUNDARY = "aura-test-boundary"
+
+def _make_app():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    app.add_middleware(UploadSizeLimitMiddleware, limits={"/upload": LIMIT})
+    return app
+
+def _multipart(payload):
+    head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"scan.jpg\"\r\n"
+            "Content-Type: image/jpeg\r\n\r\n").encode()
+    return head + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+def _chunked(body, size=8 * 1024):
+    # Generator => httpx gửi Transfer-Encoding: chunked, KHÔNG có Content-Length
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+HEADERS = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+def test_chunked_body_over_limit_returns_413():
+    client = TestClient(_make_app())
+    r = client.post("/upload", content=_chunked(_multipart(b"\xff" * (LIMIT * 2))), headers=HEADERS)
+    assert r.status_code == 413
+    assert "MB" in r.json()["detail"]
+
+def test_declared_content_length_over_limit_returns_413():
+    client = TestClient(_make_app())
+    r = client.post("/upload", content=_multipart(b"\xff" * (LIMIT * 2)), headers=HEADERS)
+    assert r.status_code == 413
+
+def test_chunked_body_under_limit_passes_through():
+    client = TestClient(_make_app())
+    r = client.post("/upload", content=_chunked(_multipart(b"\xff" * 1000)), headers=HEADERS)
+    assert r.status_code == 200
+    assert r.json() == {"size": 1000}
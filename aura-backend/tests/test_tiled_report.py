@@ -0,0 +1,30 @@
+# aura-backend/tests/test_tiled_report.py
+# Hậu xử lý mask độ phân giải cao (chế độ tile). Chạy (từ thư mục aura-backend): python -m pytest tests
+import numpy as np
+
+from ai.inference import build_report, OUT_SIZE
+
+TILED_SIZE = 1024
+
+def _prepared():
+    return {"rgb_256": np.zeros((OUT_SIZE, OUT_SIZE, 3), np.uint8)}
+
+def test_small_ma_blob_in_tiled_prediction_is_kept():
+    # Ổ 3x3 = 9 px ở mask 1024: trên min_size của MA (5 px) nhưng dưới 5 * 16 nếu min_size bị phóng theo diện tích
+    pred = np.zeros((TILED_SIZE, TILED_SIZE), np.float32)
+    pred[500:503, 600:603] = 0.9
+    report = build_report(_prepared(), {"MA": pred})
+
+    assert report["lesion_counts"]["MA"] == 1
+    [lesion] = [l for l in report["lesions"] if l["type"] == "MA"]
+    assert lesion["area"] == 9
+    assert lesion["mask_size"] == TILED_SIZE
+    # Số pixel vẫn quy về thang 256 cho luật hội chẩn
+    assert report["findings"]["MA_Count"] == 9 / (TILED_SIZE / OUT_SIZE) ** 2
+
+def test_blob_below_min_size_is_dropped():
+    pred = np.zeros((TILED_SIZE, TILED_SIZE), np.float32)
+    pred[10:12, 10:12] = 0.9   # 4 px < 5
+    report = build_report(_prepared(), {"MA": pred})
+    assert report["lesion_counts"]["MA"] == 0
+    assert report["lesions"] == []
@@ -40,17 +40,24 @@ const DashboardAdmin: React.FC = () => {
                 setAdminName(userData.user_info.userName); 
             }
 
-            const res = await fetch('http://127.0.0.1:8000/api/admin/users', {
-                headers: { 'Authorization': `Bearer ${token}` }
-            });
-            
-            if (!res.ok) {
-                // Nếu không có quyền Admin, chuyển hướng
-                throw new Error("Không có quyền truy cập Admin.");
-            }
-            
-            const data = await res.json();
-            const users = data.users;
+            // API phân trang: đi theo next_cursor tới hết (cần đủ danh sách bác sĩ để phân công)
+            const users: User[] = [];
+            let cursor: string | null = null;
+            do {
+                const query: string = `?limit=200${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`; // 200 = AURA_PAGE_SIZE_MAX mặc định
+                const res: Response = await fetch(`http://127.0.0.1:8000/api/admin/users${query}`, {
+                    headers: { 'Authorization': `Bearer ${token}` }
+                });
+                
+                if (!res.ok) {
+                    // Nếu không có quyền Admin, chuyển hướng
+                    throw new Error("Không có quyền truy cập Admin.");
+                }
+                
+                const data = await res.json();
+                users.push(...data.users);
+                cursor = data.next_cursor ?? null;
+            } while (cursor);
             
             // Lọc ra các Doctor và các User/Bệnh nhân
             setUserList(users.filter((u: User) => u.role !== 'ADMIN'));
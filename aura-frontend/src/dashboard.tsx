@@ -12,12 +12,14 @@ const Dashboard: React.FC = () => {
     const [_id, setUserId] = useState<string>('');
     const [isLoading, setIsLoading] = useState(true); 
     const [historyData, setHistoryData] = useState<any[]>([]);
+    const [recordsCursor, setRecordsCursor] = useState<string | null>(null); // Còn trang lịch sử khám cũ hơn
     const [chatData, setChatData] = useState<any[]>([]); 
     const [full_name, setFullName] = useState<string>('');
 
     // --- STATE CHAT ---
     const [selectedChatId, setSelectedChatId] = useState<string | null>(null);
     const [currentMessages, setCurrentMessages] = useState<any[]>([]);
+    const [olderMessagesCursor, setOlderMessagesCursor] = useState<string | null>(null);
     const [newMessageText, setNewMessageText] = useState('');
     const messagesEndRef = useRef<HTMLDivElement>(null); 
 
@@ -64,26 +66,49 @@ const Dashboard: React.FC = () => {
     }, []);
 
     // --- 2. HÀM TẢI LỊCH SỬ TIN NHẮN ---
-    const fetchMessageHistory = async (partnerId: string) => {
+    // Server trả theo trang (mới nhất trước); next_cursor dùng để tải các tin CŨ hơn
+    const fetchMessageHistory = async (partnerId: string, cursor?: string | null) => {
         const token = localStorage.getItem('token');
         if (!token) return null;
         try {
-            const res = await fetch(`http://127.0.0.1:8000/api/chat/history/${partnerId}`, {
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const res = await fetch(`http://127.0.0.1:8000/api/chat/history/${partnerId}${query}`, {
                 headers: { 'Authorization': `Bearer ${token}` }
             });
+            if (!res.ok) return null;
             const data = await res.json();
-            return data.messages;
-        } catch (err) { return []; }
+            return { messages: data.messages as any[], nextCursor: (data.next_cursor ?? null) as string | null };
+        } catch (err) { return null; }
+    };
+
+    // Giữ các tin cũ đã tải thêm + tin vừa gửi mà server chưa có, thay phần còn lại bằng trang mới nhất từ server
+    const mergeLatestPage = (prev: any[], page: any[]) => {
+        const pending = prev.filter(m => m.pending && !page.some(p => p.is_me && p.content === m.content));
+        if (page.length === 0) return prev;
+        const cut = prev.findIndex(m => m.id === page[0].id);
+        return [...(cut > 0 ? prev.slice(0, cut) : []), ...page, ...pending];
+    };
+
+    const loadOlderMessages = async () => {
+        if (!selectedChatId || !olderMessagesCursor) return;
+        const page = await fetchMessageHistory(selectedChatId, olderMessagesCursor);
+        if (!page) return;
+        setCurrentMessages(prev => [...page.messages, ...prev]);
+        setOlderMessagesCursor(page.nextCursor);
     };
 
     const openChat = async (partnerId: string) => {
         setSelectedChatId(partnerId);
         if (partnerId === 'system') {
              setCurrentMessages([{id: 'sys', content: 'Chào mừng bạn đến với AURA!', is_me: false, time: ''}]);
+             setOlderMessagesCursor(null);
              return;
         }
-        const msgs = await fetchMessageHistory(partnerId);
-        if (msgs) setCurrentMessages(msgs);
+        const page = await fetchMessageHistory(partnerId);
+        if (page) {
+            setCurrentMessages(page.messages);
+            setOlderMessagesCursor(page.nextCursor);
+        }
         fetchChatData(); 
     };
 
@@ -99,7 +124,8 @@ const Dashboard: React.FC = () => {
             id: Date.now().toString(),
             content: textToSend,
             is_me: true,
-            time: new Date().toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'})
+            time: new Date().toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'}),
+            pending: true // Tin tạm (optimistic), bị thay bằng tin thật khi polling thấy trên server
         };
         setCurrentMessages(prev => [...prev, tempMsg]);
 
@@ -129,35 +155,38 @@ const Dashboard: React.FC = () => {
         } catch (err) { alert("Lỗi gửi tin!"); }
     };
 
+    // Chỉ cuộn xuống khi có tin MỚI ở cuối (tải tin cũ hơn thì giữ nguyên vị trí)
+    const lastMessageId = currentMessages.length ? currentMessages[currentMessages.length - 1].id : null;
     useEffect(() => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
-    }, [currentMessages]);
+    }, [lastMessageId]);
 
     // --- POLLING ---
     useEffect(() => {
         const interval = setInterval(async () => {
              fetchChatData(); 
              if (selectedChatId && selectedChatId !== 'system') {
-                const serverMsgs = await fetchMessageHistory(selectedChatId);
-                if (serverMsgs && serverMsgs.length > currentMessages.length) {
-                    setCurrentMessages(serverMsgs);
-                }
+                const page = await fetchMessageHistory(selectedChatId);
+                if (page) setCurrentMessages(prev => mergeLatestPage(prev, page.messages));
              }
         }, 3000); 
         return () => clearInterval(interval);
-    }, [selectedChatId, fetchChatData, currentMessages.length]);
+    }, [selectedChatId, fetchChatData]);
 
     // --- LOGIC KHỞI TẠO ---
-    const fetchMedicalRecords = async () => {
+    // Không truyền cursor => tải lại trang mới nhất; có cursor => nối thêm trang cũ hơn
+    const fetchMedicalRecords = async (cursor?: string | null) => {
         const token = localStorage.getItem('token');
         if (!token) return;
         try {
-            const historyRes = await fetch('http://127.0.0.1:8000/api/medical-records', {
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const historyRes = await fetch(`http://127.0.0.1:8000/api/medical-records${query}`, {
                 headers: { 'Authorization': `Bearer ${token}` }
             });
             if (historyRes.ok) {
                 const historyData = await historyRes.json();
-                setHistoryData(historyData.history);
+                setHistoryData(prev => cursor ? [...prev, ...historyData.history] : historyData.history);
+                setRecordsCursor(historyData.next_cursor ?? null);
             }
         } catch (err) { console.error("Lỗi cập nhật:", err); }
     };
@@ -282,6 +311,9 @@ const Dashboard: React.FC = () => {
                                     </div>
                                 </div>
                                 <div style={styles.messagesBody}>
+                                    {olderMessagesCursor && (
+                                        <button onClick={loadOlderMessages} style={styles.loadMoreBtn}>Tải tin nhắn cũ hơn</button>
+                                    )}
                                     {currentMessages.map((msg, idx) => (
                                         <div key={idx} style={{display: 'flex', justifyContent: msg.is_me ? 'flex-end' : 'flex-start', marginBottom: '10px'}}>
                                             {!msg.is_me && <div style={styles.avatarSmall}>{currentPartner?.sender.charAt(0).toUpperCase()}</div>}
@@ -324,7 +356,7 @@ const Dashboard: React.FC = () => {
                 <div style={styles.cardInfo}>
                     <h3>📊 Tổng quan</h3>
                     <div style={{ display: 'flex', gap: '40px', marginTop: '20px' }}>
-                        <div><span style={{ fontSize: '14px', color: '#666' }}>Tổng lần khám</span><h1 style={{ margin: '5px 0 0', color: '#007bff' }}>{totalScans}</h1></div>
+                        <div><span style={{ fontSize: '14px', color: '#666' }}>Tổng lần khám</span><h1 style={{ margin: '5px 0 0', color: '#007bff' }}>{totalScans}{recordsCursor ? '+' : ''}</h1></div>
                         <div><span style={{ fontSize: '14px', color: '#666' }}>Nguy cơ cao</span><h1 style={{ margin: '5px 0 0', color: highRiskCount > 0 ? '#dc3545' : '#28a745' }}>{highRiskCount}</h1></div>
                     </div>
                 </div>
@@ -342,6 +374,11 @@ const Dashboard: React.FC = () => {
                             ))}
                         </tbody>
                     </table>
+                    {recordsCursor && (
+                        <div style={{ textAlign: 'center', marginTop: '15px' }}>
+                            <button onClick={() => fetchMedicalRecords(recordsCursor)} style={styles.loadMoreBtn}>Xem thêm lần khám cũ hơn</button>
+                        </div>
+                    )}
                 </div>
             </div>
         );
@@ -442,6 +479,7 @@ const styles: { [key: string]: React.CSSProperties } = {
     chatWindowPanel: { flex: 1, display: 'flex', flexDirection: 'column', backgroundColor: 'white' },
     chatWindowHeader: { padding: '12px 16px', borderBottom: '1px solid #e4e6eb', display: 'flex', alignItems: 'center', gap: '12px', boxShadow: '0 1px 2px rgba(0, 0, 0, 0.04)', zIndex: 10 },
     avatarMedium: { width: '40px', height: '40px', borderRadius: '50%', backgroundColor: '#e4e6eb', display: 'flex', alignItems: 'center', justifyContent: 'center', fontWeight: 'bold', color: '#65676b' },
+    loadMoreBtn: { alignSelf: 'center', background: 'none', border: '1px solid #ccd0d5', color: '#007bff', padding: '6px 14px', borderRadius: '16px', cursor: 'pointer', fontSize: '13px', marginBottom: '10px' },
     messagesBody: { flex: 1, overflowY: 'auto', padding: '20px', display: 'flex', flexDirection: 'column', gap: '2px' },
     avatarSmall: { width: '28px', height: '28px', borderRadius: '50%', backgroundColor: '#e4e6eb', display: 'flex', alignItems: 'center', justifyContent: 'center', fontSize: '12px', marginRight: '8px', alignSelf: 'flex-end', marginBottom: '8px' },
     chatInputArea: { padding: '12px 16px', display: 'flex', alignItems: 'center', gap: '12px', borderTop: '1px solid #e4e6eb' },
@@ -21,6 +21,7 @@ const DashboardDr: React.FC = () => {
     // --- STATE CHAT ---
     const [selectedChatId, setSelectedChatId] = useState<string | null>(null);
     const [currentMessages, setCurrentMessages] = useState<any[]>([]);
+    const [olderMessagesCursor, setOlderMessagesCursor] = useState<string | null>(null);
     const [newMessageText, setNewMessageText] = useState('');
     const messagesEndRef = useRef<HTMLDivElement>(null); 
 
@@ -76,22 +77,44 @@ const DashboardDr: React.FC = () => {
 }, [patientsData]);
 
     // --- 2. HÀM TẢI LỊCH SỬ TIN NHẮN ---
-    const fetchMessageHistory = async (partnerId: string) => {
+    // Server trả theo trang (mới nhất trước); next_cursor dùng để tải các tin CŨ hơn
+    const fetchMessageHistory = async (partnerId: string, cursor?: string | null) => {
         const token = localStorage.getItem('token');
         if (!token) return null;
         try {
-            const res = await fetch(`http://127.0.0.1:8000/api/chat/history/${partnerId}`, {
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const res = await fetch(`http://127.0.0.1:8000/api/chat/history/${partnerId}${query}`, {
                 headers: { 'Authorization': `Bearer ${token}` }
             });
+            if (!res.ok) return null;
             const data = await res.json();
-            return data.messages;
-        } catch (err) { return []; }
+            return { messages: data.messages as any[], nextCursor: (data.next_cursor ?? null) as string | null };
+        } catch (err) { return null; }
+    };
+
+    // Giữ các tin cũ đã tải thêm + tin vừa gửi mà server chưa có, thay phần còn lại bằng trang mới nhất từ server
+    const mergeLatestPage = (prev: any[], page: any[]) => {
+        const pending = prev.filter(m => m.pending && !page.some(p => p.is_me && p.content === m.content));
+        if (page.length === 0) return prev;
+        const cut = prev.findIndex(m => m.id === page[0].id);
+        return [...(cut > 0 ? prev.slice(0, cut) : []), ...page, ...pending];
+    };
+
+    const loadOlderMessages = async () => {
+        if (!selectedChatId || !olderMessagesCursor) return;
+        const page = await fetchMessageHistory(selectedChatId, olderMessagesCursor);
+        if (!page) return;
+        setCurrentMessages(prev => [...page.messages, ...prev]);
+        setOlderMessagesCursor(page.nextCursor);
     };
 
     const openChat = async (partnerId: string) => {
         setSelectedChatId(partnerId);
-        const msgs = await fetchMessageHistory(partnerId);
-        if (msgs) setCurrentMessages(msgs);
+        const page = await fetchMessageHistory(partnerId);
+        if (page) {
+            setCurrentMessages(page.messages);
+            setOlderMessagesCursor(page.nextCursor);
+        }
         
         const token = localStorage.getItem('token');
         if(token) fetchChatData(token); 
@@ -110,7 +133,8 @@ const DashboardDr: React.FC = () => {
             id: Date.now().toString(),
             content: textToSend,
             is_me: true,
-            time: new Date().toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'})
+            time: new Date().toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'}),
+            pending: true // Tin tạm (optimistic), bị thay bằng tin thật khi polling thấy trên server
         };
         setCurrentMessages(prev => [...prev, tempMsg]);
 
@@ -142,9 +166,11 @@ const DashboardDr: React.FC = () => {
         } catch (err) { alert("Lỗi gửi tin!"); }
     };
 
+    // Chỉ cuộn xuống khi có tin MỚI ở cuối (tải tin cũ hơn thì giữ nguyên vị trí)
+    const lastMessageId = currentMessages.length ? currentMessages[currentMessages.length - 1].id : null;
     useEffect(() => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
-    }, [currentMessages]);
+    }, [lastMessageId]);
 
     // --- 4. POLLING (Cập nhật thông minh) ---
     useEffect(() => {
@@ -156,14 +182,9 @@ const DashboardDr: React.FC = () => {
              
              // Cập nhật khung chat bên phải
              if (selectedChatId) {
-                const serverMsgs = await fetchMessageHistory(selectedChatId);
-                // Chỉ cập nhật nếu server có NHIỀU tin hơn hoặc BẰNG (để không mất tin vừa gửi)
-                if (serverMsgs) {
-                    setCurrentMessages(prev => {
-                        if (serverMsgs.length >= prev.length) return serverMsgs;
-                        return prev;
-                    });
-                }
+                const page = await fetchMessageHistory(selectedChatId);
+                // Trang mới nhất thay phần cuối (kể cả tin vừa gửi tạm), giữ các tin cũ đã tải thêm
+                if (page) setCurrentMessages(prev => mergeLatestPage(prev, page.messages));
              }
         }, 3000); 
         return () => clearInterval(interval);
@@ -316,6 +337,9 @@ const DashboardDr: React.FC = () => {
                                     </div>
                                 </div>
                                 <div style={styles.messagesBody}>
+                                    {olderMessagesCursor && (
+                                        <button onClick={loadOlderMessages} style={styles.loadMoreBtn}>Tải tin nhắn cũ hơn</button>
+                                    )}
                                     {currentMessages.map((msg, idx) => (
                                         <div key={idx} style={{display: 'flex', justifyContent: msg.is_me ? 'flex-end' : 'flex-start', marginBottom: '10px'}}>
                                             {!msg.is_me && (
@@ -579,6 +603,7 @@ const styles: { [key: string]: React.CSSProperties } = {
     chatWindowPanel: { flex: 1, display: 'flex', flexDirection: 'column', backgroundColor: 'white' },
     chatWindowHeader: { padding: '12px 16px', borderBottom: '1px solid #e4e6eb', display: 'flex', alignItems: 'center', gap: '12px', boxShadow: '0 1px 2px rgba(0, 0, 0, 0.04)', zIndex: 10 },
     avatarMedium: { width: '40px', height: '40px', borderRadius: '50%', backgroundColor: '#e4e6eb', display: 'flex', alignItems: 'center', justifyContent: 'center', fontWeight: 'bold', color: '#65676b' },
+    loadMoreBtn: { alignSelf: 'center', background: 'none', border: '1px solid #ccd0d5', color: '#007bff', padding: '6px 14px', borderRadius: '16px', cursor: 'pointer', fontSize: '13px', marginBottom: '10px' },
     messagesBody: { flex: 1, overflowY: 'auto', padding: '20px', display: 'flex', flexDirection: 'column', gap: '2px' },
     avatarSmall: { width: '28px', height: '28px', borderRadius: '50%', backgroundColor: '#e4e6eb', display: 'flex', alignItems: 'center', justifyContent: 'center', fontSize: '12px', marginRight: '8px', alignSelf: 'flex-end', marginBottom: '8px' },
     chatInputArea: { padding: '12px 16px', display: 'flex', alignItems: 'center', gap: '12px', borderTop: '1px solid #e4e6eb' },